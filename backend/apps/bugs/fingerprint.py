@@ -0,0 +1,51 @@
+"""Error fingerprinting.
+
+A fingerprint identifies "the same error" across occurrences: it is a hash
+of the error type, the top stack frames (without line numbers) and the
+message reduced to a template, so IDs, numbers and quoted values that
+differ between occurrences do not produce new bugs.
+"""
+import hashlib
+import re
+
+# Number of innermost stack frames that take part in the fingerprint.
+TOP_FRAMES = 3
+
+NORMALIZERS = [
+    (re.compile(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}'), '<uuid>'),
+    (re.compile(r'\b0x[0-9a-fA-F]+\b'), '<hex>'),
+    (re.compile(r'\b[0-9a-fA-F]{16,}\b'), '<hash>'),
+    (re.compile(r'\b[\w.+-]+@[\w-]+\.[\w.-]+\b'), '<email>'),
+    (re.compile(r'\b\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?'), '<timestamp>'),
+    (re.compile(r'\b(?:\d{1,3}\.){3}\d{1,3}(?::\d+)?\b'), '<ip>'),
+    (re.compile(r"'[^']*'|\"[^\"]*\""), '<str>'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '<num>'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def message_template(message):
+    """Reduce an error message to a template shared by all its occurrences."""
+    template = message or ''
+    for pattern, replacement in NORMALIZERS:
+        template = pattern.sub(replacement, template)
+    return template.strip()[:500]
+
+
+def _frame_key(frame):
+    if isinstance(frame, dict):
+        return f"{frame.get('file', '')}:{frame.get('function', '')}"
+    return str(frame)
+
+
+def compute_fingerprint(error_type, frames, message, scope=''):
+    """Return a hex digest identifying an error.
+
+    `frames` are the error's stack frames, outermost first, either as
+    strings or as dicts with `file` and `function` keys. `scope` keeps
+    otherwise identical errors apart, e.g. errors from different
+    repositories.
+    """
+    top_frames = [_frame_key(frame) for frame in (frames or [])[-TOP_FRAMES:]]
+    parts = [str(scope), error_type or '', ';'.join(top_frames), message_template(message)]
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()
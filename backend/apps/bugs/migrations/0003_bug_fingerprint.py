@@ -0,0 +1,44 @@
+# Generated by Django 5.0.2 on 2026-10-17 23:59
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_seen_at(apps, schema_editor):
+    Bug = apps.get_model('bugs', 'Bug')
+    Bug.objects.update(first_seen=F('detected_at'), last_seen=F('detected_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bugs', '0002_bug_repository_alter_bug_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bug',
+            name='fingerprint',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='bug',
+            name='first_seen',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='bug',
+            name='last_seen',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='bug',
+            name='occurrence_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddConstraint(
+            model_name='bug',
+            constraint=models.UniqueConstraint(condition=models.Q(('fingerprint', ''), _negated=True), fields=('user', 'fingerprint'), name='bugs_bug_unique_fingerprint'),
+        ),
+        migrations.RunPython(backfill_seen_at, migrations.RunPython.noop),
+    ]
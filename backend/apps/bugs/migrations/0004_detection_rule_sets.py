@@ -0,0 +1,62 @@
+# Generated by Django 5.0.2 on 2026-10-18 11:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bugs', '0003_bug_fingerprint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetectionRuleSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('log', 'Log analysis'), ('repository', 'Repository analysis')], default='log', max_length=20)),
+                ('version', models.PositiveIntegerField()),
+                ('description', models.TextField(blank=True)),
+                ('is_active', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('activated_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['scope', '-version'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DetectionRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('name', models.CharField(max_length=100)),
+                ('title', models.CharField(max_length=255)),
+                ('pattern', models.TextField()),
+                ('keywords', models.JSONField(blank=True, default=list)),
+                ('severity', models.CharField(choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High'), ('critical', 'Critical')], default='medium', max_length=20)),
+                ('bug_type', models.CharField(blank=True, max_length=100)),
+                ('confidence', models.FloatField(default=0.8)),
+                ('rule_set', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rules', to='bugs.detectionruleset')),
+            ],
+            options={
+                'ordering': ['rule_set', 'position'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='detectionruleset',
+            constraint=models.UniqueConstraint(fields=('scope', 'version'), name='bugs_rule_set_unique_version'),
+        ),
+        migrations.AddConstraint(
+            model_name='detectionruleset',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('scope',), name='bugs_rule_set_one_active'),
+        ),
+        migrations.AddConstraint(
+            model_name='detectionrule',
+            constraint=models.UniqueConstraint(fields=('rule_set', 'name'), name='bugs_rule_unique_name'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.2 on 2026-10-18 12:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bugs', '0004_detection_rule_sets'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DetectionBackfill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('paused', 'Paused'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('created_after', models.DateTimeField(blank=True, null=True)),
+                ('created_before', models.DateTimeField()),
+                ('batch_size', models.PositiveIntegerField()),
+                ('rate_limit', models.FloatField(help_text='Logs processed per second at most')),
+                ('cursor_created_at', models.DateTimeField(blank=True, null=True)),
+                ('cursor_log_id', models.UUIDField(blank=True, null=True)),
+                ('processed_logs', models.PositiveIntegerField(default=0)),
+                ('matched_events', models.PositiveIntegerField(default=0)),
+                ('created_bugs', models.PositiveIntegerField(default=0)),
+                ('updated_bugs', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('rule_set', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='backfills', to='bugs.detectionruleset')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bugs', '0005_detectionbackfill'),
+        ('github_integration', '0002_alter_githubrepository_github_app'),
+        ('logs', '0010_log_created_at_id_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bug',
+            index=models.Index(fields=['user', 'detected_at', 'id'], name='bugs_bug_user_id_a09a20_idx'),
+        ),
+    ]
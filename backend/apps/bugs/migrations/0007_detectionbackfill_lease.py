@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bugs', '0006_bug_list_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='detectionbackfill',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='detectionbackfill',
+            name='lease_id',
+            field=models.UUIDField(blank=True, null=True),
+        ),
+    ]
@@ -1,7 +1,61 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Q
 from django.conf import settings
+from django.utils import timezone
 import uuid
 
+
+class BugManager(models.Manager):
+    """Manager that deduplicates detected bugs by fingerprint."""
+
+    def record_occurrence(self, user, fingerprint, defaults, count=1):
+        """Record `count` occurrences of the bug identified by `fingerprint`.
+
+        Increments the counter of the user's existing bug with that
+        fingerprint, or creates it from `defaults`. Returns (bug, created).
+        """
+        now = timezone.now()
+        existing = self.filter(user=user, fingerprint=fingerprint)
+        if existing.update(occurrence_count=F('occurrence_count') + count, last_seen=now, updated_at=now):
+            return existing.get(), False
+
+        try:
+            with transaction.atomic():
+                bug = self.create(
+                    user=user,
+                    fingerprint=fingerprint,
+                    occurrence_count=count,
+                    first_seen=now,
+                    last_seen=now,
+                    **defaults
+                )
+            return bug, True
+        except IntegrityError:
+            # Another worker created the bug first
+            existing.update(occurrence_count=F('occurrence_count') + count, last_seen=now, updated_at=now)
+            return existing.get(), False
+
+    def reclassify(self, user, fingerprint, defaults, since, count=1,
+                   fields=('title', 'severity', 'confidence_score', 'analysis_result')):
+        """Upsert a bug found by re-running detection over a stored log.
+
+        Stored logs were already matched against the rules of their time, so
+        a bug first seen before `since` (when the re-run started) has had
+        its occurrences counted: it keeps its counters and only `fields` of
+        `defaults` are refreshed, while nobody has started working on it.
+        Bugs the re-run itself brought up are counted as usual, see
+        `record_occurrence`. Returns True when the bug was created.
+        """
+        existing = self.filter(user=user, fingerprint=fingerprint, first_seen__lt=since)
+        if existing.exists():
+            existing.filter(status='detected').update(
+                updated_at=timezone.now(), **{field: defaults[field] for field in fields}
+            )
+            return False
+        _, created = self.record_occurrence(user, fingerprint, defaults, count=count)
+        return created
+
+
 class Bug(models.Model):
     """Model for storing bug information and analysis results."""
     
@@ -39,6 +93,12 @@ class Bug(models.Model):
     severity = models.CharField(max_length=20, choices=SEVERITY_CHOICES, default='medium')
     confidence_score = models.FloatField(default=0.0)
     analysis_result = models.JSONField(default=dict)
+
+    # Deduplication
+    fingerprint = models.CharField(max_length=64, blank=True, db_index=True)
+    occurrence_count = models.PositiveIntegerField(default=1)
+    first_seen = models.DateTimeField(null=True, blank=True)
+    last_seen = models.DateTimeField(null=True, blank=True)
     
     # Timestamps
     detected_at = models.DateTimeField(auto_now_add=True)
@@ -46,12 +106,23 @@ class Bug(models.Model):
     fixed_at = models.DateTimeField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = BugManager()
+
     class Meta:
         ordering = ['-detected_at']
         indexes = [
             models.Index(fields=['user', 'status']),
             models.Index(fields=['severity']),
             models.Index(fields=['detected_at']),
+            # Serves the cursor-paginated bug list of a user
+            models.Index(fields=['user', 'detected_at', 'id']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'fingerprint'],
+                condition=~Q(fingerprint=''),
+                name='bugs_bug_unique_fingerprint'
+            ),
         ]
 
     def __str__(self):
@@ -59,9 +130,138 @@ class Bug(models.Model):
 
     def save(self, *args, **kwargs):
         if self.status == 'analyzed' and not self.analyzed_at:
-            from django.utils import timezone
             self.analyzed_at = timezone.now()
         elif self.status == 'fixed' and not self.fixed_at:
-            from django.utils import timezone
             self.fixed_at = timezone.now()
-        super().save(*args, **kwargs) 
\ No newline at end of file
+        super().save(*args, **kwargs) 
+
+class DetectionRuleSet(models.Model):
+    """A versioned, immutable set of bug detection rules.
+
+    Changing the rules means creating a new version and activating it.
+    Workers compile each version once and pick up the active one on their
+    next task.
+    """
+
+    SCOPE_CHOICES = [
+        ('log', 'Log analysis'),
+        ('repository', 'Repository analysis'),
+    ]
+
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES, default='log')
+    version = models.PositiveIntegerField()
+    description = models.TextField(blank=True)
+    is_active = models.BooleanField(default=False)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    activated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['scope', '-version']
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'version'], name='bugs_rule_set_unique_version'),
+            models.UniqueConstraint(
+                fields=['scope'],
+                condition=Q(is_active=True),
+                name='bugs_rule_set_one_active'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.scope} rules v{self.version}"
+
+    def activate(self):
+        """Make this the active rule set of its scope, in one transaction."""
+        with transaction.atomic():
+            DetectionRuleSet.objects.select_for_update().filter(scope=self.scope, is_active=True).exclude(
+                pk=self.pk
+            ).update(is_active=False)
+            self.is_active = True
+            self.activated_at = timezone.now()
+            self.save(update_fields=['is_active', 'activated_at'])
+
+
+class DetectionRule(models.Model):
+    """One rule of a DetectionRuleSet; see apps.bugs.rules.Rule."""
+
+    rule_set = models.ForeignKey(DetectionRuleSet, on_delete=models.CASCADE, related_name='rules')
+    position = models.PositiveIntegerField(default=0)
+    name = models.CharField(max_length=100)
+    title = models.CharField(max_length=255)
+    pattern = models.TextField()
+    keywords = models.JSONField(default=list, blank=True)
+    severity = models.CharField(max_length=20, choices=Bug.SEVERITY_CHOICES, default='medium')
+    bug_type = models.CharField(max_length=100, blank=True)
+    confidence = models.FloatField(default=0.8)
+
+    class Meta:
+        ordering = ['rule_set', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['rule_set', 'name'], name='bugs_rule_unique_name'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class DetectionBackfill(models.Model):
+    """A run of bug detection over stored logs, e.g. after new rules were activated.
+
+    Logs are walked in (created_at, id) order; the position of the last
+    processed log is saved after every batch, so a backfill that was paused
+    or whose worker died continues where it stopped.
+
+    The task running the backfill holds a lease: `lease_id` names it, and
+    it is renewed before every batch. Only its holder advances the cursor,
+    and a resumed backfill waits until the lease is released or expired,
+    so two tasks never process the same logs.
+    """
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('paused', 'Paused'),
+        ('completed', 'Completed'),
+        ('cancelled', 'Cancelled'),
+        ('failed', 'Failed'),
+    ]
+
+    rule_set = models.ForeignKey(DetectionRuleSet, on_delete=models.CASCADE, related_name='backfills')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    created_after = models.DateTimeField(null=True, blank=True)
+    created_before = models.DateTimeField()
+    batch_size = models.PositiveIntegerField()
+    rate_limit = models.FloatField(help_text="Logs processed per second at most")
+    cursor_created_at = models.DateTimeField(null=True, blank=True)
+    cursor_log_id = models.UUIDField(null=True, blank=True)
+    processed_logs = models.PositiveIntegerField(default=0)
+    matched_events = models.PositiveIntegerField(default=0)
+    created_bugs = models.PositiveIntegerField(default=0)
+    updated_bugs = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    lease_id = models.UUIDField(null=True, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Backfill of {self.rule_set} ({self.status})"
+
+    def next_logs(self):
+        """Return the next batch of analyzed logs after the cursor."""
+        from apps.logs.models import Log
+
+        logs = Log.objects.filter(status='analyzed', created_at__lt=self.created_before)
+        if self.created_after:
+            logs = logs.filter(created_at__gte=self.created_after)
+        if self.cursor_created_at:
+            logs = logs.filter(
+                Q(created_at__gt=self.cursor_created_at)
+                | Q(created_at=self.cursor_created_at, id__gt=self.cursor_log_id)
+            )
+        return logs.select_related('repository').order_by('created_at', 'id')[:self.batch_size]
@@ -0,0 +1,294 @@
+"""Rule-based bug detection.
+
+Every rule names a kind of bug and how to recognize it in an error event:
+literal keywords, any of which must occur in the event text, and a regex
+that confirms the match. All keywords of all rules are compiled into one
+multi-pattern matcher, so an event is scanned once no matter how many rules
+there are, and only the regexes of rules whose keywords occur are run.
+
+The matcher is an Aho-Corasick automaton when the optional `pyahocorasick`
+package is installed, and a single alternation regex otherwise.
+
+Rules are data: the active DetectionRuleSet of a scope overrides the
+built-in defaults below. Each worker compiles a rule set version once and
+keeps the engine keyed by (scope, version); activating a new version is
+picked up by the next task without a restart.
+"""
+import re
+import threading
+
+try:
+    import ahocorasick
+except ImportError:  # pyahocorasick is optional, the regex matcher is always available
+    ahocorasick = None
+
+
+class Rule:
+    """A detection rule.
+
+    name        stable identifier, recorded on detected bugs
+    title       bug title
+    pattern     regex confirming a match (case-insensitive unless the
+                pattern turns it off with `(?-i:...)`)
+    keywords    literals, one of which must occur in the event text (case-
+                insensitive); a rule without keywords is checked on every event
+    severity    one of Bug.SEVERITY_CHOICES
+    bug_type    label stored in the bug's analysis result
+    confidence  confidence score given to bugs detected by the rule
+    """
+
+    __slots__ = ('name', 'title', 'pattern', 'keywords', 'severity', 'bug_type', 'confidence', 'regex')
+
+    def __init__(self, name, title, pattern, keywords=(), severity='medium', bug_type='', confidence=0.8):
+        self.name = name
+        self.title = title
+        self.pattern = pattern
+        self.keywords = tuple(keywords)
+        self.severity = severity
+        self.bug_type = bug_type or name
+        self.confidence = confidence
+        self.regex = re.compile(pattern, re.IGNORECASE)
+
+    def __repr__(self):
+        return f"Rule({self.name!r})"
+
+    @classmethod
+    def from_model(cls, rule):
+        """Build a Rule from a DetectionRule row."""
+        return cls(
+            rule.name, rule.title, rule.pattern, rule.keywords,
+            severity=rule.severity, bug_type=rule.bug_type, confidence=rule.confidence,
+        )
+
+
+# Rules are tried in order; the first confirmed rule wins.
+DEFAULT_RULES = [
+    Rule(
+        'null_pointer', 'NullPointer Exception Detected',
+        r"NullPointerException|NoneType' object has no attribute|Cannot read propert(?:y|ies) of (?:null|undefined)"
+        r"|undefined is not an object|null reference",
+        keywords=['NullPointerException', "'NoneType' object", 'Cannot read propert', 'undefined is not an object',
+                  'null reference'],
+        severity='critical', confidence=0.95,
+    ),
+    Rule(
+        'memory_leak', 'Memory Leak Suspected',
+        r'OutOfMemoryError|\bMemoryError\b|heap out of memory|Cannot allocate memory|GC overhead limit exceeded',
+        keywords=['OutOfMemoryError', 'MemoryError', 'heap out of memory', 'Cannot allocate memory', 'GC overhead'],
+        severity='high', confidence=0.85,
+    ),
+    Rule(
+        'database_timeout', 'Database Connection Timeout',
+        r'(?:database|\bdb\b|sql|postgres|mysql|connection pool|jdbc|OperationalError)'
+        r'.*(?:timed? ?out|refused|could not connect)|could not connect to server|SQLTimeoutException|QueuePool limit',
+        keywords=['database', 'db', 'sql', 'postgres', 'mysql', 'connection pool', 'jdbc', 'OperationalError',
+                  'could not connect', 'QueuePool'],
+        severity='high', confidence=0.85,
+    ),
+    Rule(
+        'rate_limit', 'API Rate Limit Exceeded',
+        r'rate.?limit|too many requests|(?:status|http|code)[ =:/]*429\b|\b429 too|throttl',
+        keywords=['rate limit', 'ratelimit', 'rate-limit', 'rate_limit', 'too many requests', '429', 'throttl'],
+        severity='medium', confidence=0.9,
+    ),
+    Rule(
+        'unhandled_rejection', 'Unhandled Promise Rejection',
+        r'Unhandled ?Promise ?Rejection|unhandled rejection',
+        keywords=['UnhandledPromiseRejection', 'Unhandled promise rejection', 'unhandled rejection'],
+        severity='medium', confidence=0.95,
+    ),
+    Rule(
+        'authentication_failure', 'Authentication Failed Repeatedly',
+        r'authenticat\w* fail|login failed|invalid (?:credentials|token|password)|\bunauthori[sz]ed\b|(?:status|http|code)[ =:/]*401\b'
+        r'|PermissionDenied|AccessDenied',
+        keywords=['authenticat', 'login failed', 'invalid credentials', 'invalid token', 'invalid password',
+                  'unauthorized', 'unauthorised', '401', 'PermissionDenied', 'AccessDenied'],
+        severity='critical', confidence=0.85,
+    ),
+    Rule(
+        'invalid_input', 'Invalid Input Data',
+        r'ValidationError|\bValueError\b|JSONDecodeError|NumberFormatException|IllegalArgumentException'
+        r'|invalid (?:input|argument|format)|SyntaxError: Unexpected token',
+        keywords=['ValidationError', 'ValueError', 'JSONDecodeError', 'NumberFormatException',
+                  'IllegalArgumentException', 'invalid input', 'invalid argument', 'invalid format',
+                  'Unexpected token'],
+        severity='low', confidence=0.8,
+    ),
+    Rule(
+        'unhandled_exception', 'Unhandled Exception',
+        r'(?-i:\b[A-Z]\w*(?:Error|Exception)\b|\bpanic: )',
+        keywords=['Error', 'Exception', 'panic: '],
+        severity='medium', confidence=0.6,
+    ),
+]
+
+
+# Built-in rules for repository analysis, matched against source code rather
+# than log events. Bug types keep the values of earlier releases so existing
+# fingerprints stay stable.
+DEFAULT_REPOSITORY_RULES = [
+    Rule(
+        'sql_injection', 'Security Vulnerability: SQL Injection',
+        r'(?:execute|raw|cursor\.\w+)\(\s*f?["\'].*(?:%s|\{|\+)',
+        keywords=['execute(', 'raw(', 'cursor.'],
+        severity='critical', confidence=0.8,
+    ),
+    Rule(
+        'hardcoded_credentials', 'Hardcoded Credentials Found',
+        r'(?:password|passwd|secret|api_?key|token)\s*[=:]\s*["\'][^"\']{4,}["\']',
+        keywords=['password', 'passwd', 'secret', 'api_key', 'apikey', 'token'],
+        bug_type='hardcoded_credentials_found', severity='critical', confidence=0.85,
+    ),
+    Rule(
+        'infinite_loop', 'Infinite Loop in Logic',
+        r'while\s*\(?\s*(?:true|1)\s*\)?\s*:?\s*\{?\s*$',
+        keywords=['while'],
+        bug_type='infinite_loop_in_logic', severity='high', confidence=0.6,
+    ),
+    Rule(
+        'unoptimized_query', 'Unoptimized Database Query',
+        r'for .* in .*\.(?:all|filter)\(.*\)|SELECT \*',
+        keywords=['.all(', '.filter(', 'select *'],
+        bug_type='unoptimized_database_query', severity='medium', confidence=0.6,
+    ),
+    Rule(
+        'race_condition', 'Race Condition in Async Task',
+        r'(?:asyncio\.gather|Promise\.all|threading\.Thread)\(',
+        keywords=['asyncio.gather', 'promise.all', 'threading.thread'],
+        bug_type='race_condition_in_async_task', severity='high', confidence=0.5,
+    ),
+    Rule(
+        'missing_error_handling', 'Missing Error Handling in API',
+        r'except\s*:\s*pass|catch\s*\(\w*\)\s*\{\s*\}',
+        keywords=['except', 'catch'],
+        bug_type='missing_error_handling_in_api', severity='low', confidence=0.7,
+    ),
+]
+
+DEFAULT_RULE_SETS = {
+    'log': DEFAULT_RULES,
+    'repository': DEFAULT_REPOSITORY_RULES,
+}
+
+
+class _RegexMatcher:
+    """Finds keywords with one alternation regex, used without pyahocorasick."""
+
+    def __init__(self, keyword_rules):
+        keywords = sorted(keyword_rules, key=len, reverse=True)
+        # The lookahead reports a match at every position, so keywords that
+        # overlap an earlier match are still found.
+        self.regex = re.compile('(?=(' + '|'.join(re.escape(keyword) for keyword in keywords) + '))')
+        # At a given position only the longest keyword is reported, so it
+        # also stands for the keywords that are its prefixes.
+        self.rules = {
+            keyword: frozenset().union(*(
+                rule_ids for other, rule_ids in keyword_rules.items() if keyword.startswith(other)
+            ))
+            for keyword in keywords
+        }
+
+    def find(self, text):
+        found = set()
+        for match in self.regex.finditer(text):
+            found |= self.rules[match.group(1)]
+        return found
+
+
+class _AhoCorasickMatcher:
+    """Finds keywords with an Aho-Corasick automaton."""
+
+    def __init__(self, keyword_rules):
+        self.automaton = ahocorasick.Automaton()
+        for keyword, rule_ids in keyword_rules.items():
+            self.automaton.add_word(keyword, rule_ids)
+        self.automaton.make_automaton()
+
+    def find(self, text):
+        found = set()
+        for _, rule_ids in self.automaton.iter(text):
+            found |= rule_ids
+        return found
+
+
+class RuleEngine:
+    """Rules compiled into one keyword matcher plus per-rule confirmation regexes.
+
+    `version` is the DetectionRuleSet version the rules come from, 0 for
+    the built-in defaults.
+    """
+
+    def __init__(self, rules, version=0):
+        self.rules = list(rules)
+        self.version = version
+        keyword_rules = {}
+        self.always = set()
+        for rule_id, rule in enumerate(self.rules):
+            if not rule.keywords:
+                self.always.add(rule_id)
+            for keyword in rule.keywords:
+                keyword_rules.setdefault(keyword.lower(), set()).add(rule_id)
+        keyword_rules = {keyword: frozenset(rule_ids) for keyword, rule_ids in keyword_rules.items()}
+
+        if not keyword_rules:
+            self.matcher = None
+        elif ahocorasick is not None:
+            self.matcher = _AhoCorasickMatcher(keyword_rules)
+        else:
+            self.matcher = _RegexMatcher(keyword_rules)
+
+    def match(self, text):
+        """Return the first rule matching `text`, or None."""
+        candidates = self.matcher.find(text.lower()) if self.matcher else set()
+        candidates |= self.always
+        for rule_id in sorted(candidates):
+            rule = self.rules[rule_id]
+            if rule.regex.search(text):
+                return rule
+        return None
+
+    def scan(self, events):
+        """Yield (event, rule) for each analyzer event matched by a rule."""
+        for event in events:
+            rule = self.match(event_text(event))
+            if rule is not None:
+                yield event, rule
+
+
+def event_text(event):
+    """Text of an analyzer event that rules are matched against."""
+    return '\n'.join(part for part in (event['error_type'], event['message'], event.get('context')) if part)
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(scope='log'):
+    """Return the compiled engine for the active rule set of `scope`.
+
+    Costs one indexed query per call to read the active version; rules are
+    only loaded and compiled the first time a worker sees a version.
+    """
+    from .models import DetectionRuleSet
+
+    rule_set = DetectionRuleSet.objects.filter(scope=scope, is_active=True).values_list('id', 'version').first()
+    rule_set_id, version = rule_set or (None, 0)
+    key = (scope, version)
+    engine = _engines.get(key)
+    if engine is not None:
+        return engine
+
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            if rule_set_id is None:
+                rules = DEFAULT_RULE_SETS[scope]
+            else:
+                rules = [Rule.from_model(rule) for rule in DetectionRuleSet.objects.get(id=rule_set_id).rules.all()]
+            engine = RuleEngine(rules, version)
+            # Keep only the newest engine per scope; older versions are not used again.
+            for other in [other for other in _engines if other[0] == scope]:
+                del _engines[other]
+            _engines[key] = engine
+    return engine
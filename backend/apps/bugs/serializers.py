@@ -1,5 +1,10 @@
+import re
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import Max
 from rest_framework import serializers
-from .models import Bug
+from .models import Bug, DetectionBackfill, DetectionRule, DetectionRuleSet
 
 class BugSerializer(serializers.ModelSerializer):
     """Serializer for the Bug model."""
@@ -10,11 +15,13 @@ class BugSerializer(serializers.ModelSerializer):
             'id', 'log', 'repository', 'title', 'description', 'error_message',
             'stack_trace', 'file_path', 'line_number', 'status',
             'severity', 'confidence_score', 'analysis_result',
-            'detected_at', 'analyzed_at', 'fixed_at', 'updated_at'
+            'detected_at', 'analyzed_at', 'fixed_at', 'updated_at',
+            'fingerprint', 'occurrence_count', 'first_seen', 'last_seen'
         ]
         read_only_fields = [
             'id', 'user', 'status', 'confidence_score',
-            'detected_at', 'analyzed_at', 'fixed_at', 'updated_at'
+            'detected_at', 'analyzed_at', 'fixed_at', 'updated_at',
+            'fingerprint', 'occurrence_count', 'first_seen', 'last_seen'
         ]
 
     def create(self, validated_data):
@@ -24,6 +31,16 @@ class BugSerializer(serializers.ModelSerializer):
             validated_data['user'] = request.user
         return super().create(validated_data)
 
+class BugListSerializer(BugSerializer):
+    """Compact bug representation for lists, without the long text fields."""
+
+    class Meta(BugSerializer.Meta):
+        fields = [
+            'id', 'log', 'repository', 'title', 'file_path', 'line_number', 'status',
+            'severity', 'confidence_score', 'detected_at', 'updated_at',
+            'fingerprint', 'occurrence_count', 'first_seen', 'last_seen'
+        ]
+
 class BugAnalysisSerializer(serializers.Serializer):
     """Serializer for bug analysis requests."""
     
@@ -43,4 +60,116 @@ class BugAnalysisSerializer(serializers.Serializer):
             log = request.user.logs.get(id=value)
             return value
         except:
-            raise serializers.ValidationError("Log not found or access denied") 
\ No newline at end of file
+            raise serializers.ValidationError("Log not found or access denied")
+
+
+class DetectionRuleSerializer(serializers.ModelSerializer):
+    """Serializer for one rule of a detection rule set."""
+
+    class Meta:
+        model = DetectionRule
+        fields = ['name', 'title', 'pattern', 'keywords', 'severity', 'bug_type', 'confidence']
+
+    def validate_pattern(self, value):
+        """Reject patterns that do not compile, so a bad rule never reaches a worker."""
+        try:
+            re.compile(value, re.IGNORECASE)
+        except re.error as e:
+            raise serializers.ValidationError(f"Invalid regular expression: {e}")
+        return value
+
+    def validate_keywords(self, value):
+        if not isinstance(value, list) or not all(isinstance(keyword, str) and keyword for keyword in value):
+            raise serializers.ValidationError("Keywords must be a list of non-empty strings")
+        return value
+
+    def validate_confidence(self, value):
+        if not 0 <= value <= 1:
+            raise serializers.ValidationError("Confidence must be between 0 and 1")
+        return value
+
+
+class DetectionRuleSetSerializer(serializers.ModelSerializer):
+    """Serializer for a versioned detection rule set and its rules.
+
+    Rule sets are immutable once created; the version is assigned on
+    creation as the next one of the scope.
+    """
+
+    rules = DetectionRuleSerializer(many=True)
+    activate = serializers.BooleanField(write_only=True, required=False, default=False)
+
+    class Meta:
+        model = DetectionRuleSet
+        fields = [
+            'id', 'scope', 'version', 'description', 'is_active', 'activate', 'rules',
+            'created_by', 'created_at', 'activated_at'
+        ]
+        read_only_fields = ['id', 'version', 'is_active', 'created_by', 'created_at', 'activated_at']
+
+    def validate_rules(self, value):
+        if not value:
+            raise serializers.ValidationError("A rule set needs at least one rule")
+        names = [rule['name'] for rule in value]
+        if len(names) != len(set(names)):
+            raise serializers.ValidationError("Rule names must be unique within a rule set")
+        return value
+
+    def create(self, validated_data):
+        rules = validated_data.pop('rules')
+        activate = validated_data.pop('activate')
+        request = self.context.get('request')
+        if request and hasattr(request, 'user'):
+            validated_data['created_by'] = request.user
+
+        with transaction.atomic():
+            # Lock the scope's rule sets so concurrent creates get distinct versions
+            existing = DetectionRuleSet.objects.select_for_update().filter(scope=validated_data['scope'])
+            validated_data['version'] = (existing.aggregate(Max('version'))['version__max'] or 0) + 1
+            rule_set = DetectionRuleSet.objects.create(**validated_data)
+            DetectionRule.objects.bulk_create([
+                DetectionRule(rule_set=rule_set, position=position, **rule)
+                for position, rule in enumerate(rules)
+            ])
+            if activate:
+                rule_set.activate()
+        return rule_set
+
+
+class DetectionBackfillSerializer(serializers.ModelSerializer):
+    """Serializer for backfills re-running detection over stored logs.
+
+    Only logs created before the backfill are covered; newer logs are
+    checked by live detection already.
+    """
+
+    batch_size = serializers.IntegerField(min_value=1, max_value=1000, required=False)
+    rate_limit = serializers.FloatField(min_value=0.1, required=False)
+
+    class Meta:
+        model = DetectionBackfill
+        fields = [
+            'id', 'rule_set', 'status', 'created_after', 'created_before', 'batch_size', 'rate_limit',
+            'cursor_created_at', 'processed_logs', 'matched_events', 'created_bugs', 'updated_bugs',
+            'error', 'created_by', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = [
+            'id', 'status', 'created_before', 'cursor_created_at', 'processed_logs', 'matched_events',
+            'created_bugs', 'updated_bugs', 'error', 'created_by', 'created_at', 'started_at', 'finished_at'
+        ]
+
+    def validate_rule_set(self, value):
+        if not value.is_active:
+            raise serializers.ValidationError("Only the active rule set of a scope can be backfilled")
+        if value.scope != 'log':
+            raise serializers.ValidationError("Only log rule sets can be backfilled")
+        return value
+
+    def create(self, validated_data):
+        request = self.context.get('request')
+        if request and hasattr(request, 'user'):
+            validated_data['created_by'] = request.user
+        validated_data['created_before'] = timezone.now()
+        validated_data.setdefault('batch_size', settings.BUG_BACKFILL_BATCH_SIZE)
+        validated_data.setdefault('rate_limit', settings.BUG_BACKFILL_RATE_LIMIT)
+        return super().create(validated_data)
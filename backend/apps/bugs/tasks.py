@@ -1,78 +1,236 @@
+import time
+import uuid
+from datetime import timedelta
 from celery import shared_task
+from django.conf import settings
+from django.db.models import Q, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from apps.logs.models import Log
-from .models import Bug
-import random
+from .models import Bug, DetectionBackfill
+from .fingerprint import compute_fingerprint
+from .rules import get_engine
+
+def _format_frames(frames, kind):
+    # Event frames are outermost first; Java and JavaScript print the innermost first
+    if kind != 'python':
+        frames = frames[::-1]
+    return '\n'.join(
+        f"  at {frame.get('function') or '<unknown>'} ({frame.get('file')}:{frame.get('line') or '?'})"
+        for frame in frames
+    )
+
+def detect_bugs(log, engine, since_line=0, backfill=None, events=None):
+    """Match the error events of an analyzed log against `engine` and record bugs.
+
+    Events matched by a rule are grouped by fingerprint; each group is
+    recorded as one occurrence batch of a Bug. `events` defaults to the
+    events kept in the analysis result (LOG_ANALYSIS_MAX_EVENTS); only
+    those past `since_line` are scanned. Events re-evaluated by `backfill`
+    were mostly counted before, so bugs are upserted with
+    `BugManager.reclassify`.
+
+    Returns (matched events, created bugs, updated bugs).
+    """
+    if events is None:
+        events = (log.analysis_result or {}).get('events', [])
+    events = [
+        event for event in events
+        if event['line_number'] > since_line
+    ]
+    repo_prefix = log.repository.name if log.repository else "unknown"
+
+    detected = {}
+    for event, rule in engine.scan(events):
+        fingerprint = compute_fingerprint(
+            event['error_type'], event['frames'], event['message'],
+            scope=log.repository_id or ''
+        )
+        if fingerprint in detected:
+            detected[fingerprint][2] += 1
+        else:
+            detected[fingerprint] = [event, rule, 1]
+
+    matched = created_bugs = 0
+    for fingerprint, (event, rule, count) in detected.items():
+        matched += count
+        frames = event['frames']
+        # The innermost frame, where the error was raised
+        location = frames[-1] if frames else {}
+        file_path = location.get('file') or f"logs/{log.original_filename or 'app.log'}"
+        defaults = {
+            'log': log,
+            'repository': log.repository,
+            'title': rule.title,
+            'description': (
+                f"{rule.title} in {repo_prefix}: {event['error_type']} "
+                f"at line {event['line_number']} of {log.original_filename}"
+            ),
+            'error_message': event['message'] or event['error_type'],
+            'stack_trace': _format_frames(frames, event['kind']) or event.get('context', ''),
+            'file_path': file_path[:255],
+            'line_number': location.get('line') or event['line_number'],
+            'status': 'detected',
+            'severity': rule.severity,
+            'confidence_score': rule.confidence,
+            'analysis_result': {
+                'bug_type': rule.bug_type,
+                'rule': rule.name,
+                'rule_set_version': engine.version,
+                'error_type': event['error_type'],
+                'event_kind': event['kind'],
+                'log_line': event['line_number'],
+                'detail': f"Issue found in {file_path}"
+            }
+        }
+        if backfill is not None:
+            created_bugs += Bug.objects.reclassify(log.user, fingerprint, defaults, backfill.created_at, count=count)
+            continue
+
+        bug, created = Bug.objects.record_occurrence(log.user, fingerprint, defaults, count=count)
+        created_bugs += created
+        print(
+            f"Bug {bug.id} {'detected' if created else 'seen again'} for log {log.id}. "
+            f"Repo: {repo_prefix}. Rule: {rule.name}. Occurrences: {bug.occurrence_count}"
+        )
+
+    return matched, created_bugs, len(detected) - created_bugs
+
 
 @shared_task
-def detect_bug_task(log_id):
-    """Simulates bug detection based on a processed log and creates a Bug entry."""
+def detect_bug_task(log_id, since_line=0, events=None):
+    """Matches the error events of an analyzed log against the active detection rules.
+
+    After an incremental analysis only events past `since_line`, which are
+    new, are scanned. Those are passed as `events`, the events of the
+    appended text: the log's analysis result keeps only the first
+    LOG_ANALYSIS_MAX_EVENTS events, which may all be older.
+    """
     try:
-        log = Log.objects.get(id=log_id)
-        
-        
-        
-        if random.random() < 0.7:  
-            title_options = [
-                "NullPointer Exception Detected",
-                "Database Connection Timeout",
-                "API Rate Limit Exceeded",
-                "Memory Leak Suspected",
-                "Unhandled Promise Rejection",
-                "Authentication Failed Repeatedly",
-                "Invalid Input Data",
-            ]
-            severity_options = {
-                "NullPointer Exception Detected": "critical",
-                "Database Connection Timeout": "high",
-                "API Rate Limit Exceeded": "medium",
-                "Memory Leak Suspected": "high",
-                "Unhandled Promise Rejection": "medium",
-                "Authentication Failed Repeatedly": "critical",
-                "Invalid Input Data": "low",
-            }
-            
-            detected_title = random.choice(title_options)
-            detected_severity = severity_options.get(detected_title, "medium")
-            
-            # Use repository name in file path if available
-            repo_prefix = log.repository.name if log.repository else "unknown"
-            file_name = log.original_filename if log.original_filename else "app.log"
-            if '.' in file_name and repo_prefix != "unknown":
-                # Simulate a source file in the repo
-                ext = file_name.split('.')[-1]
-                mock_file = f"src/main.{ext}" if ext in ['py', 'js', 'ts'] else f"logs/{file_name}"
-            else:
-                mock_file = f"logs/{file_name}"
-
-            bug = Bug.objects.create(
-                user=log.user,
-                log=log,
-                repository=log.repository,
-                title=detected_title,
-                description=f"AI detected a potential bug in {repo_prefix} related to: {detected_title}",
-                error_message=f"Error details from log {log.original_filename}: {log.content[:200]}...",
-                stack_trace=f"Simulated stack trace for {repo_prefix}...\nLine {random.randint(10, 200)} in {mock_file}",
-                file_path=mock_file,
-                line_number=random.randint(1, 500),
-                status='detected',
-                severity=detected_severity,
-                confidence_score=round(random.uniform(0.6, 0.99), 2),
-                analysis_result={
-                    'root_cause': f'Simulated AI root cause analysis for {detected_title}.',
-                    'suggested_fix': f'Simulated AI suggested fix for {mock_file}.',
-                    'impact': 'Simulated AI impact assessment.',
-                    'bug_type': detected_title.lower().replace(' ', '_'),
-                    'detail': f"Issue found in {mock_file}"
-                }
-            )
-            print(f"Bug {bug.id} detected for log {log_id}. Repo: {repo_prefix}. Status: {bug.status}")
-        else:
-            log.status = 'analyzed' 
-            log.save(update_fields=['status'])
+        log = Log.objects.select_related('repository').get(id=log_id)
+        matched, _, _ = detect_bugs(log, get_engine('log'), since_line, events=events)
+        if not matched:
             print(f"No bug detected for log {log_id}.")
 
     except Log.DoesNotExist:
         print(f"Log with ID {log_id} not found for bug detection.")
     except Exception as e:
-        print(f"Error during bug detection for log {log_id}: {e}") 
\ No newline at end of file
+        print(f"Error during bug detection for log {log_id}: {e}")
+
+
+@shared_task
+def backfill_detection_task(backfill_id, lease_id=None):
+    """Re-runs bug detection over stored logs for a DetectionBackfill.
+
+    Runs on the low-priority 'backfill' queue (CELERY_TASK_ROUTES). Works
+    through batches for at most BUG_BACKFILL_SLICE_SECONDS, pacing itself
+    to the backfill's rate limit, saves the cursor after every batch and
+    then re-queues itself with its lease, so live analysis tasks get their
+    turn and a lost worker only loses the batch in progress. Pausing or
+    cancelling the backfill stops it before its next batch.
+
+    Without `lease_id` the task takes the lease of a pending backfill,
+    retrying while a stopped task may still hold it.
+    """
+    if lease_id is None:
+        lease_id = _claim_backfill(backfill_id)
+        if lease_id is None:
+            return
+
+    try:
+        backfill = DetectionBackfill.objects.select_related('rule_set').get(id=backfill_id)
+    except DetectionBackfill.DoesNotExist:
+        print(f"Backfill {backfill_id} not found.")
+        return
+
+    deadline = time.monotonic() + settings.BUG_BACKFILL_SLICE_SECONDS
+    try:
+        while True:
+            # Picks up pause/cancel requests, and a lease taken over, between batches
+            if not _renew_lease(backfill, lease_id, settings.BUG_BACKFILL_LEASE_SECONDS):
+                _release_lease(backfill, lease_id)
+                return
+            engine = get_engine(backfill.rule_set.scope)
+            if engine.version != backfill.rule_set.version:
+                _finish_backfill(backfill, lease_id, 'cancelled', f"Rule set v{backfill.rule_set.version} is no longer active")
+                return
+
+            batch_started = time.monotonic()
+            logs = list(backfill.next_logs())
+            if not logs:
+                _finish_backfill(backfill, lease_id, 'completed')
+                print(f"Backfill {backfill_id} completed: {backfill.processed_logs} logs.")
+                return
+
+            for log in logs:
+                matched, created, updated = detect_bugs(log, engine, backfill=backfill)
+                backfill.matched_events += matched
+                backfill.created_bugs += created
+                backfill.updated_bugs += updated
+            backfill.processed_logs += len(logs)
+            backfill.cursor_created_at = logs[-1].created_at
+            backfill.cursor_log_id = logs[-1].id
+            # Saved even when the backfill was paused meanwhile, as the batch is done
+            saved = DetectionBackfill.objects.filter(id=backfill.id, lease_id=lease_id).update(
+                cursor_created_at=backfill.cursor_created_at, cursor_log_id=backfill.cursor_log_id,
+                processed_logs=backfill.processed_logs, matched_events=backfill.matched_events,
+                created_bugs=backfill.created_bugs, updated_bugs=backfill.updated_bugs
+            )
+            if not saved:
+                print(f"Backfill {backfill_id} was taken over by another task.")
+                return
+
+            # Sleep off whatever is left of the time budget of this batch
+            pause = len(logs) / backfill.rate_limit - (time.monotonic() - batch_started)
+            if time.monotonic() + max(pause, 0) >= deadline:
+                break
+            if pause > 0:
+                time.sleep(pause)
+    except Exception as e:
+        _finish_backfill(backfill, lease_id, 'failed', str(e))
+        print(f"Error during backfill {backfill_id}: {e}")
+        return
+
+    # Held until the re-queued task renews it
+    if _renew_lease(backfill, lease_id, max(pause, 0) + settings.BUG_BACKFILL_LEASE_SECONDS):
+        backfill_detection_task.apply_async((backfill_id, str(lease_id)), countdown=max(pause, 0))
+    else:
+        _release_lease(backfill, lease_id)
+
+
+def _claim_backfill(backfill_id):
+    """Take the lease of a pending backfill and start it; return the lease ID, None if not taken."""
+    now = timezone.now()
+    lease_id = uuid.uuid4()
+    claimed = DetectionBackfill.objects.filter(
+        Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now), id=backfill_id, status='pending'
+    ).update(
+        status='running', lease_id=lease_id, lease_expires_at=now + timedelta(seconds=settings.BUG_BACKFILL_LEASE_SECONDS),
+        started_at=Coalesce('started_at', Value(now))
+    )
+    if claimed:
+        return lease_id
+
+    held = DetectionBackfill.objects.filter(id=backfill_id, status='pending').values_list('lease_expires_at', flat=True).first()
+    if held is not None:
+        # A task stopped by a pause may still be in its last batch
+        backfill_detection_task.apply_async((backfill_id,), countdown=max((held - now).total_seconds(), 1))
+    return None
+
+
+def _renew_lease(backfill, lease_id, seconds):
+    return DetectionBackfill.objects.filter(id=backfill.id, lease_id=lease_id, status='running').update(
+        lease_expires_at=timezone.now() + timedelta(seconds=seconds)
+    )
+
+
+def _release_lease(backfill, lease_id):
+    DetectionBackfill.objects.filter(id=backfill.id, lease_id=lease_id).update(lease_id=None, lease_expires_at=None)
+
+
+def _finish_backfill(backfill, lease_id, status, error=''):
+    # Conditional, so a pause or cancel requested meanwhile is not overwritten
+    DetectionBackfill.objects.filter(id=backfill.id, lease_id=lease_id, status='running').update(
+        status=status, error=error, finished_at=timezone.now(), lease_id=None, lease_expires_at=None
+    )
+    _release_lease(backfill, lease_id)
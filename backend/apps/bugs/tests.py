@@ -0,0 +1,315 @@
+import uuid
+from datetime import timedelta
+from unittest import mock
+from unittest import skipIf
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from apps.logs.analysis import MAX_FRAMES, extract_events
+from apps.logs.models import Log
+from apps.users.models import User
+from bugsquash.testing import QueryBudgetMixin
+from .fingerprint import compute_fingerprint
+from . import rules
+from .models import Bug, DetectionBackfill, DetectionRule, DetectionRuleSet
+from .rules import Rule, RuleEngine, get_engine
+from .tasks import backfill_detection_task
+
+
+class BugQueryTests(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='dev@example.com', username='dev', password='secret')
+        self.client.force_authenticate(self.user)
+
+    def add_bugs(self, n):
+        for i in range(n):
+            Bug.objects.create(
+                user=self.user, title=f'Bug {i}', description='d', severity='low',
+                file_path='src/app.py', analysis_result={'bug_type': 'logic'}
+            )
+
+    def test_list(self):
+        self.assertQueryBudget('/api/bugs/', self.add_bugs, budget=1)
+
+
+def parse(text):
+    """Return the error events of a log given as text."""
+    lines = ((n, 0, line) for n, line in enumerate(text.splitlines(), 1))
+    return list(extract_events(lines))
+
+
+def fingerprint(event):
+    return compute_fingerprint(event['error_type'], event['frames'], event['message'])
+
+
+JAVA_TRACE = """\
+ERROR java.lang.IllegalStateException: order {order} is closed
+    at com.shop.orders.{inner}(Orders.java:42)
+    at com.shop.http.Handler.handle(Handler.java:10)
+    at com.shop.http.Server.dispatch(Server.java:20)
+    at com.shop.http.Worker.loop(Worker.java:30)
+    at java.lang.Thread.run(Thread.java:829)
+"""
+
+JS_TRACE = """\
+ERROR TypeError: Cannot read properties of undefined (reading '{field}')
+    at {inner} (/app/src/cart.js:12:5)
+    at handle (/app/src/router.js:40:3)
+    at dispatch (/app/src/server.js:80:9)
+    at process.processTicksAndRejections (node:internal/process/task_queues:95:5)
+"""
+
+
+class FingerprintTests(SimpleTestCase):
+    def test_java(self):
+        first, = parse(JAVA_TRACE.format(order=1, inner='Orders.close'))
+        again, = parse(JAVA_TRACE.format(order=2, inner='Orders.close'))
+        other, = parse(JAVA_TRACE.format(order=1, inner='Orders.refund'))
+
+        self.assertEqual(first['frames'][-1], {'file': 'Orders.java', 'line': 42, 'function': 'com.shop.orders.Orders.close'})
+        self.assertEqual(first['frames'][0]['function'], 'java.lang.Thread.run')
+        self.assertEqual(fingerprint(first), fingerprint(again))
+        self.assertNotEqual(fingerprint(first), fingerprint(other))
+
+    def test_javascript(self):
+        first, = parse(JS_TRACE.format(field='id', inner='total'))
+        again, = parse(JS_TRACE.format(field='sku', inner='total'))
+        other, = parse(JS_TRACE.format(field='id', inner='discount'))
+
+        self.assertEqual(first['frames'][-1], {'file': '/app/src/cart.js', 'line': 12, 'function': 'total'})
+        self.assertEqual(fingerprint(first), fingerprint(again))
+        self.assertNotEqual(fingerprint(first), fingerprint(other))
+
+    def test_deep_python_traceback_keeps_innermost_frames(self):
+        frames = ''.join(f'  File "app.py", line {i}, in f{i}\n    f{i + 1}()\n' for i in range(MAX_FRAMES + 10))
+        event, = parse(f'Traceback (most recent call last):\n{frames}RecursionError: too deep\n')
+
+        self.assertEqual(len(event['frames']), MAX_FRAMES)
+        self.assertEqual(event['frames'][-1]['function'], f'f{MAX_FRAMES + 9}')
+
+
+class RuleEngineTests(SimpleTestCase):
+    def match(self, text, engine=None):
+        rule = (engine or RuleEngine(rules.DEFAULT_RULES)).match(text)
+        return rule.name if rule else None
+
+    def test_default_rules(self):
+        self.assertEqual(self.match("AttributeError: 'NoneType' object has no attribute 'id'"), 'null_pointer')
+        self.assertEqual(self.match('OperationalError: could not connect to server'), 'database_timeout')
+        self.assertEqual(self.match('HTTP 429 Too Many Requests from api.example.com'), 'rate_limit')
+        self.assertEqual(self.match('KeyError: user'), 'unhandled_exception')
+        self.assertIsNone(self.match('INFO request served in 12ms'))
+
+    def test_keyword_needs_the_pattern_to_confirm(self):
+        engine = RuleEngine([
+            Rule('db_timeout', 'Database timeout', r'database.*timed out', keywords=['timed out']),
+            Rule('timeout', 'Timeout', r'timed out', keywords=['timed out']),
+        ])
+        self.assertEqual(self.match('database query timed out', engine), 'db_timeout')
+        self.assertEqual(self.match('request to cache timed out', engine), 'timeout')
+
+    def test_rule_without_keywords_is_always_tried(self):
+        engine = RuleEngine([Rule('exit_code', 'Exit code', r'exited with code [1-9]')])
+        self.assertEqual(self.match('worker exited with code 3', engine), 'exit_code')
+        self.assertIsNone(self.match('worker exited with code 0', engine))
+
+    def test_keywords_are_case_insensitive(self):
+        self.assertEqual(self.match('java.lang.OUTOFMEMORYERROR: heap space'), 'memory_leak')
+
+    def test_regex_matcher_finds_overlapping_keywords(self):
+        matcher = rules._RegexMatcher({'rate': frozenset({0}), 'rate limit': frozenset({1}), 'limit': frozenset({2})})
+        self.assertEqual(matcher.find('rate limit hit'), {0, 1, 2})
+
+    @skipIf(rules.ahocorasick is None, 'pyahocorasick is not installed')
+    def test_matchers_agree(self):
+        keyword_rules = {'rate': frozenset({0}), 'rate limit': frozenset({1}), 'limit': frozenset({2})}
+        text = 'rate limit hit'
+        self.assertEqual(rules._AhoCorasickMatcher(keyword_rules).find(text), rules._RegexMatcher(keyword_rules).find(text))
+
+
+class RuleSetTestCase(TestCase):
+    """Starts every test with no compiled engine; versions repeat across tests."""
+
+    def setUp(self):
+        rules._engines.clear()
+        self.addCleanup(rules._engines.clear)
+
+    def add_rule_set(self, version, *names):
+        rule_set = DetectionRuleSet.objects.create(scope='log', version=version)
+        for position, name in enumerate(names):
+            DetectionRule.objects.create(
+                rule_set=rule_set, position=position, name=name, title=name.title(), pattern=name, keywords=[name]
+            )
+        rule_set.activate()
+        return rule_set
+
+
+class RuleSetTests(RuleSetTestCase):
+    def test_defaults_without_active_rule_set(self):
+        engine = get_engine('log')
+        self.assertEqual(engine.version, 0)
+        self.assertEqual([rule.name for rule in engine.rules], [rule.name for rule in rules.DEFAULT_RULES])
+
+    def test_active_rule_set_is_compiled_once(self):
+        self.add_rule_set(1, 'kaboom')
+        engine = get_engine('log')
+        self.assertEqual(engine.version, 1)
+        self.assertEqual(engine.match('ERROR kaboom').name, 'kaboom')
+        with self.assertNumQueries(1):
+            self.assertIs(get_engine('log'), engine)
+
+    def test_activating_a_version_replaces_the_engine(self):
+        first = self.add_rule_set(1, 'kaboom')
+        get_engine('log')
+        self.add_rule_set(2, 'splat')
+        engine = get_engine('log')
+
+        self.assertEqual(engine.version, 2)
+        self.assertIsNone(engine.match('ERROR kaboom'))
+        self.assertEqual(engine.match('ERROR splat').name, 'splat')
+        first.refresh_from_db()
+        self.assertFalse(first.is_active)
+        self.assertEqual(list(rules._engines), [('log', 2)])
+
+
+def error_event(line_number, message):
+    return {
+        'kind': 'error_line', 'error_type': 'ERROR', 'message': message, 'frames': [],
+        'line_number': line_number, 'byte_offset': 0, 'context': '',
+    }
+
+
+class BackfillTestCase(RuleSetTestCase):
+    """Analyzed logs with one `kaboom` error each, and an active rule set matching them."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(email='dev@example.com', username='dev', password='secret')
+        self.rule_set = self.add_rule_set(1, 'kaboom')
+        self.logs = [
+            Log.objects.create(
+                user=self.user, original_filename=f'app-{i}.log', status='analyzed',
+                analysis_result={'events': [error_event(1, f'ERROR kaboom in worker {i}')]}
+            )
+            for i in range(5)
+        ]
+
+    def backfill(self, **fields):
+        fields = {'batch_size': 2, 'rate_limit': 1000, **fields}
+        return DetectionBackfill.objects.create(
+            rule_set=self.rule_set, created_before=timezone.now() + timedelta(seconds=1), **fields
+        )
+
+    def occurrences(self):
+        return sum(Bug.objects.values_list('occurrence_count', flat=True))
+
+
+@override_settings(BUG_BACKFILL_SLICE_SECONDS=0)
+class BackfillTests(BackfillTestCase):
+    """Each task call runs a single batch, as its time slice is used up right away."""
+
+    def run_slice(self, *args):
+        """Run the task once; return the arguments and countdown it re-queued itself with, if any."""
+        with mock.patch.object(backfill_detection_task, 'apply_async') as requeue:
+            backfill_detection_task(*args)
+        if not requeue.called:
+            return None, None
+        return requeue.call_args.args[0], requeue.call_args.kwargs['countdown']
+
+    def test_cursor_is_saved_after_every_batch(self):
+        backfill = self.backfill()
+        ordered = list(Log.objects.order_by('created_at', 'id'))
+
+        args, _ = self.run_slice(backfill.id)
+        backfill.refresh_from_db()
+        self.assertEqual((backfill.status, backfill.processed_logs, backfill.cursor_log_id), ('running', 2, ordered[1].id))
+        self.assertEqual(str(backfill.lease_id), args[1])
+
+        while args:
+            args, _ = self.run_slice(*args)
+        backfill.refresh_from_db()
+        self.assertEqual((backfill.status, backfill.processed_logs, backfill.created_bugs), ('completed', 5, 1))
+        self.assertIsNone(backfill.lease_id)
+        self.assertEqual(self.occurrences(), 5)
+
+    def test_paused_backfill_resumes_from_its_cursor(self):
+        backfill = self.backfill()
+        args, _ = self.run_slice(backfill.id)
+        DetectionBackfill.objects.filter(id=backfill.id).update(status='paused')
+
+        # The re-queued task stops before its next batch
+        self.assertEqual(self.run_slice(*args), (None, None))
+        backfill.refresh_from_db()
+        self.assertEqual((backfill.status, backfill.processed_logs, backfill.lease_id), ('paused', 2, None))
+        self.assertEqual(self.occurrences(), 2)
+
+        DetectionBackfill.objects.filter(id=backfill.id).update(status='pending')
+        args, _ = self.run_slice(backfill.id)
+        while args:
+            args, _ = self.run_slice(*args)
+        backfill.refresh_from_db()
+        self.assertEqual((backfill.status, backfill.processed_logs), ('completed', 5))
+        self.assertEqual(self.occurrences(), 5)
+
+    def test_rate_limit_sets_the_countdown(self):
+        backfill = self.backfill(rate_limit=1)
+        with mock.patch('apps.bugs.tasks.time.sleep') as sleep:
+            args, countdown = self.run_slice(backfill.id)
+        sleep.assert_not_called()
+        # Two logs at one log per second
+        self.assertGreater(countdown, 1.5)
+        self.assertLessEqual(countdown, 2)
+        backfill.refresh_from_db()
+        self.assertGreater(backfill.lease_expires_at, timezone.now() + timedelta(seconds=countdown))
+
+    @override_settings(BUG_BACKFILL_SLICE_SECONDS=60)
+    def test_rate_limit_paces_batches_within_a_slice(self):
+        backfill = self.backfill(rate_limit=100)
+        with mock.patch('apps.bugs.tasks.time.sleep') as sleep:
+            self.assertEqual(self.run_slice(backfill.id), (None, None))
+        # Slept off the rest of each batch of at most two logs
+        self.assertEqual(sleep.call_count, 3)
+        for call in sleep.call_args_list:
+            self.assertLessEqual(call.args[0], 0.02)
+        backfill.refresh_from_db()
+        self.assertEqual(backfill.status, 'completed')
+
+    def test_backfill_of_inactive_rule_set_is_cancelled(self):
+        backfill = self.backfill()
+        self.add_rule_set(2, 'splat')
+        self.run_slice(backfill.id)
+        backfill.refresh_from_db()
+        self.assertEqual((backfill.status, backfill.processed_logs), ('cancelled', 0))
+        self.assertIn('v1', backfill.error)
+
+
+class BackfillLeaseTests(BackfillTestCase):
+    def test_resume_waits_for_the_task_holding_the_lease(self):
+        lease_id = uuid.uuid4()
+        # Paused and resumed while its task was in a batch
+        backfill = self.backfill(
+            status='pending', lease_id=lease_id, lease_expires_at=timezone.now() + timedelta(minutes=5)
+        )
+        with mock.patch.object(backfill_detection_task, 'apply_async') as retry:
+            backfill_detection_task(backfill.id)
+        retry.assert_called_once()
+        backfill.refresh_from_db()
+        self.assertEqual((backfill.status, backfill.lease_id), ('pending', lease_id))
+
+        # The old task stops before its next batch and lets go of the lease
+        backfill_detection_task(backfill.id, str(lease_id))
+        backfill.refresh_from_db()
+        self.assertEqual((backfill.status, backfill.lease_id, backfill.processed_logs), ('pending', None, 0))
+
+        backfill_detection_task(backfill.id)
+        backfill.refresh_from_db()
+        self.assertEqual((backfill.status, backfill.processed_logs), ('completed', 5))
+        self.assertEqual(self.occurrences(), 5)
+
+    def test_task_without_the_lease_saves_nothing(self):
+        backfill = self.backfill(status='running', lease_id=uuid.uuid4(), lease_expires_at=timezone.now())
+        backfill_detection_task(backfill.id, str(uuid.uuid4()))
+
+        backfill.refresh_from_db()
+        self.assertEqual((backfill.status, backfill.processed_logs), ('running', 0))
+        self.assertFalse(Bug.objects.exists())
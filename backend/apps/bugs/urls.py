@@ -1,9 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import BugViewSet
+from .views import BugViewSet, DetectionBackfillViewSet, DetectionRuleSetViewSet
 
 router = DefaultRouter()
 router.register(r'bugs', BugViewSet, basename='bug')
+router.register(r'rule-sets', DetectionRuleSetViewSet, basename='rule-set')
+router.register(r'backfills', DetectionBackfillViewSet, basename='backfill')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,18 +1,26 @@
-from rest_framework import viewsets, status
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from django.db import transaction
 from django.utils import timezone
-from .models import Bug
-from .serializers import BugSerializer, BugAnalysisSerializer
+from .models import Bug, DetectionBackfill, DetectionRuleSet
+from .serializers import (
+    BugSerializer, BugAnalysisSerializer, BugListSerializer, DetectionBackfillSerializer, DetectionRuleSetSerializer
+)
+from .tasks import backfill_detection_task
+from bugsquash.fieldsets import SparseFieldsetMixin
+from bugsquash.pagination import DetectedAtCursorPagination
 from apps.logs.tasks import analyze_log_task as trigger_log_analysis 
 from apps.logs.models import Log 
 
-class BugViewSet(viewsets.ModelViewSet):
+class BugViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for handling bug operations."""
     
     serializer_class = BugSerializer
+    list_serializer_class = BugListSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = DetectedAtCursorPagination
 
     def get_queryset(self):
         """Return bugs for the current user."""
@@ -62,4 +70,78 @@ class BugViewSet(viewsets.ModelViewSet):
         return Response(
             {'error': 'Can only retry failed or detected bugs'},
             status=status.HTTP_400_BAD_REQUEST
-        ) 
\ No newline at end of file
+        )
+
+
+class DetectionRuleSetViewSet(mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    """ViewSet for versioned bug detection rule sets.
+
+    Rule sets cannot be edited: a change is a new version, which takes
+    effect once activated. Workers pick up the active version on their next
+    task.
+    """
+
+    serializer_class = DetectionRuleSetSerializer
+    permission_classes = [IsAdminUser]
+
+    def get_queryset(self):
+        queryset = DetectionRuleSet.objects.prefetch_related('rules')
+        scope = self.request.query_params.get('scope')
+        if scope:
+            queryset = queryset.filter(scope=scope)
+        return queryset
+
+    @action(detail=True, methods=['post'])
+    def activate(self, request, pk=None):
+        """Make this rule set the active one of its scope."""
+        rule_set = self.get_object()
+        rule_set.activate()
+        return Response(self.get_serializer(rule_set).data)
+
+
+class DetectionBackfillViewSet(mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    """ViewSet for re-running bug detection over stored logs."""
+
+    serializer_class = DetectionBackfillSerializer
+    permission_classes = [IsAdminUser]
+    queryset = DetectionBackfill.objects.select_related('rule_set')
+
+    def perform_create(self, serializer):
+        backfill = serializer.save()
+        transaction.on_commit(lambda: backfill_detection_task.delay(backfill.id))
+
+    def _transition(self, from_statuses, to_status, **fields):
+        """Move the backfill to `to_status` if it is in one of `from_statuses`."""
+        backfill = self.get_object()
+        changed = DetectionBackfill.objects.filter(id=backfill.id, status__in=from_statuses).update(
+            status=to_status, **fields
+        )
+        if not changed:
+            return None
+        backfill.refresh_from_db()
+        return backfill
+
+    @action(detail=True, methods=['post'])
+    def pause(self, request, pk=None):
+        """Stop the backfill after its current batch; it can be resumed."""
+        backfill = self._transition(['pending', 'running'], 'paused')
+        if backfill is None:
+            return Response({'error': 'Only pending or running backfills can be paused'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(backfill).data)
+
+    @action(detail=True, methods=['post'])
+    def resume(self, request, pk=None):
+        """Continue a paused or failed backfill from its saved cursor."""
+        backfill = self._transition(['paused', 'failed'], 'pending', error='', finished_at=None)
+        if backfill is None:
+            return Response({'error': 'Only paused or failed backfills can be resumed'}, status=status.HTTP_400_BAD_REQUEST)
+        transaction.on_commit(lambda: backfill_detection_task.delay(backfill.id))
+        return Response(self.get_serializer(backfill).data)
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """Stop the backfill for good."""
+        backfill = self._transition(['pending', 'running', 'paused', 'failed'], 'cancelled', finished_at=timezone.now())
+        if backfill is None:
+            return Response({'error': 'Backfill has already finished'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(backfill).data)
@@ -0,0 +1,530 @@
+"""Streaming log analysis.
+
+Logs are read line by line through a generator pipeline:
+
+    read_lines -> extract_events -> analyze_stream
+
+so memory use depends on the longest line and the number of events kept,
+never on the size of the log itself. Large logs are split into byte ranges
+that are analyzed independently (`analyze_log_range`) and combined with
+`merge_results`.
+"""
+import re
+import time
+from django.conf import settings
+from .drain import TemplateMiner
+from .line_index import LineIndexWriter
+from .storage import open_log_reader
+
+# Lines longer than this are truncated; the rest of the line is skipped.
+MAX_LINE_BYTES = 64 * 1024
+
+# Stack frames kept per event, the innermost ones.
+MAX_FRAMES = 64
+
+PYTHON_TRACEBACK = 'Traceback (most recent call last):'
+PYTHON_FRAME_RE = re.compile(r'^\s+File "(?P<file>[^"]+)", line (?P<line>\d+)(?:, in (?P<function>.+))?')
+PYTHON_EXCEPTION_RE = re.compile(r'^(?P<type>[A-Za-z_][\w.]*)(?::\s?(?P<message>.*))?$')
+
+JAVA_HEADER_RE = re.compile(
+    r'(?:Exception in thread "[^"]*" )?'
+    r'(?P<type>(?:[a-zA-Z_$][\w$]*\.)+[A-Z][\w$]*(?:Exception|Error|Throwable))'
+    r'(?::\s*(?P<message>.*))?$'
+)
+JAVA_FRAME_RE = re.compile(r'^\s+at (?P<function>[\w$.<>/]+)\((?P<file>[^:)]*)(?::(?P<line>\d+))?\)')
+JAVA_CONTINUATION_RE = re.compile(r'^\s*(Caused by: |Suppressed: |\.\.\. \d+ (more|common frames omitted))')
+
+JS_HEADER_RE = re.compile(r'(?P<type>\b[A-Z]\w*(?:Error|Exception|Rejection))(?::\s*(?P<message>.*))?$')
+JS_FRAME_RE = re.compile(
+    r'^\s+at (?:(?P<function>.+?) \()?(?P<file>(?:[a-z]+:)?[^():]+):(?P<line>\d+):\d+\)?$'
+)
+JS_CONTINUATION_RE = re.compile(r'^\s+at ')
+
+ERROR_LINE_RE = re.compile(
+    r'\b(?P<level>ERROR|FATAL|CRITICAL|SEVERE|PANIC)\b|^panic: |\b[A-Z]\w*(?:Error|Exception)(?:: |$)'
+)
+LEVEL_RE = re.compile(r'\b(TRACE|DEBUG|INFO|NOTICE|WARN|WARNING|ERROR|FATAL|CRITICAL|SEVERE)\b')
+INDENT = (' ', '\t')
+
+
+def _may_be_error(text):
+    """Cheap substring prefilter run before ERROR_LINE_RE."""
+    return (
+        'Error' in text or 'ERROR' in text or 'Exception' in text or 'FATAL' in text
+        or 'CRITICAL' in text or 'SEVERE' in text or 'PANIC' in text or 'panic: ' in text
+    )
+
+
+class LineReader:
+    """Iterates over (line_number, byte_offset, text) for each line in a binary stream.
+
+    Lines longer than MAX_LINE_BYTES are truncated so a single runaway line
+    cannot exhaust memory. Reading stops at `end_offset` when one is given.
+    Afterwards `offset` is where reading stopped and `newline` tells whether
+    the last line read was terminated.
+    """
+
+    def __init__(self, stream, start_offset=0, start_line=1, end_offset=None):
+        self.stream = stream
+        self.offset = start_offset
+        self.line_number = start_line
+        self.end_offset = end_offset
+        self.newline = True
+
+    def __iter__(self):
+        stream = self.stream
+        while self.end_offset is None or self.offset < self.end_offset:
+            raw = stream.readline(MAX_LINE_BYTES)
+            if not raw:
+                break
+            line_offset = self.offset
+            self.offset += len(raw)
+            self.newline = raw.endswith(b'\n')
+            if not self.newline:
+                # Skip the remainder of an over-long line.
+                while True:
+                    rest = stream.readline(MAX_LINE_BYTES)
+                    self.offset += len(rest)
+                    self.newline = rest.endswith(b'\n')
+                    if not rest or self.newline:
+                        break
+            yield self.line_number, line_offset, raw.rstrip(b'\r\n').decode('utf-8', errors='replace')
+            self.line_number += 1
+
+
+def read_lines(stream, start_offset=0, start_line=1, end_offset=None):
+    """Yield (line_number, byte_offset, text) for each line in a binary stream."""
+    return iter(LineReader(stream, start_offset, start_line, end_offset))
+
+
+def _event(kind, error_type, message, line_number, byte_offset, frames=None, context=''):
+    return {
+        'kind': kind,
+        'error_type': error_type,
+        'message': message[:1000],
+        'frames': frames or [],
+        'line_number': line_number,
+        'byte_offset': byte_offset,
+        'context': context[:1000],
+    }
+
+
+def _frame(match):
+    line = match.group('line')
+    return {
+        'file': match.group('file'),
+        'line': int(line) if line else None,
+        'function': (match.group('function') or '').strip(),
+    }
+
+
+class StackTraceParser:
+    """Incremental parser that turns log lines into structured error events.
+
+    Recognizes Python tracebacks, Java and JavaScript/Node stack traces and
+    single error lines. `feed` returns the events completed by a line; call
+    `flush` at the end of the stream to emit any trace still open. Event
+    frames are listed outermost first whatever the language, and only the
+    innermost MAX_FRAMES are kept.
+    A parser created from `state()` continues where that parser stopped.
+    """
+
+    def __init__(self, state=None):
+        state = state or {}
+        self.trace = state.get('trace')
+        self.candidate = state.get('candidate')
+
+    def state(self):
+        """Return the parser's pending trace and error line, for resuming it later."""
+        return {'trace': self.trace, 'candidate': self.candidate}
+
+    def feed(self, line_number, byte_offset, text):
+        events = []
+        if self.trace is not None:
+            if self._continue_trace(text):
+                return events
+            events.append(self._close_trace())
+
+        if PYTHON_TRACEBACK in text:
+            self._open_python_trace(line_number, byte_offset)
+            return events
+
+        if self.candidate and text[:1] in INDENT:
+            java_frame = JAVA_FRAME_RE.match(text)
+            js_frame = None if java_frame else JS_FRAME_RE.match(text)
+            if java_frame or js_frame:
+                self._open_trace('java' if java_frame else 'javascript', java_frame or js_frame)
+                return events
+
+        if self.candidate:
+            events.append(self._close_candidate())
+        if _may_be_error(text) and ERROR_LINE_RE.search(text):
+            self.candidate = {'line_number': line_number, 'byte_offset': byte_offset, 'text': text}
+        return events
+
+    def extend(self, line_number, byte_offset, text):
+        """Feed a line past the end of the parser's range.
+
+        Only a stack trace open at the end of the range, or one the pending
+        error line starts, may consume it. Returns False once the line is
+        not part of that trace.
+        """
+        if self.trace is not None:
+            return self._continue_trace(text)
+        if self.candidate and PYTHON_TRACEBACK in text:
+            self._open_python_trace(line_number, byte_offset)
+            return True
+        if self.candidate and text[:1] in INDENT:
+            java_frame = JAVA_FRAME_RE.match(text)
+            js_frame = None if java_frame else JS_FRAME_RE.match(text)
+            if java_frame or js_frame:
+                self._open_trace('java' if java_frame else 'javascript', java_frame or js_frame)
+                return True
+        return False
+
+    def flush(self):
+        events = []
+        if self.trace is not None:
+            events.append(self._close_trace())
+        if self.candidate:
+            events.append(self._close_candidate())
+        return events
+
+    def _open_python_trace(self, line_number, byte_offset):
+        context = self.candidate['text'] if self.candidate else ''
+        self.candidate = None
+        self.trace = {
+            'kind': 'python', 'line_number': line_number, 'byte_offset': byte_offset,
+            'frames': [], 'context': context, 'error_type': '', 'message': '',
+        }
+
+    def _open_trace(self, kind, frame_match):
+        candidate = self.candidate
+        self.candidate = None
+        header = (JAVA_HEADER_RE if kind == 'java' else JS_HEADER_RE).search(candidate['text'])
+        self.trace = {
+            'kind': kind,
+            'line_number': candidate['line_number'],
+            'byte_offset': candidate['byte_offset'],
+            'frames': [_frame(frame_match)],
+            'context': '' if header else candidate['text'],
+            'error_type': header.group('type') if header else '',
+            'message': (header.group('message') or '') if header else candidate['text'],
+        }
+
+    def _continue_trace(self, text):
+        """Consume `text` if it belongs to the open trace."""
+        trace = self.trace
+        if trace['kind'] == 'python':
+            frame = PYTHON_FRAME_RE.match(text)
+            if frame:
+                # Python prints the innermost frame last; those are the ones kept
+                trace['frames'].append(_frame(frame))
+                if len(trace['frames']) > MAX_FRAMES:
+                    del trace['frames'][0]
+                return True
+            if not text or text[0].isspace():
+                # Source context lines and carets under a frame.
+                return True
+            if not trace['error_type']:
+                exception = PYTHON_EXCEPTION_RE.match(text)
+                if exception:
+                    trace['error_type'] = exception.group('type')
+                    trace['message'] = exception.group('message') or ''
+                    return True
+            return False
+
+        frame = (JAVA_FRAME_RE if trace['kind'] == 'java' else JS_FRAME_RE).match(text)
+        if frame:
+            if len(trace['frames']) < MAX_FRAMES:
+                trace['frames'].append(_frame(frame))
+            return True
+        continuation = JAVA_CONTINUATION_RE if trace['kind'] == 'java' else JS_CONTINUATION_RE
+        return bool(continuation.match(text))
+
+    def _close_trace(self):
+        trace = self.trace
+        self.trace = None
+        frames = trace['frames']
+        if trace['kind'] != 'python':
+            # Java and JavaScript print the innermost frame first
+            frames = frames[::-1]
+        return _event(
+            trace['kind'], trace['error_type'] or 'UnknownError', trace['message'],
+            trace['line_number'], trace['byte_offset'], frames, trace['context'],
+        )
+
+    def _close_candidate(self):
+        candidate = self.candidate
+        self.candidate = None
+        match = ERROR_LINE_RE.search(candidate['text'])
+        error_type = match.group('level') or match.group(0).strip().rstrip(':')
+        return _event(
+            'error_line', error_type, candidate['text'],
+            candidate['line_number'], candidate['byte_offset'],
+        )
+
+
+def extract_events(lines, parser=None, flush=True):
+    """Yield error events from an iterable of (line_number, offset, text)."""
+    parser = parser or StackTraceParser()
+    for line_number, byte_offset, text in lines:
+        yield from parser.feed(line_number, byte_offset, text)
+    if flush:
+        yield from parser.flush()
+
+
+class LineCounter:
+    """Pass-through stage that tracks line and log level statistics.
+
+    When given a LineIndexWriter, it also records each line's offset, and
+    when given a TemplateMiner, it assigns each line to a template.
+    """
+
+    def __init__(self, lines, index=None, miner=None):
+        self.lines = lines
+        self.index = index
+        self.miner = miner
+        self.line_count = 0
+        self.level_counts = {}
+
+    def __iter__(self):
+        for line_number, byte_offset, text in self.lines:
+            self.line_count += 1
+            if self.index is not None:
+                self.index.append(byte_offset)
+            if self.miner is not None:
+                self.miner.add(text, line_number)
+            level = LEVEL_RE.search(text)
+            if level:
+                name = level.group(1)
+                self.level_counts[name] = self.level_counts.get(name, 0) + 1
+            yield line_number, byte_offset, text
+
+
+class EventCollector:
+    """Counts events and keeps the first `max_events` of them."""
+
+    def __init__(self, max_events):
+        self.max_events = max_events
+        self.events = []
+        self.event_counts = {}
+        self.total_events = 0
+
+    def extend(self, events):
+        for event in events:
+            self.total_events += 1
+            self.event_counts[event['kind']] = self.event_counts.get(event['kind'], 0) + 1
+            if len(self.events) < self.max_events:
+                self.events.append(event)
+
+
+def analyze_stream(stream, max_events=None, index=None, miner=None, end_offset=None,
+                   start_offset=None, start_line=1, parser=None):
+    """Run the analysis pipeline over a binary stream and summarize it.
+
+    Reading starts at the stream's current position, which must be the
+    start of a line at `start_offset` in the log (by default the stream
+    position). With `end_offset`, lines starting at or after it are left to
+    the next range, except that a stack trace still open at the boundary
+    reads on; `trace_end` is the offset of the first line after it.
+
+    Only the first `max_events` events are kept; the rest are counted. The
+    `checkpoint` in the summary holds what a later run needs to resume the
+    analysis at the end of the stream.
+    """
+    if max_events is None:
+        max_events = settings.LOG_ANALYSIS_MAX_EVENTS
+
+    started = time.monotonic()
+    if start_offset is None:
+        start_offset = stream.tell()
+    reader = LineReader(stream, start_offset, start_line, end_offset)
+    counter = LineCounter(reader, index, miner)
+    parser = parser or StackTraceParser()
+    collector = EventCollector(max_events)
+    collector.extend(extract_events(counter, parser, flush=False))
+
+    range_end = trace_end = reader.offset
+    if end_offset is not None and range_end >= end_offset:
+        tail = LineReader(stream, range_end, start_line + counter.line_count)
+        for line_number, byte_offset, text in tail:
+            trace_end = byte_offset
+            if not parser.extend(line_number, byte_offset, text):
+                break
+        else:
+            trace_end = tail.offset
+    state = parser.state()
+    flushed = parser.flush()
+    collector.extend(flushed)
+
+    duration = time.monotonic() - started
+    bytes_read = range_end - start_offset
+
+    return {
+        'lines': counter.line_count,
+        'bytes': bytes_read,
+        'level_counts': counter.level_counts,
+        'event_counts': collector.event_counts,
+        'total_events': collector.total_events,
+        'events': collector.events,
+        'template_count': len(miner.clusters) if miner is not None else None,
+        'trace_end': trace_end,
+        'checkpoint': {
+            'offset': range_end,
+            'parser': state,
+            # Events emitted only because the stream ended; a resumed run
+            # withdraws them, as the parser may still extend them.
+            'flushed': [[event['byte_offset'], event['kind']] for event in flushed],
+            'newline': reader.newline,
+        },
+        'duration_seconds': round(duration, 3),
+        'throughput_mb_s': round(bytes_read / (1024 * 1024) / duration, 2) if duration else None,
+    }
+
+
+def plan_shards(size, shard_size, seek_points=None):
+    """Split `size` bytes into (start, end) ranges of about `shard_size` bytes.
+
+    The ranges are nominal byte ranges; `analyze_log_range` aligns them to
+    line boundaries, so no line is read by two shards. A compressed log can
+    only be read from its `seek_points` without decompressing everything
+    before, so given those, ranges start at the first seek point at least
+    `shard_size` bytes into the previous range.
+    """
+    if not size or size <= shard_size:
+        return [(0, None)]
+    if seek_points is None:
+        starts = list(range(0, size, shard_size))
+    else:
+        starts = [0]
+        for raw_offset, _ in seek_points:
+            if raw_offset - starts[-1] >= shard_size and raw_offset < size:
+                starts.append(raw_offset)
+    return list(zip(starts, [*starts[1:], None]))
+
+
+def analyze_log_range(log, start=0, end=None):
+    """Analyze the lines of a log starting in the byte range [start, end).
+
+    A range that does not start at 0 begins at the first line starting at
+    or after `start`; in a compressed log, it must start at one of the
+    log's seek points. Returns the analysis summary, the TemplateMiner and
+    the LineIndexWriter holding the range's line offsets.
+    """
+    index = LineIndexWriter()
+    miner = TemplateMiner(max_clusters=settings.LOG_TEMPLATE_MAX_CLUSTERS)
+    if start > 0 and log.compression != 'none':
+        # Seek points start a line, and decompression can start there
+        with open_log_reader(log, dict(log.seek_points)[start]) as stream:
+            result = analyze_stream(stream, index=index, miner=miner, end_offset=end, start_offset=start)
+        return result, miner, index
+
+    with open_log_reader(log) as stream:
+        if start > 0:
+            # Skip the line running into the range; it belongs to the previous shard.
+            stream.seek(start - 1)
+            while True:
+                rest = stream.readline(MAX_LINE_BYTES)
+                if not rest or rest.endswith(b'\n'):
+                    break
+        result = analyze_stream(stream, index=index, miner=miner, end_offset=end)
+    return result, miner, index
+
+
+def merge_results(results, max_events=None, rebase=True):
+    """Combine the summaries of consecutive ranges into one log summary.
+
+    `results` are range summaries in log order. With `rebase`, line numbers
+    relative to each range are rebased onto the whole log. Events a range found inside
+    the tail of a stack trace that the preceding range read on to finish
+    are dropped, so a trace split across ranges is reported once.
+    """
+    if max_events is None:
+        max_events = settings.LOG_ANALYSIS_MAX_EVENTS
+
+    merged = {
+        'lines': 0,
+        'bytes': 0,
+        'level_counts': {},
+        'event_counts': {},
+        'total_events': 0,
+        'events': [],
+        'duration_seconds': 0.0,
+    }
+    trace_end = 0
+    for result in results:
+        line_base = merged['lines'] if rebase else 0
+        for key in ('level_counts', 'event_counts'):
+            for name, count in result[key].items():
+                merged[key][name] = merged[key].get(name, 0) + count
+        merged['total_events'] += result['total_events']
+        for event in result['events']:
+            if event['byte_offset'] < trace_end:
+                merged['event_counts'][event['kind']] -= 1
+                merged['total_events'] -= 1
+            elif len(merged['events']) < max_events:
+                merged['events'].append(dict(event, line_number=event['line_number'] + line_base))
+        merged['lines'] += result['lines']
+        merged['bytes'] += result['bytes']
+        trace_end = result.get('trace_end', 0)
+        merged['duration_seconds'] += result['duration_seconds']
+    merged['duration_seconds'] = round(merged['duration_seconds'], 3)
+    return merged
+
+
+def analyze_log_tail(log, previous, checkpoint, miner):
+    """Analyze the text appended to a log since the analysis `previous`.
+
+    `checkpoint` is the checkpoint saved with `previous`, extended with the
+    compressed offset of the appended text; `miner` holds the log's
+    templates so far. Only the appended text is read. Returns the summary of
+    the whole log and that of the tail; the line index is extended and
+    attached to the log, the caller is responsible for saving it.
+    """
+    index = LineIndexWriter()
+    if log.line_index:
+        with log.line_index.open('rb') as fh:
+            index.copy_from(fh)
+
+    withdrawn = {offset for offset, kind in checkpoint['flushed']}
+    previous = dict(
+        previous,
+        events=[event for event in previous['events'] if event['byte_offset'] not in withdrawn],
+        event_counts=dict(previous['event_counts']),
+        total_events=previous['total_events'] - len(withdrawn),
+    )
+    for offset, kind in checkpoint['flushed']:
+        previous['event_counts'][kind] -= 1
+
+    with open_log_reader(log, checkpoint['stored_offset']) as stream:
+        start_offset = checkpoint['offset']
+        if not checkpoint['newline']:
+            # The newline completing the last line, which was analyzed already.
+            start_offset += len(stream.readline(MAX_LINE_BYTES))
+        tail = analyze_stream(
+            stream, index=index, miner=miner,
+            start_offset=start_offset,
+            start_line=previous['lines'] + 1,
+            parser=StackTraceParser(checkpoint['parser']),
+        )
+    index.save(log)
+    if not tail['lines']:
+        tail['checkpoint']['newline'] = checkpoint['newline']
+
+    result = merge_results([previous, tail], rebase=False)
+    result['template_count'] = tail['template_count']
+    result['throughput_mb_s'] = tail['throughput_mb_s']
+    return result, tail
+
+
+def analyze_log(log):
+    """Analyze a whole Log in a single pass.
+
+    Returns the analysis summary and the TemplateMiner holding the log's
+    message templates. The line-offset index is built in the same pass and
+    attached to the log; the caller is responsible for saving it.
+    """
+    result, miner, index = analyze_log_range(log)
+    index.save(log)
+    return result, miner
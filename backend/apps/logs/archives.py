@@ -0,0 +1,158 @@
+"""Ingesting uploaded log archives.
+
+Uploaded .gz, .bz2, .zip and tar archives (plain or gzip/bz2 compressed)
+are decompressed while they are read, one member at a time, and each
+member is streamed straight into `save_log_file`. No archive is ever
+expanded on disk or in memory. An archive with a single log becomes that
+log; an archive with several becomes a parent Log with one child per
+member.
+"""
+import bz2
+import gzip
+import os
+import tarfile
+import zipfile
+from django.conf import settings
+from .models import Log
+from .storage import save_log_file
+
+GZIP_MAGIC = b'\x1f\x8b'
+BZIP2_MAGIC = b'BZh'
+ZIP_MAGIC = b'PK\x03\x04'
+TAR_MAGIC_OFFSET = 257
+TAR_MAGIC = b'ustar'
+
+COMPRESSED_SUFFIXES = ('.gz', '.gzip', '.bz2')
+
+
+class ArchiveError(Exception):
+    """Raised for archives that cannot be ingested."""
+
+
+class _LimitedReader:
+    """Binary stream wrapper that refuses to read past `limit` bytes.
+
+    Guards against archives that decompress to far more than was uploaded.
+    """
+
+    def __init__(self, stream, name, limit):
+        self.stream = stream
+        self.name = name
+        self.limit = limit
+        self.read_bytes = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.read_bytes += len(data)
+        if self.read_bytes > self.limit:
+            raise ArchiveError(f"{self.name} decompresses to more than {self.limit} bytes")
+        return data
+
+
+def _is_tar(head):
+    return head[TAR_MAGIC_OFFSET:TAR_MAGIC_OFFSET + len(TAR_MAGIC)] == TAR_MAGIC
+
+
+def archive_format(source):
+    """Return 'gzip', 'bzip2', 'zip' or 'tar' for an archive, or None for plain text.
+
+    Detection uses the magic bytes only, so misnamed files are handled. The
+    source must be seekable; it is rewound afterwards.
+    """
+    head = source.read(512)
+    source.seek(0)
+    if head.startswith(ZIP_MAGIC):
+        return 'zip'
+    if head.startswith(GZIP_MAGIC) or head.startswith(BZIP2_MAGIC):
+        opener = gzip.open if head.startswith(GZIP_MAGIC) else bz2.open
+        try:
+            inner = opener(source, mode='rb').read(512)
+        except (OSError, EOFError):
+            inner = b''
+        source.seek(0)
+        if _is_tar(inner):
+            return 'tar'
+        return 'gzip' if head.startswith(GZIP_MAGIC) else 'bzip2'
+    if _is_tar(head):
+        return 'tar'
+    return None
+
+
+def _member_name(filename):
+    """Name of the single file in a .gz or .bz2 archive."""
+    base, ext = os.path.splitext(os.path.basename(filename))
+    return base if ext.lower() in COMPRESSED_SUFFIXES else filename
+
+
+def iter_members(source, fmt, filename):
+    """Yield (name, stream) for each regular file in an archive, in archive order.
+
+    Each stream must be consumed before the next member is requested; tar
+    archives are read in streaming mode and cannot go back.
+    """
+    if fmt == 'gzip':
+        yield _member_name(filename), gzip.open(source, mode='rb')
+    elif fmt == 'bzip2':
+        yield _member_name(filename), bz2.open(source, mode='rb')
+    elif fmt == 'zip':
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    with archive.open(info) as member:
+                        yield info.filename, member
+    elif fmt == 'tar':
+        with tarfile.open(fileobj=source, mode='r|*') as archive:
+            for info in archive:
+                if info.isfile():
+                    yield info.name, archive.extractfile(info)
+
+
+def ingest_file(log, source, filename):
+    """Store an uploaded file as the text of `log`, expanding archives.
+
+    Plain files are stored as they are. For an archive with one member, the
+    member's text becomes the log's. For several members, `log` becomes
+    their parent and the unsaved child logs are returned; the caller saves
+    `log` first and then the children. Neither is saved here.
+    """
+    fmt = archive_format(source)
+    if fmt is None:
+        save_log_file(log, source, filename)
+        return []
+
+    children = []
+    try:
+        for name, member in iter_members(source, fmt, filename):
+            child = Log(
+                user=log.user,
+                repository=log.repository,
+                parent=log,
+                original_filename=name[:255],
+                status='pending'
+            )
+            save_log_file(child, _LimitedReader(member, name, settings.LOG_UPLOAD_MAX_SIZE), name)
+            children.append(child)
+    except (ArchiveError, OSError, EOFError, tarfile.TarError, zipfile.BadZipFile) as e:
+        for child in children:
+            child.file.delete(save=False)
+        if isinstance(e, ArchiveError):
+            raise
+        raise ArchiveError(f"Could not read {fmt} archive {filename}: {e}") from e
+
+    if not children:
+        raise ArchiveError(f"Archive {filename} contains no files")
+
+    if len(children) == 1:
+        # The stored member becomes the log itself
+        child = children[0]
+        log.file = child.file.name
+        for field in ('compression', 'raw_size', 'stored_size', 'compression_ratio', 'seek_points'):
+            setattr(log, field, getattr(child, field))
+        return []
+
+    # The parent only groups its members; it has no text of its own to analyze
+    log.status = 'analyzed'
+    log.raw_size = sum(child.raw_size for child in children)
+    log.stored_size = sum(child.stored_size for child in children)
+    log.analysis_result = {'archive': fmt, 'members': len(children)}
+    return children
@@ -0,0 +1,140 @@
+"""Online log template mining, after the Drain algorithm.
+
+Drain assigns every line to a template in a single pass using a
+fixed-depth parse tree: lines are routed by token count and then by their
+first few tokens to a small list of candidate templates, and joined to the
+most similar one. Positions where lines of one template disagree become
+wildcards, so "session opened for alice" and "session opened for bob" end
+up as "session opened for <*>". Tokens containing digits are masked up
+front, so IDs, timestamps and durations never split a template.
+
+He et al., "Drain: An Online Log Parsing Approach with Fixed Depth Tree",
+ICWS 2017.
+"""
+import re
+
+WILDCARD = '<*>'
+
+# Template of the cluster counting lines beyond `max_clusters`.
+OVERFLOW_TEMPLATE = '<unclustered>'
+
+DIGIT_RE = re.compile(r'\d')
+
+
+class LogCluster:
+    """A template and the number of lines assigned to it."""
+
+    __slots__ = ('id', 'tokens', 'count', 'first_line')
+
+    def __init__(self, cluster_id, tokens, first_line):
+        self.id = cluster_id
+        self.tokens = tokens
+        self.count = 0
+        self.first_line = first_line
+
+    @property
+    def template(self):
+        return ' '.join(self.tokens)
+
+
+class TemplateMiner:
+    """Drain parse tree mapping log lines to template clusters.
+
+    depth           prefix tokens used to route a line (tree depth minus the
+                    token-count level)
+    similarity      minimum fraction of matching tokens to join a cluster
+    max_children    children per tree node before new tokens share a
+                    wildcard branch
+    max_clusters    clusters kept; further unmatched lines are counted in
+                    one overflow cluster
+    """
+
+    def __init__(self, depth=2, similarity=0.5, max_children=100, max_clusters=5000):
+        self.depth = depth
+        self.similarity = similarity
+        self.max_children = max_children
+        self.max_clusters = max_clusters
+        self.root = {}
+        self.clusters = []
+        self.overflow = None
+
+    def add(self, text, line_number=0):
+        """Assign a line to a cluster and return the cluster."""
+        tokens = [WILDCARD if DIGIT_RE.search(token) else token for token in text.split()]
+        return self._add(tokens, 1, line_number)
+
+    def add_template(self, template, count, first_line=0):
+        """Fold in a template mined elsewhere, e.g. by the miner of another log range.
+
+        Templates must be added in log order so `first_line` stays the
+        earliest line of each cluster.
+        """
+        if template == OVERFLOW_TEMPLATE:
+            return self._add_overflow(count, first_line)
+        return self._add(template.split(), count, first_line)
+
+    def _add(self, tokens, count, line_number):
+        leaf = self._leaf(tokens)
+        cluster = self._best_match(leaf, tokens)
+        if cluster is None:
+            if len(self.clusters) >= self.max_clusters:
+                return self._add_overflow(count, line_number)
+            cluster = LogCluster(len(self.clusters) + 1, tokens, line_number)
+            self.clusters.append(cluster)
+            leaf.append(cluster)
+        else:
+            self._merge(cluster, tokens)
+        cluster.count += count
+        return cluster
+
+    def _add_overflow(self, count, line_number):
+        if self.overflow is None:
+            self.overflow = LogCluster(0, [OVERFLOW_TEMPLATE], line_number)
+        self.overflow.count += count
+        return self.overflow
+
+    def templates(self):
+        """Return all clusters with at least one line, largest first."""
+        clusters = list(self.clusters)
+        if self.overflow is not None:
+            clusters.append(self.overflow)
+        return sorted(clusters, key=lambda cluster: cluster.count, reverse=True)
+
+    def _leaf(self, tokens):
+        """Walk (and grow) the tree to the cluster list for `tokens`."""
+        node = self.root.setdefault(len(tokens), {})
+        for token in tokens[:self.depth]:
+            child = node.get(token)
+            if child is None:
+                if token != WILDCARD and len(node) >= self.max_children:
+                    token = WILDCARD
+                child = node.setdefault(token, {})
+            node = child
+        return node.setdefault(None, [])
+
+    def _best_match(self, clusters, tokens):
+        for cluster in clusters:
+            if cluster.tokens == tokens:
+                return cluster
+
+        best, best_score = None, -1.0
+        for cluster in clusters:
+            # Wildcards created by merging only match lines masked there too,
+            # so two lines sharing nothing but their variables stay apart.
+            matches = 0
+            for template_token, token in zip(cluster.tokens, tokens):
+                if template_token == token:
+                    matches += 1
+            score = matches / len(tokens) if tokens else 1.0
+            if score > best_score:
+                best, best_score = cluster, score
+        if best is not None and best_score >= self.similarity:
+            return best
+        return None
+
+    def _merge(self, cluster, tokens):
+        if cluster.tokens == tokens:
+            return
+        for position, (template_token, token) in enumerate(zip(cluster.tokens, tokens)):
+            if template_token != token and template_token != WILDCARD:
+                cluster.tokens[position] = WILDCARD
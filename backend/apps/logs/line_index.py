@@ -0,0 +1,240 @@
+"""Line-offset index for random access into log text.
+
+The index is a flat array of native-endian uint64 byte offsets, one per
+line, built while the analyzer streams the log and stored next to it as a
+sidecar file. Pages are served from a memory-mapped, uncompressed local
+copy of the log, so reading any range of lines costs two index lookups and
+one slice regardless of log size. The local copies are kept within
+LOG_CACHE_MAX_SIZE, evicting the least recently used.
+"""
+import mmap
+import os
+import tempfile
+from array import array
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from .storage import CHUNK_SIZE, open_log_reader
+
+# Offsets buffered in memory before they are flushed to the index file.
+FLUSH_EVERY = 64 * 1024
+
+INDEX_TYPECODE = 'Q'
+
+# Suffix of local copies being written
+TMP_SUFFIX = '.tmp'
+
+
+class LineIndexWriter:
+    """Accumulates line start offsets into a temporary file."""
+
+    def __init__(self):
+        self.file = tempfile.TemporaryFile()
+        self.buffer = array(INDEX_TYPECODE)
+        self.count = 0
+
+    def append(self, offset):
+        self.buffer.append(offset)
+        if len(self.buffer) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        self.buffer.tofile(self.file)
+        self.count += len(self.buffer)
+        self.buffer = array(INDEX_TYPECODE)
+
+    def copy_from(self, source):
+        """Append the offsets of an index file, e.g. of an earlier range of the log."""
+        self.flush()
+        while True:
+            data = source.read(CHUNK_SIZE)
+            if not data:
+                break
+            self.file.write(data)
+            self.count += len(data) // self.buffer.itemsize
+
+    def save(self, log):
+        """Store the index as the log's sidecar file (the log is not saved)."""
+        self.flush()
+        self.file.seek(0)
+        if log.line_index:
+            log.line_index.delete(save=False)
+        log.line_index.save(f"{log.id}.idx", File(self.file), save=False)
+        log.line_count = self.count
+        self.file.close()
+
+    def save_part(self, log, part):
+        """Store the index of one range of the log; returns the storage name."""
+        self.flush()
+        self.file.seek(0)
+        name = default_storage.save(f"logs/index/parts/{log.id}.{part}.idx", File(self.file))
+        self.file.close()
+        return name
+
+
+def join_index_parts(log, names):
+    """Concatenate range indexes, in log order, into the log's sidecar file.
+
+    Offsets in each part are absolute, so the parts are copied as they are.
+    The parts are deleted afterwards; the log is not saved.
+    """
+    writer = LineIndexWriter()
+    for name in names:
+        with default_storage.open(name, 'rb') as part:
+            writer.copy_from(part)
+    writer.save(log)
+    for name in names:
+        default_storage.delete(name)
+
+
+def _cache_path(log, suffix, version):
+    """Path of a local copy; `version` changes with what is copied, so a stale copy is never read."""
+    return os.path.join(settings.LOG_CACHE_DIR, f"{log.id}.{version}{suffix}")
+
+
+def _materialize(path, source):
+    """Copy a stream to `path` atomically, so concurrent readers never see a partial file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=TMP_SUFFIX)
+    with os.fdopen(fd, 'wb') as out, source:
+        while True:
+            data = source.read(CHUNK_SIZE)
+            if not data:
+                break
+            out.write(data)
+    os.replace(tmp_path, path)
+
+
+def _trim_cache(keep):
+    """Remove the least recently used copies until the cache fits in LOG_CACHE_MAX_SIZE.
+
+    Recent use is the modification time, which _cached bumps on every hit.
+    Copies that are memory-mapped stay readable until they are unmapped.
+    """
+    entries = []
+    with os.scandir(settings.LOG_CACHE_DIR) as it:
+        for entry in it:
+            if entry.name.endswith(TMP_SUFFIX) or entry.path == keep:
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries) + os.path.getsize(keep)
+    for _, size, path in sorted(entries):
+        if total <= settings.LOG_CACHE_MAX_SIZE:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def _cached(path, open_source):
+    """Return `path`, copying the stream returned by `open_source` there unless it is cached."""
+    try:
+        os.utime(path)
+        return path
+    except FileNotFoundError:
+        pass
+    _materialize(path, open_source())
+    _trim_cache(path)
+    return path
+
+
+def clear_local_cache(log):
+    """Remove the local copies of a log and its index, e.g. after re-analysis."""
+    prefix = f"{log.id}."
+    try:
+        with os.scandir(settings.LOG_CACHE_DIR) as it:
+            paths = [entry.path for entry in it if entry.name.startswith(prefix)]
+    except FileNotFoundError:
+        return
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def local_log_path(log):
+    """Return a local path holding the uncompressed text of a log."""
+    if log.file and log.compression == 'none' and not log.segments.exists():
+        try:
+            return log.file.path
+        except NotImplementedError:
+            pass  # Remote storage, fall through to the local cache
+
+    return _cached(_cache_path(log, '.log', log.raw_size), lambda: open_log_reader(log))
+
+
+def local_index_path(log):
+    """Return a local path holding the line index, building it if needed."""
+    if not log.line_index:
+        # Logs analyzed before the index existed: build it from the local copy.
+        writer = LineIndexWriter()
+        with open(local_log_path(log), 'rb') as fh:
+            offset = 0
+            for line in fh:
+                writer.append(offset)
+                offset += len(line)
+        writer.save(log)
+        log.save(update_fields=['line_index', 'line_count'])
+
+    return _cached(_cache_path(log, '.idx', log.line_count), lambda: log.line_index.open('rb'))
+
+
+def _map(path):
+    """Memory-map a file read-only; returns None for empty files."""
+    with open(path, 'rb') as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class LogPager:
+    """Serves line and byte ranges of a log from memory-mapped files."""
+
+    def __init__(self, log):
+        self.data = _map(local_log_path(log))
+        self.index_map = _map(local_index_path(log))
+        self.offsets = memoryview(self.index_map).cast(INDEX_TYPECODE) if self.index_map else []
+        self.size = len(self.data) if self.data else 0
+
+    @property
+    def line_count(self):
+        return len(self.offsets)
+
+    def lines(self, offset, limit):
+        """Return up to `limit` lines starting at line `offset` (0-based)."""
+        if offset >= self.line_count or limit <= 0:
+            return []
+        start = self.offsets[offset]
+        end_line = offset + limit
+        end = self.offsets[end_line] if end_line < self.line_count else self.size
+        text = self.data[start:end].decode('utf-8', errors='replace')
+        if text.endswith('\n'):
+            text = text[:-1]
+        return [line.rstrip('\r') for line in text.split('\n')]
+
+    def byte_range(self, start, end):
+        """Return the bytes in [start, end), clamped to the log size."""
+        if not self.data:
+            return b''
+        return self.data[max(start, 0):min(end, self.size)]
+
+    def close(self):
+        if isinstance(self.offsets, memoryview):
+            self.offsets.release()
+        for mapped in (self.index_map, self.data):
+            if mapped is not None:
+                mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
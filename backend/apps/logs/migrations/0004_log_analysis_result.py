@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-17 23:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0003_log_upload_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='log',
+            name='analysis_result',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.2 on 2026-10-17 23:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0004_log_analysis_result'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='log',
+            name='compression',
+            field=models.CharField(choices=[('none', 'None'), ('gzip', 'gzip'), ('zstd', 'Zstandard')], default='none', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='log',
+            name='compression_ratio',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='log',
+            name='raw_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='log',
+            name='stored_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
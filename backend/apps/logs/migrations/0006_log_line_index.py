@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-17 23:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0005_log_compression'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='log',
+            name='line_count',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='log',
+            name='line_index',
+            field=models.FileField(blank=True, upload_to='logs/index/'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.2 on 2026-10-17 23:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0006_log_line_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('template_id', models.IntegerField()),
+                ('template', models.TextField()),
+                ('count', models.BigIntegerField(default=0)),
+                ('first_line', models.BigIntegerField(default=0)),
+                ('log', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='templates', to='logs.log')),
+            ],
+            options={
+                'ordering': ['-count'],
+                'constraints': [models.UniqueConstraint(fields=('log', 'template_id'), name='logs_template_unique_id')],
+            },
+        ),
+    ]
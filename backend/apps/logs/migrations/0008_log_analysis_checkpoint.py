@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0007_log_template'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='log',
+            name='analysis_checkpoint',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
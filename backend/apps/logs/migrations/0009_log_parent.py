@@ -0,0 +1,19 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0008_log_analysis_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='log',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='logs.log'),
+        ),
+    ]
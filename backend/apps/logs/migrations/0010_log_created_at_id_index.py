@@ -0,0 +1,24 @@
+# Generated by Django 5.0.2 on 2026-10-18 12:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('github_integration', '0002_alter_githubrepository_github_app'),
+        ('logs', '0009_log_parent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='log',
+            name='logs_log_created_5b3920_idx',
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['created_at', 'id'], name='logs_log_created_5d9195_idx'),
+        ),
+    ]
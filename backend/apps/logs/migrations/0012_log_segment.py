@@ -0,0 +1,30 @@
+# Generated by Django 5.0.2 on 2026-10-18 20:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0011_log_list_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to='logs/segments/%Y/%m/%d/')),
+                ('raw_offset', models.BigIntegerField()),
+                ('stored_offset', models.BigIntegerField()),
+                ('stored_size', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('log', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments', to='logs.log')),
+            ],
+            options={
+                'ordering': ['stored_offset'],
+                'constraints': [models.UniqueConstraint(fields=('log', 'stored_offset'), name='logs_segment_unique_offset')],
+            },
+        ),
+    ]
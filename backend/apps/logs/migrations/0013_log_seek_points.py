@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0012_log_segment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='log',
+            name='seek_points',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logs', '0013_log_seek_points'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='loguploadsession',
+            name='status',
+            field=models.CharField(choices=[('open', 'Open'), ('finalizing', 'Finalizing'), ('complete', 'Complete'), ('aborted', 'Aborted')], default='open', max_length=20),
+        ),
+    ]
@@ -12,23 +12,48 @@ class Log(models.Model):
         ('failed', 'Failed'),
     ]
 
+    COMPRESSION_CHOICES = [
+        ('none', 'None'),
+        ('gzip', 'gzip'),
+        ('zstd', 'Zstandard'),
+    ]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='logs')
     repository = models.ForeignKey('github_integration.GitHubRepository', on_delete=models.SET_NULL, null=True, blank=True, related_name='logs')
+    # Set on the logs extracted from an uploaded archive with several members
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
     file = models.FileField(upload_to='logs/%Y/%m/%d/')
     original_filename = models.CharField(max_length=255)
     content = models.TextField(blank=True)
+
+    # Storage: `file` holds the log text, compressed with `compression`
+    compression = models.CharField(max_length=10, choices=COMPRESSION_CHOICES, default='none')
+    raw_size = models.BigIntegerField(null=True, blank=True)
+    stored_size = models.BigIntegerField(null=True, blank=True)
+    compression_ratio = models.FloatField(null=True, blank=True)
+    # [raw offset, stored offset] of the gzip members or zstd frames starting a line after the first,
+    # where reading can start without decompressing what comes before
+    seek_points = models.JSONField(default=list, blank=True)
+    line_index = models.FileField(upload_to='logs/index/', blank=True)
+    line_count = models.BigIntegerField(null=True, blank=True)
+
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     analyzed_at = models.DateTimeField(null=True, blank=True)
     error_message = models.TextField(blank=True)
+    analysis_result = models.JSONField(default=dict, blank=True)
+    # Where the last analysis stopped, so text appended later is analyzed on its own
+    analysis_checkpoint = models.JSONField(default=dict, blank=True)
 
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['user', 'status']),
-            models.Index(fields=['created_at']),
+            models.Index(fields=['created_at', 'id']),
+            # Serves the cursor-paginated log list of a user
+            models.Index(fields=['user', 'created_at', 'id']),
         ]
 
     def __str__(self):
@@ -37,4 +62,79 @@ class Log(models.Model):
     def save(self, *args, **kwargs):
         if not self.original_filename and self.file:
             self.original_filename = self.file.name
-        super().save(*args, **kwargs) 
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+
+class LogSegment(models.Model):
+    """Text appended to a log, compressed and stored after its `file`.
+
+    Appends are stored on their own so they never rewrite the log. Read in
+    `stored_offset` order after `Log.file`, the segments continue its gzip
+    members or zstd frames; the offsets are those in that concatenation.
+    """
+
+    log = models.ForeignKey(Log, on_delete=models.CASCADE, related_name='segments')
+    file = models.FileField(upload_to='logs/segments/%Y/%m/%d/')
+    raw_offset = models.BigIntegerField()
+    stored_offset = models.BigIntegerField()
+    stored_size = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['stored_offset']
+        constraints = [
+            models.UniqueConstraint(fields=['log', 'stored_offset'], name='logs_segment_unique_offset'),
+        ]
+
+    def __str__(self):
+        return f"{self.log_id} @ {self.stored_offset}"
+
+
+class LogTemplate(models.Model):
+    """Message template mined from a log, with the number of lines matching it."""
+
+    log = models.ForeignKey(Log, on_delete=models.CASCADE, related_name='templates')
+    template_id = models.IntegerField()
+    template = models.TextField()
+    count = models.BigIntegerField(default=0)
+    first_line = models.BigIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-count']
+        constraints = [
+            models.UniqueConstraint(fields=['log', 'template_id'], name='logs_template_unique_id'),
+        ]
+
+    def __str__(self):
+        return f"{self.template[:80]} ({self.count})"
+
+
+class LogUploadSession(models.Model):
+    """Model for tracking a resumable, chunked log upload."""
+
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('finalizing', 'Finalizing'),
+        ('complete', 'Complete'),
+        ('aborted', 'Aborted'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='log_uploads')
+    repository = models.ForeignKey('github_integration.GitHubRepository', on_delete=models.SET_NULL, null=True, blank=True, related_name='log_uploads')
+    log = models.OneToOneField(Log, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_session')
+    original_filename = models.CharField(max_length=255)
+    total_size = models.BigIntegerField(null=True, blank=True)
+    received_bytes = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'status']),
+        ]
+
+    def __str__(self):
+        return f"Upload of {self.original_filename} ({self.received_bytes} bytes)"
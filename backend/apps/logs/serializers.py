@@ -1,5 +1,6 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Log
+from .models import Log, LogTemplate, LogUploadSession
 from github_integration.models import GitHubRepository
 
 class LogSerializer(serializers.ModelSerializer):
@@ -9,13 +10,15 @@ class LogSerializer(serializers.ModelSerializer):
         model = Log
         fields = [
             'id', 'file', 'original_filename', 'content',
-            'status', 'repository', 'created_at', 'updated_at',
-            'analyzed_at', 'error_message'
+            'status', 'repository', 'parent', 'created_at', 'updated_at',
+            'analyzed_at', 'error_message', 'analysis_result',
+            'compression', 'raw_size', 'stored_size', 'compression_ratio'
         ]
         read_only_fields = [
-            'id', 'original_filename', 'status',
+            'id', 'original_filename', 'status', 'parent',
             'created_at', 'updated_at', 'analyzed_at',
-            'error_message'
+            'error_message', 'analysis_result',
+            'compression', 'raw_size', 'stored_size', 'compression_ratio'
         ]
 
     def create(self, validated_data):
@@ -25,6 +28,24 @@ class LogSerializer(serializers.ModelSerializer):
             validated_data['user'] = request.user
         return super().create(validated_data)
 
+class LogListSerializer(LogSerializer):
+    """Compact log representation for lists, without the log text and analysis result."""
+
+    class Meta(LogSerializer.Meta):
+        fields = [
+            'id', 'file', 'original_filename', 'status', 'repository', 'parent',
+            'created_at', 'updated_at', 'analyzed_at', 'error_message',
+            'compression', 'raw_size', 'stored_size', 'compression_ratio'
+        ]
+
+class LogTemplateSerializer(serializers.ModelSerializer):
+    """Serializer for message templates mined from a log."""
+
+    class Meta:
+        model = LogTemplate
+        fields = ['template_id', 'template', 'count', 'first_line']
+
+
 class LogUploadSerializer(serializers.Serializer):
     """Serializer for handling log file uploads."""
     
@@ -42,4 +63,43 @@ class LogUploadSerializer(serializers.Serializer):
             raise serializers.ValidationError(
                 "Either file or content must be provided."
             )
-        return data 
\ No newline at end of file
+        return data
+
+class LogBatchItemSerializer(serializers.Serializer):
+    """Serializer for one log of a batch upload.
+
+    The repository is validated as a plain ID; the view resolves the IDs of
+    the whole batch in one query.
+    """
+
+    content = serializers.CharField()
+    filename = serializers.CharField(required=False, max_length=255)
+    repository = serializers.IntegerField(required=False, allow_null=True)
+
+class LogUploadSessionSerializer(serializers.ModelSerializer):
+    """Serializer for chunked upload sessions."""
+
+    repository = serializers.PrimaryKeyRelatedField(
+        queryset=GitHubRepository.objects.all(),
+        required=False,
+        allow_null=True
+    )
+
+    class Meta:
+        model = LogUploadSession
+        fields = [
+            'id', 'original_filename', 'total_size', 'received_bytes',
+            'status', 'repository', 'log', 'created_at', 'updated_at'
+        ]
+        read_only_fields = [
+            'id', 'received_bytes', 'status', 'log',
+            'created_at', 'updated_at'
+        ]
+
+    def validate_total_size(self, value):
+        """Validate the declared size against the configured upload limit."""
+        if value is not None and value > settings.LOG_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f"Uploads are limited to {settings.LOG_UPLOAD_MAX_SIZE} bytes."
+            )
+        return value
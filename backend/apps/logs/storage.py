@@ -0,0 +1,288 @@
+"""Reading and writing the raw bytes of a Log.
+
+Log text is kept compressed at rest in `Log.file`. Everything that needs the
+raw text goes through `open_log_reader`, which decompresses transparently
+while streaming.
+
+Large logs are compressed in gzip members or zstd frames of about
+LOG_SHARD_SIZE uncompressed bytes, cut at line ends, and `Log.seek_points`
+records where each starts, so parallel analysis shards can start reading
+there (see analysis.plan_shards).
+
+Text appended to a log is compressed as a separate gzip member or zstd
+frame and stored in a LogSegment, read after the existing ones. Appending
+never rewrites what is stored, and the text appended since a known point
+can be decompressed without reading what came before.
+"""
+import gzip
+import io
+import os
+import tempfile
+from django.conf import settings
+from django.core.files import File
+from .models import LogSegment
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional, gzip is always available
+    zstandard = None
+
+# Size of the buffer used when copying log bytes between streams.
+CHUNK_SIZE = 1024 * 1024
+
+# Compressed output is kept in memory up to this size before spilling to disk.
+SPOOL_SIZE = 8 * 1024 * 1024
+
+EXTENSIONS = {
+    'gzip': '.gz',
+    'zstd': '.zst',
+}
+
+
+class _ClosingGzipFile(gzip.GzipFile):
+    """GzipFile that also closes the file object it was given."""
+
+    def close(self):
+        fileobj = self.fileobj
+        super().close()
+        if fileobj is not None:
+            fileobj.close()
+
+
+def get_compression():
+    """Return the configured compression method, falling back to gzip."""
+    method = settings.LOG_COMPRESSION
+    if method == 'zstd' and zstandard is None:
+        return 'gzip'
+    return method
+
+
+def _compressor(method, fileobj):
+    if method == 'gzip':
+        return gzip.GzipFile(fileobj=fileobj, mode='wb', compresslevel=6, mtime=0)
+    if method == 'zstd':
+        return zstandard.ZstdCompressor(level=3).stream_writer(fileobj, closefd=False)
+    return None
+
+
+def _decompressor(method, fileobj):
+    if method == 'gzip':
+        return _ClosingGzipFile(fileobj=fileobj, mode='rb')
+    if method == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('zstandard is required to read zstd-compressed logs')
+        return io.BufferedReader(
+            zstandard.ZstdDecompressor().stream_reader(fileobj, read_across_frames=True, closefd=True),
+            buffer_size=CHUNK_SIZE
+        )
+    return fileobj
+
+
+def save_log_file(log, source, filename, method=None):
+    """Compress `source` into `log.file` and record the sizes on the log.
+
+    `source` is a binary stream that is read in CHUNK_SIZE pieces. The
+    compressed output is spooled to a temporary file, so memory stays
+    bounded for logs of any size. A new gzip member or zstd frame is started
+    at the first line end after every LOG_SHARD_SIZE bytes. The log itself
+    is not saved.
+    """
+    method = method or get_compression()
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    raw_size = 0
+    member_size = 0
+    seek_points = []
+
+    writer = _compressor(method, spool)
+    data = source.read(CHUNK_SIZE)
+    while data:
+        if writer is not None and member_size + len(data) > settings.LOG_SHARD_SIZE:
+            cut = data.find(b'\n', max(settings.LOG_SHARD_SIZE - member_size - 1, 0)) + 1
+            if cut:
+                writer.write(data[:cut])
+                writer.close()
+                raw_size += cut
+                seek_points.append([raw_size, spool.tell()])
+                writer = _compressor(method, spool)
+                member_size = 0
+                data = data[cut:] or source.read(CHUNK_SIZE)
+                continue
+        (writer or spool).write(data)
+        raw_size += len(data)
+        member_size += len(data)
+        data = source.read(CHUNK_SIZE)
+    if writer is not None:
+        writer.close()
+
+    stored_size = spool.tell()
+    spool.seek(0)
+    name = os.path.basename(filename) + EXTENSIONS.get(method, '')
+    log.file.save(name, File(spool, name=name), save=False)
+    spool.close()
+
+    log.compression = method
+    log.raw_size = raw_size
+    log.stored_size = stored_size
+    log.compression_ratio = round(raw_size / stored_size, 2) if stored_size else None
+    log.seek_points = seek_points
+
+
+def append_log_file(log, source, separator=b''):
+    """Append the text read from `source` to the log and update the sizes.
+
+    The text is compressed on its own into a new LogSegment; what is stored
+    already is not read. `separator` is written first, and a newline is
+    added when the text does not end with one, so the next append starts a
+    new line. Local copies of the log's text are removed. Returns the
+    number of bytes appended, 0 when `source` is empty. The log itself is
+    not saved.
+    """
+    from .line_index import clear_local_cache
+
+    data = source.read(CHUNK_SIZE)
+    if not data:
+        return 0
+
+    if log.file:
+        method = log.compression
+        raw_size = log.raw_size or 0
+        stored_offset = log.stored_size or 0
+    else:
+        # Logs stored before Log.file existed: move their content into the file.
+        method = get_compression()
+        content = log.content.encode('utf-8')
+        separator = content + b'\n' if content and not content.endswith(b'\n') else content
+        raw_size = stored_offset = 0
+
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    writer = _compressor(method, spool)
+    target = writer or spool
+    target.write(separator)
+    appended = len(separator)
+    while data:
+        target.write(data)
+        appended += len(data)
+        last = data[-1:]
+        data = source.read(CHUNK_SIZE)
+    if last != b'\n':
+        target.write(b'\n')
+        appended += 1
+    if writer is not None:
+        writer.close()
+
+    size = spool.tell()
+    spool.seek(0)
+    if log.file:
+        name = f"{log.id}.{stored_offset}{EXTENSIONS.get(method, '')}"
+        segment = LogSegment(log=log, raw_offset=raw_size, stored_offset=stored_offset, stored_size=size)
+        segment.file.save(name, File(spool, name=name), save=True)
+        if not separator and method != 'none':
+            log.seek_points = [*log.seek_points, [raw_size, stored_offset]]
+    else:
+        name = f"{log.original_filename or 'log'}{EXTENSIONS.get(method, '')}"
+        log.file.save(name, File(spool, name=name), save=False)
+        log.seek_points = []
+        # The file holds the text now
+        log.content = ''
+    spool.close()
+
+    log.compression = method
+    log.raw_size = raw_size + appended
+    log.stored_size = stored_offset + size
+    log.compression_ratio = round(log.raw_size / log.stored_size, 2) if log.stored_size else None
+    clear_local_cache(log)
+    return appended
+
+
+class _StoredStream(io.RawIOBase):
+    """The stored files of a log read as one stream: `Log.file`, then its segments.
+
+    `parts` are (stored offset, size, open) of each file, in order.
+    """
+
+    def __init__(self, parts, position=0):
+        self.parts = parts
+        self.current = None
+        self.end = 0
+        self.position = 0
+        self.seek(position)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.parts[-1][0] + self.parts[-1][1]
+        if self.current is not None:
+            self.current.close()
+            self.current = None
+        self.position = max(offset, 0)
+        for start, size, open_part in self.parts:
+            if self.position < start + size:
+                self.current = open_part()
+                self.current.seek(self.position - start)
+                self.end = start + size
+                break
+        return self.position
+
+    def readinto(self, buffer):
+        while self.current is not None:
+            data = self.current.read(min(len(buffer), self.end - self.position))
+            if data:
+                buffer[:len(data)] = data
+                self.position += len(data)
+                return len(data)
+            if self.position < self.end:
+                raise OSError(f'Stored log ends at {self.position}, expected {self.end} bytes')
+            self.seek(self.position)
+        return 0
+
+    def close(self):
+        if self.current is not None:
+            self.current.close()
+            self.current = None
+        super().close()
+
+
+def open_log_reader(log, stored_offset=0):
+    """Return a binary stream over the uncompressed text of a log.
+
+    With `stored_offset`, the stream starts at that offset in the stored
+    bytes, which must be the start of a gzip member or zstd frame. Files
+    before it are not opened.
+    """
+    if not log.file:
+        stream = io.BytesIO(log.content.encode('utf-8'))
+        stream.seek(stored_offset)
+        return stream
+
+    segments = list(log.segments.all())
+    if not segments:
+        log.file.open('rb')
+        if stored_offset:
+            log.file.seek(stored_offset)
+        return _decompressor(log.compression, log.file)
+
+    parts = [(0, segments[0].stored_offset, lambda: log.file.open('rb'))]
+    for segment in segments:
+        parts.append((
+            segment.stored_offset, segment.stored_size,
+            lambda name=segment.file.name, storage=segment.file.storage: storage.open(name, 'rb')
+        ))
+    stream = io.BufferedReader(_StoredStream(parts, stored_offset), buffer_size=CHUNK_SIZE)
+    return _decompressor(log.compression, stream)
+
+
+def read_log_text(log, limit=None):
+    """Return the decoded text of a log, or its first `limit` bytes."""
+    with open_log_reader(log) as reader:
+        data = reader.read(-1 if limit is None else limit)
+    return data.decode('utf-8', errors='replace')
@@ -1,33 +1,162 @@
-from celery import shared_task
+import time
+from celery import chord, group, shared_task
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
-from .models import Log
+from .models import Log, LogTemplate
+from .analysis import analyze_log, analyze_log_range, analyze_log_tail, merge_results, plan_shards
+from .drain import TemplateMiner
+from .line_index import clear_local_cache, join_index_parts
 from apps.bugs.tasks import detect_bug_task
 
+def save_templates(log, miner):
+    """Replace the stored template counts of a log with the miner's."""
+    LogTemplate.objects.filter(log=log).delete()
+    LogTemplate.objects.bulk_create([
+        LogTemplate(
+            log=log,
+            template_id=cluster.id,
+            template=cluster.template,
+            count=cluster.count,
+            first_line=cluster.first_line
+        )
+        for cluster in miner.templates()
+    ], batch_size=1000)
+
+def load_templates(log):
+    """Rebuild a TemplateMiner from the stored templates of a log."""
+    miner = TemplateMiner(max_clusters=settings.LOG_TEMPLATE_MAX_CLUSTERS)
+    for template in log.templates.order_by('template_id'):
+        miner.add_template(template.template, template.count, template.first_line)
+    return miner
+
+def mark_failed(log_id, error):
+    Log.objects.filter(id=log_id).update(status='failed', error_message=str(error))
+    print(f"Failed to analyze log {log_id}: {error}")
+
+def finish_analysis(log, result, miner, checkpoint, since_line=0, events=None):
+    """Store the analysis of a log and hand over its events after `since_line` to bug detection.
+
+    `events` are the events to detect bugs in, those of the analysis result by default.
+    """
+    clear_local_cache(log)
+    result.pop('trace_end', None)
+    # Appended text starts a new gzip member or zstd frame at the current end of the file.
+    checkpoint['stored_offset'] = log.stored_size if log.file else checkpoint['offset']
+    log.status = 'analyzed'
+    log.analyzed_at = timezone.now()
+    log.analysis_result = result
+    log.analysis_checkpoint = checkpoint
+    with transaction.atomic():
+        log.save(update_fields=[
+            'status', 'analyzed_at', 'analysis_result', 'analysis_checkpoint', 'line_index', 'line_count'
+        ])
+        save_templates(log, miner)
+    print(
+        f"Log {log.id} analyzed successfully: {result['lines']} lines, "
+        f"{result['total_events']} error events, {result['template_count']} templates, "
+        f"{result['throughput_mb_s']} MB/s. "
+        f"Now starting bug detection..."
+    )
+
+    detect_bug_task.delay(str(log.id), since_line, events)
+
 @shared_task
 def analyze_log_task(log_id):
-    """Simulates log analysis and updates the log status."""
+    """Streams the log through the analyzer and stores the error events found.
+
+    A log analyzed before resumes from its checkpoint, so only the text
+    appended since is read. Otherwise, logs larger than LOG_SHARD_SIZE are
+    split into byte ranges analyzed in parallel by analyze_log_shard_task
+    and combined by merge_log_shards_task.
+    """
     try:
+        # Claim the log, so a log queued twice, e.g. appended to while
+        # pending, is analyzed once. Appends lock the log and refuse an
+        # analyzing one, so the file cannot change under the analysis.
+        claimed = Log.objects.filter(id=log_id, status='pending').update(status='analyzing')
+        if not claimed:
+            print(f"Log with ID {log_id} not found or already analyzed.")
+            return
         log = Log.objects.get(id=log_id)
-        log.status = 'analyzing'
-        log.save(update_fields=['status'])
 
-        
-        import time
-        time.sleep(5)  
+        if log.analysis_checkpoint:
+            miner = load_templates(log)
+            since_line = log.analysis_result['lines']
+            result, tail = analyze_log_tail(log, log.analysis_result, log.analysis_checkpoint, miner)
+            finish_analysis(log, result, miner, tail['checkpoint'], since_line, tail['events'])
+            return
+
+        seek_points = None if log.compression == 'none' else log.seek_points
+        shards = plan_shards(log.raw_size, settings.LOG_SHARD_SIZE, seek_points)
+        if len(shards) > 1:
+            chord(group(
+                analyze_log_shard_task.s(str(log.id), part, start, end)
+                for part, (start, end) in enumerate(shards)
+            ))(merge_log_shards_task.s(str(log.id), time.time()))
+            return
 
-        log.status = 'analyzed'
-        log.analyzed_at = timezone.now()
-        log.save(update_fields=['status', 'analyzed_at'])
-        print(f"Log {log_id} analyzed successfully. Now starting bug detection...")
-        
-        
-        detect_bug_task.delay(str(log.id))
+        result, miner = analyze_log(log)
+        finish_analysis(log, result, miner, result.pop('checkpoint'))
 
     except Log.DoesNotExist:
         print(f"Log with ID {log_id} not found.")
     except Exception as e:
+        mark_failed(log_id, e)
+
+@shared_task
+def analyze_log_shard_task(log_id, part, start, end):
+    """Analyzes one byte range of a log and stores its part of the line index."""
+    try:
+        log = Log.objects.get(id=log_id)
+        result, miner, index = analyze_log_range(log, start, end)
+        result['index_part'] = index.save_part(log, part)
+        result['templates'] = [
+            [cluster.template, cluster.count, cluster.first_line] for cluster in miner.clusters
+        ]
+        if miner.overflow is not None:
+            result['templates'].append([miner.overflow.template, miner.overflow.count, miner.overflow.first_line])
+        return result
+    except Exception as e:
+        # The chord's merge step never runs once a shard fails.
+        mark_failed(log_id, e)
+        raise
+
+@shared_task
+def merge_log_shards_task(results, log_id, started):
+    """Combines the shard results of a log into one analysis."""
+    try:
         log = Log.objects.get(id=log_id)
-        log.status = 'failed'
-        log.error_message = str(e)
-        log.save(update_fields=['status', 'error_message'])
-        print(f"Failed to analyze log {log_id}: {e}") 
\ No newline at end of file
+        miner = TemplateMiner(max_clusters=settings.LOG_TEMPLATE_MAX_CLUSTERS)
+        line_base = 0
+        for result in results:
+            for template, count, first_line in result.pop('templates'):
+                miner.add_template(template, count, first_line + line_base)
+            line_base += result['lines']
+        join_index_parts(log, [result.pop('index_part') for result in results])
+
+        # Only the last shard's checkpoint matters; its line numbers are shard-relative
+        checkpoint = results[-1]['checkpoint']
+        for pending in checkpoint['parser'].values():
+            if pending is not None:
+                pending['line_number'] += line_base - results[-1]['lines']
+        for result in results:
+            result.pop('checkpoint')
+
+        result = merge_results(results)
+        duration = time.time() - started
+        result['shards'] = len(results)
+        result['template_count'] = len(miner.clusters)
+        result['duration_seconds'] = round(duration, 3)
+        result['throughput_mb_s'] = round(result['bytes'] / (1024 * 1024) / duration, 2) if duration else None
+        finish_analysis(log, result, miner, checkpoint)
+
+    except Log.DoesNotExist:
+        print(f"Log with ID {log_id} not found.")
+    except Exception as e:
+        mark_failed(log_id, e)
+
+@shared_task
+def analyze_log_batch_task(log_ids):
+    """Queues the analysis of the logs of a batch upload, one task per log."""
+    group(analyze_log_task.s(log_id) for log_id in log_ids).apply_async()
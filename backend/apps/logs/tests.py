@@ -0,0 +1,326 @@
+import io
+import os
+import tempfile
+import time
+from unittest import mock
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APITestCase
+from apps.users.models import User
+from bugsquash.testing import QueryBudgetMixin
+from .analysis import analyze_log, analyze_log_range, merge_results, plan_shards
+from .drain import OVERFLOW_TEMPLATE, TemplateMiner
+from .models import Log, LogUploadSession
+from .storage import open_log_reader, save_log_file
+from .tasks import analyze_log_task, load_templates, save_templates
+from .uploads import store_upload
+
+
+class LogQueryTests(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='dev@example.com', username='dev', password='secret')
+        self.client.force_authenticate(self.user)
+
+    def add_logs(self, n):
+        for i in range(n):
+            Log.objects.create(user=self.user, original_filename=f'app-{i}.log', content='INFO ok\n', status='analyzed')
+
+    def test_list(self):
+        self.assertQueryBudget('/api/logs/', self.add_logs, budget=1)
+
+
+class LogFilesTestCase(APITestCase):
+    """Stores log files and their local copies in temporary directories."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='dev@example.com', username='dev', password='secret')
+        self.client.force_authenticate(self.user)
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        overrides = self.settings(
+            MEDIA_ROOT=media.name,
+            LOG_CACHE_DIR=os.path.join(media.name, 'cache'),
+            LOG_UPLOAD_STAGING_DIR=os.path.join(media.name, 'staging')
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.media = media.name
+
+    def add_log(self, text, status='analyzed'):
+        log = Log(user=self.user, original_filename='app.log', status=status)
+        save_log_file(log, io.BytesIO(text), 'app.log')
+        log.save()
+        return log
+
+    def cached(self):
+        return sorted(os.listdir(settings.LOG_CACHE_DIR))
+
+
+class LogBatchTests(LogFilesTestCase):
+    def test_rejected_batch_keeps_no_files(self):
+        files = [
+            SimpleUploadedFile('app.log', b'INFO ok\n'),
+            SimpleUploadedFile('broken.gz', b'\x1f\x8b\x08\x00not gzip'),
+        ]
+        response = self.client.post('/api/logs/batch/', {'files': files}, format='multipart')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Log.objects.exists())
+        self.assertEqual([names for _, _, names in os.walk(self.media) if names], [])
+
+
+@override_settings(LOG_COMPRESSION='gzip')
+class LogCacheTests(LogFilesTestCase):
+    def content(self, log):
+        response = self.client.get(f'/api/logs/{log.id}/content/?start=0')
+        self.assertEqual(response.status_code, 200)
+        return response.data['content']
+
+    def test_append_replaces_the_local_copy(self):
+        log = self.add_log(b'INFO one\n')
+        self.assertEqual(self.content(log), 'INFO one\n')
+
+        with self.captureOnCommitCallbacks(execute=False):
+            response = self.client.post(f'/api/logs/{log.id}/append/', b'INFO two\n', content_type='text/plain')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.content(log), 'INFO one\nINFO two\n')
+
+    def test_least_recently_used_copies_are_removed(self):
+        logs = [self.add_log(f'INFO {i}\n'.encode() * 100) for i in range(3)]
+        with self.settings(LOG_CACHE_MAX_SIZE=3200):
+            for log in [logs[0], logs[1], logs[0], logs[2]]:
+                self.content(log)
+                time.sleep(0.01)
+
+        kept = {name.split('.')[0] for name in self.cached()}
+        self.assertEqual(kept, {str(logs[0].id), str(logs[2].id)})
+
+
+class LogUploadTests(LogFilesTestCase):
+    def setUp(self):
+        super().setUp()
+        self.session = LogUploadSession.objects.create(user=self.user, original_filename='app.log')
+        self.url = f'/api/log-uploads/{self.session.id}/chunk/'
+
+    def test_chunk(self):
+        response = self.client.put(f'{self.url}?offset=0', b'INFO ok\n', content_type='application/octet-stream')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['received_bytes'], 8)
+
+    def test_chunk_total_is_checked(self):
+        def put(total):
+            return self.client.put(
+                self.url, b'INFO ok\n', content_type='application/octet-stream',
+                headers={'Content-Range': f'bytes 0-7/{total}'}
+            )
+
+        with self.settings(LOG_UPLOAD_MAX_SIZE=100):
+            self.assertEqual(put(101).status_code, 413)
+            self.assertEqual(put(16).status_code, 200)
+            self.assertEqual(put(100).status_code, 400)
+        self.session.refresh_from_db()
+        self.assertEqual((self.session.total_size, self.session.received_bytes), (16, 8))
+
+    def test_finalize_stores_the_upload_outside_the_claim(self):
+        self.client.put(f'{self.url}?offset=0', b'INFO ok\n', content_type='application/octet-stream')
+        statuses = []
+
+        def store(session, log):
+            statuses.append(LogUploadSession.objects.get(id=session.id).status)
+            return store_upload(session, log)
+
+        with mock.patch('apps.logs.views.store_upload', side_effect=store):
+            response = self.client.post(f'/api/log-uploads/{self.session.id}/finalize/')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(statuses, ['finalizing'])
+        self.session.refresh_from_db()
+        self.assertEqual((self.session.status, str(self.session.log_id)), ('complete', response.data['id']))
+        self.assertEqual(self.client.post(f'/api/log-uploads/{self.session.id}/finalize/').status_code, 400)
+
+    def test_chunk_without_length(self):
+        response = self.client.put(f'{self.url}?offset=0')
+
+        self.assertEqual(response.status_code, 411)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.received_bytes, 0)
+
+
+class LogAppendTests(LogFilesTestCase):
+    def test_append_moves_content_into_the_file(self):
+        log = Log.objects.create(user=self.user, original_filename='app.log', content='INFO one', status='analyzed')
+        with self.captureOnCommitCallbacks(execute=False):
+            response = self.client.post(f'/api/logs/{log.id}/append/', b'INFO two\n', content_type='text/plain')
+
+        self.assertEqual(response.status_code, 200)
+        log.refresh_from_db()
+        self.assertEqual(log.content, '')
+        with open_log_reader(log) as reader:
+            self.assertEqual(reader.read(), b'INFO one\nINFO two\n')
+
+
+class LogAnalysisTests(LogFilesTestCase):
+    def test_log_is_analyzed_once(self):
+        log = self.add_log(b'INFO start\nERROR boom\n', status='pending')
+        analyze_log_task(str(log.id))
+        log.refresh_from_db()
+        self.assertEqual((log.status, log.analysis_result['total_events']), ('analyzed', 1))
+
+        # Queued again, e.g. by an append while it was pending
+        Log.objects.filter(id=log.id).update(analysis_result={})
+        analyze_log_task(str(log.id))
+        log.refresh_from_db()
+        self.assertEqual(log.analysis_result, {})
+
+    def test_analyzing_log_is_not_claimed(self):
+        log = self.add_log(b'ERROR boom\n', status='analyzing')
+        analyze_log_task(str(log.id))
+        log.refresh_from_db()
+        self.assertEqual((log.status, log.analysis_result), ('analyzing', {}))
+
+
+SESSION_LOG = (
+    b'INFO session opened for alice\n'
+    b'INFO session opened for bob\n'
+    b'WARNING request 42 took 1500ms\n'
+    b'INFO session opened for carol\n'
+    b'WARNING request 7 took 980ms\n'
+)
+
+
+def clusters(miner):
+    return [(cluster.id, cluster.template, cluster.count, cluster.first_line) for cluster in miner.templates()]
+
+
+class TemplateMinerTests(SimpleTestCase):
+    def mine(self, lines, **options):
+        miner = TemplateMiner(**options)
+        for line_number, line in enumerate(lines, start=1):
+            miner.add(line, line_number)
+        return [(cluster.template, cluster.count, cluster.first_line) for cluster in miner.templates()]
+
+    def test_lines_differing_in_a_token_share_a_template(self):
+        self.assertEqual(
+            self.mine(['session opened for alice', 'session opened for bob', 'session opened for carol']),
+            [('session opened for <*>', 3, 1)]
+        )
+
+    def test_tokens_with_digits_are_masked(self):
+        self.assertEqual(
+            self.mine(['request 42 took 1500ms', 'request 7 took 980ms']),
+            [('request <*> took <*>', 2, 1)]
+        )
+
+    def test_dissimilar_lines_stay_apart(self):
+        self.assertEqual(
+            self.mine(['session opened for alice', 'cache miss for key', 'worker exited', 'session opened for bob']),
+            [('session opened for <*>', 2, 1), ('cache miss for key', 1, 2), ('worker exited', 1, 3)]
+        )
+
+    def test_lines_beyond_max_clusters_are_counted_together(self):
+        self.assertEqual(
+            self.mine(['worker started', 'session opened for alice', 'cache miss', 'worker started'], max_clusters=1),
+            [('worker started', 2, 1), (OVERFLOW_TEMPLATE, 2, 2)]
+        )
+
+    def test_templates_of_ranges_fold_into_one_miner(self):
+        lines = SESSION_LOG.decode().splitlines()
+        whole = TemplateMiner()
+        first, second = TemplateMiner(), TemplateMiner()
+        for line_number, line in enumerate(lines, start=1):
+            whole.add(line, line_number)
+            (first if line_number <= 2 else second).add(line, line_number)
+        for cluster in second.clusters:
+            first.add_template(cluster.template, cluster.count, cluster.first_line)
+        self.assertEqual(clusters(first), clusters(whole))
+
+
+class LogTemplateTests(LogFilesTestCase):
+    def test_templates_are_stored_with_the_analysis(self):
+        log = self.add_log(SESSION_LOG, status='pending')
+        analyze_log_task(str(log.id))
+
+        response = self.client.get(f'/api/logs/{log.id}/templates/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(t['template'], t['count'], t['first_line']) for t in response.data],
+            [('INFO session opened for <*>', 3, 1), ('WARNING request <*> took <*>', 2, 3)]
+        )
+        log.refresh_from_db()
+        self.assertEqual(log.analysis_result['template_count'], 2)
+
+    def test_stored_templates_keep_counting(self):
+        log = self.add_log(SESSION_LOG)
+        miner = TemplateMiner()
+        for line_number, line in enumerate(SESSION_LOG.decode().splitlines(), start=1):
+            miner.add(line, line_number)
+        save_templates(log, miner)
+
+        loaded = load_templates(log)
+        self.assertEqual(clusters(loaded), clusters(miner))
+        cluster = loaded.add('INFO session opened for dave', 6)
+        self.assertEqual((cluster.id, cluster.count, cluster.first_line), (1, 4, 1))
+
+
+# The traceback runs from byte 60 to 281, across the shard boundary at 140.
+TRACE_LOG = (
+    b'INFO worker started\n' * 3
+    + b'Traceback (most recent call last):\n'
+    b'  File "app.py", line 10, in handle\n'
+    b'    run()\n'
+    b'  File "app.py", line 20, in run\n'
+    b'    raise ValueError("bad input")\n'
+    b'ValueError: bad input\n'
+    + b'INFO worker idle\n' * 3
+    + b'ERROR connection reset by peer\n'
+)
+
+
+class ShardPlanTests(SimpleTestCase):
+    def test_small_log_is_one_shard(self):
+        self.assertEqual(plan_shards(0, 100), [(0, None)])
+        self.assertEqual(plan_shards(100, 100), [(0, None)])
+
+    def test_ranges_of_shard_size(self):
+        self.assertEqual(plan_shards(250, 100), [(0, 100), (100, 200), (200, None)])
+
+    def test_compressed_log_is_split_at_seek_points(self):
+        seek_points = [[40, 10], [120, 30], [150, 38], [260, 61], [310, 70]]
+        self.assertEqual(plan_shards(300, 100, seek_points), [(0, 120), (120, 260), (260, None)])
+
+
+class LogShardTests(LogFilesTestCase):
+    def summary(self, result):
+        return {key: result[key] for key in ('lines', 'bytes', 'level_counts', 'event_counts', 'total_events', 'events')}
+
+    def test_trace_across_shards_is_reported_once(self):
+        for compression in ('none', 'gzip'):
+            with self.subTest(compression=compression), \
+                    self.settings(LOG_COMPRESSION=compression, LOG_SHARD_SIZE=140):
+                log = self.add_log(TRACE_LOG)
+                seek_points = log.seek_points if compression == 'gzip' else None
+                shards = plan_shards(log.raw_size, 140, seek_points)
+                self.assertEqual(len(shards), 3)
+
+                whole, _ = analyze_log(log)
+                merged = merge_results([analyze_log_range(log, start, end)[0] for start, end in shards])
+                self.assertEqual(self.summary(merged), self.summary(whole))
+                self.assertEqual(
+                    [(event['kind'], event['line_number']) for event in merged['events']],
+                    [('python', 4), ('error_line', 13)]
+                )
+
+    @override_settings(LOG_SHARD_SIZE=140)
+    def test_sharded_analysis(self):
+        log = self.add_log(TRACE_LOG, status='pending')
+        whole, _ = analyze_log(log)
+        analyze_log_task(str(log.id))
+
+        log.refresh_from_db()
+        self.assertEqual((log.status, log.analysis_result['shards']), ('analyzed', 3))
+        self.assertEqual(self.summary(log.analysis_result), self.summary(whole))
+        response = self.client.get(f'/api/logs/{log.id}/content/?offset=8&limit=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['content'], 'ValueError: bad input\nINFO worker idle')
@@ -0,0 +1,98 @@
+import os
+import re
+from django.conf import settings
+from .archives import ingest_file
+
+# Size of the buffer used when copying request bodies to and from disk.
+CHUNK_SIZE = 1024 * 1024
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+RANGE_RE = re.compile(r'^bytes=(\d+)-(\d*)$')
+
+
+class UploadOffsetError(Exception):
+    """Raised when a chunk does not start where the previous one ended."""
+
+    def __init__(self, expected):
+        self.expected = expected
+        super().__init__(f"Chunk must start at byte {expected}")
+
+
+def staging_path(session):
+    """Return the local path chunks for an upload session are written to."""
+    return os.path.join(settings.LOG_UPLOAD_STAGING_DIR, f"{session.id}.part")
+
+
+def parse_content_range(header):
+    """Parse a `Content-Range: bytes start-end/total` header.
+
+    Returns a (start, end, total) tuple, where total is None when the client
+    sent `*`. Returns None when the header is missing or malformed.
+    """
+    match = CONTENT_RANGE_RE.match((header or '').strip())
+    if not match:
+        return None
+    start, end, total = match.groups()
+    return int(start), int(end), None if total == '*' else int(total)
+
+
+def parse_byte_range(header):
+    """Parse a single-range `Range: bytes=start-end` request header.
+
+    Returns a (start, end) tuple with an exclusive end, or None when the
+    header is missing or not a single byte range. An open-ended range
+    (`bytes=100-`) has an end of None.
+    """
+    match = RANGE_RE.match((header or '').strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    return int(start), int(end) + 1 if end else None
+
+
+def write_chunk(session, stream, offset, length=None):
+    """Append a chunk read from `stream` to the session's staging file.
+
+    The chunk is copied in CHUNK_SIZE pieces so memory use stays flat no
+    matter how large the chunk is. Returns the number of bytes written.
+    """
+    if offset != session.received_bytes:
+        raise UploadOffsetError(session.received_bytes)
+
+    path = staging_path(session)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    written = 0
+    with open(path, 'r+b' if os.path.exists(path) else 'wb') as fh:
+        # Drop anything a previous, interrupted request left past the offset.
+        fh.truncate(offset)
+        fh.seek(offset)
+        while length is None or written < length:
+            size = CHUNK_SIZE if length is None else min(CHUNK_SIZE, length - written)
+            data = stream.read(size)
+            if not data:
+                break
+            fh.write(data)
+            written += len(data)
+    return written
+
+
+def store_upload(session, log):
+    """Compress the staged upload into `log.file` and remove the staging file.
+
+    Archives are expanded; returns the unsaved child logs of a multi-member
+    archive, see `ingest_file`.
+    """
+    path = staging_path(session)
+    try:
+        with open(path, 'rb') as fh:
+            return ingest_file(log, fh, session.original_filename)
+    finally:
+        os.remove(path)
+
+
+def discard_upload(session):
+    """Remove any staged bytes for an upload session."""
+    path = staging_path(session)
+    if os.path.exists(path):
+        os.remove(path)
@@ -1,9 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import LogViewSet
+from .views import LogViewSet, LogUploadSessionViewSet
 
 router = DefaultRouter()
 router.register(r'logs', LogViewSet, basename='log')
+router.register(r'log-uploads', LogUploadSessionViewSet, basename='log-upload')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,17 +1,46 @@
-from rest_framework import viewsets, status
+import io
+from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
-from .models import Log
-from .serializers import LogSerializer, LogUploadSerializer
-from .tasks import analyze_log_task 
+from .archives import ArchiveError, ingest_file
+from .models import Log, LogUploadSession
+from .parsers import NDJSONParser
+from .serializers import (
+    LogBatchItemSerializer,
+    LogListSerializer,
+    LogSerializer,
+    LogTemplateSerializer,
+    LogUploadSerializer,
+    LogUploadSessionSerializer
+)
+from .line_index import LogPager
+from .storage import append_log_file, save_log_file
+from .tasks import analyze_log_batch_task, analyze_log_task
+from github_integration.models import GitHubRepository
+from bugsquash.fieldsets import SparseFieldsetMixin
+from bugsquash.pagination import TimestampCursorPagination
+from .uploads import (
+    UploadOffsetError,
+    discard_upload,
+    parse_byte_range,
+    parse_content_range,
+    store_upload,
+    write_chunk
+)
 
-class LogViewSet(viewsets.ModelViewSet):
+class LogViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for handling log operations."""
     
     serializer_class = LogSerializer
+    list_serializer_class = LogListSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = TimestampCursorPagination
 
     def get_queryset(self):
         """Return logs for the current user."""
@@ -22,22 +51,33 @@ class LogViewSet(viewsets.ModelViewSet):
         serializer = LogUploadSerializer(data=request.data)
         if serializer.is_valid():
             
-            log_data = {
-                'user': request.user,
-                'status': 'pending' 
-            }
-            
+            log = Log(
+                user=request.user,
+                status='pending',
+                repository=serializer.validated_data.get('repository')
+            )
+
+            # Both uploaded files and pasted content are stored compressed in Log.file
+            children = []
             if 'file' in serializer.validated_data:
-                log_data['file'] = serializer.validated_data['file']
-            if 'content' in serializer.validated_data:
-                log_data['content'] = serializer.validated_data['content']
-            if 'repository' in serializer.validated_data:
-                log_data['repository'] = serializer.validated_data['repository']
+                upload = serializer.validated_data['file']
+                log.original_filename = upload.name
+                try:
+                    children = ingest_file(log, upload, upload.name)
+                except ArchiveError as e:
+                    return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            else:
+                log.original_filename = 'pasted.log'
+                source = io.BytesIO(serializer.validated_data['content'].encode('utf-8'))
+                save_log_file(log, source, log.original_filename)
+            with transaction.atomic():
+                log.save()
+                Log.objects.bulk_create(children)
 
-            log = Log.objects.create(**log_data)
-            
-            
-            analyze_log_task.delay(str(log.id)) 
+            if children:
+                analyze_log_batch_task.delay([str(child.id) for child in children])
+            else:
+                analyze_log_task.delay(str(log.id))
 
             return Response(
                 LogSerializer(log).data,
@@ -45,11 +85,179 @@ class LogViewSet(viewsets.ModelViewSet):
             )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'], parser_classes=[NDJSONParser, MultiPartParser, FormParser])
+    def batch(self, request):
+        """Upload many logs in one request.
+
+        The body is either NDJSON, one `{"content", "filename", "repository"}`
+        object per line, or multipart with the logs as repeated `files` parts
+        and an optional `repository` for all of them; archives are expanded
+        as in `create`. The logs are inserted with one bulk INSERT and
+        analyzed in parallel, one task per log. The batch is rejected as a whole if any
+        log is invalid.
+        """
+        if isinstance(request.data, list):
+            serializer = LogBatchItemSerializer(data=request.data, many=True)
+            if not serializer.is_valid():
+                return Response({'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+            items = [
+                (item.get('filename') or 'pasted.log', io.BytesIO(item['content'].encode('utf-8')), item.get('repository'))
+                for item in serializer.validated_data
+            ]
+        else:
+            repository = request.data.get('repository') or None
+            try:
+                repository = int(repository) if repository is not None else None
+            except ValueError:
+                return Response({'error': 'Invalid repository'}, status=status.HTTP_400_BAD_REQUEST)
+            items = [(upload.name, upload, repository) for upload in request.FILES.getlist('files')]
+
+        if not items:
+            return Response({'error': 'No logs provided'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.LOG_BATCH_MAX_ITEMS:
+            return Response(
+                {'error': f"A batch is limited to {settings.LOG_BATCH_MAX_ITEMS} logs"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        repository_ids = {repository for _, _, repository in items if repository is not None}
+        repositories = GitHubRepository.objects.in_bulk(repository_ids)
+        missing = repository_ids - set(repositories)
+        if missing:
+            return Response(
+                {'error': f"Unknown repositories: {sorted(missing)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        logs = []
+        children = []
+        for filename, source, repository in items:
+            log = Log(
+                user=request.user,
+                status='pending',
+                repository=repositories.get(repository),
+                original_filename=filename
+            )
+            try:
+                children.extend(ingest_file(log, source, filename))
+            except ArchiveError as e:
+                # Nothing of a rejected batch is kept
+                for stored in logs + children:
+                    stored.file.delete(save=False)
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            logs.append(log)
+
+        with transaction.atomic():
+            Log.objects.bulk_create(logs, batch_size=500)
+            Log.objects.bulk_create(children, batch_size=500)
+            log_ids = [str(log.id) for log in logs + children if log.status == 'pending']
+            transaction.on_commit(lambda: analyze_log_batch_task.delay(log_ids))
+
+        return Response(
+            {'count': len(logs), 'logs': LogSerializer(logs, many=True).data},
+            status=status.HTTP_201_CREATED
+        )
+
     @action(detail=True, methods=['get'])
     def content(self, request, pk=None):
-        """Retrieve the content of a log file."""
+        """Retrieve a page of a log's content.
+
+        Lines are selected with `offset` and `limit` (0-based, in lines). A
+        byte range can be requested instead with `start` and `end` (end
+        exclusive) or a `Range: bytes=start-end` header.
+        """
         log = self.get_object()
-        return Response({'content': log.content})
+
+        byte_range = parse_byte_range(request.META.get('HTTP_RANGE'))
+        try:
+            if byte_range is None and 'start' in request.query_params:
+                end = request.query_params.get('end')
+                byte_range = (int(request.query_params['start']), int(end) if end else None)
+            offset = int(request.query_params.get('offset', 0))
+            limit = int(request.query_params.get('limit', settings.LOG_CONTENT_PAGE_SIZE))
+        except ValueError:
+            return Response({'error': 'Invalid range parameters'}, status=status.HTTP_400_BAD_REQUEST)
+
+        with LogPager(log) as pager:
+            if byte_range is not None:
+                start, end = byte_range
+                max_end = start + settings.LOG_CONTENT_MAX_BYTES
+                end = max_end if end is None else min(end, max_end)
+                data = pager.byte_range(start, end)
+                return Response({
+                    'content': data.decode('utf-8', errors='replace'),
+                    'start': start,
+                    'end': start + len(data),
+                    'size': pager.size
+                })
+
+            offset = max(offset, 0)
+            limit = min(max(limit, 0), settings.LOG_CONTENT_MAX_PAGE_SIZE)
+            lines = pager.lines(offset, limit)
+            next_offset = offset + len(lines)
+            return Response({
+                'content': '\n'.join(lines),
+                'offset': offset,
+                'limit': limit,
+                'total_lines': pager.line_count,
+                'next_offset': next_offset if next_offset < pager.line_count else None
+            })
+
+    @action(detail=True, methods=['get'])
+    def templates(self, request, pk=None):
+        """List the message templates mined from a log, most frequent first."""
+        log = self.get_object()
+        return Response(LogTemplateSerializer(log.templates.all(), many=True).data)
+
+    @action(detail=True, methods=['post'])
+    def append(self, request, pk=None):
+        """Append the request body to the log and analyze the new text.
+
+        Only the appended text is analyzed, resuming from where the last
+        analysis stopped. An `offset` query parameter, the log size the
+        client expects, makes retried appends safe: a mismatch is rejected
+        with 409 and the current `raw_size`.
+        """
+        expected = request.query_params.get('offset')
+        try:
+            expected = int(expected) if expected is not None else None
+        except ValueError:
+            return Response({'error': 'Invalid offset'}, status=status.HTTP_400_BAD_REQUEST)
+
+        log = self.get_object()
+        with transaction.atomic():
+            log = Log.objects.select_for_update().get(pk=log.pk)
+            if log.status == 'analyzing':
+                return Response(
+                    {'error': 'Log is being analyzed, retry later'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            if expected is not None and expected != (log.raw_size or 0):
+                return Response(
+                    {'error': f"Log size is {log.raw_size or 0} bytes", 'raw_size': log.raw_size or 0},
+                    status=status.HTTP_409_CONFLICT
+                )
+
+            # Appends always end in a newline; only the original text may not.
+            checkpoint = log.analysis_checkpoint
+            unterminated = (
+                log.file and checkpoint.get('stored_offset') == log.stored_size
+                and not checkpoint.get('newline', True)
+            )
+            had_file = bool(log.file)
+            appended = append_log_file(log, request.stream or io.BytesIO(), b'\n' if unterminated else b'')
+            if not appended:
+                return Response({'error': 'No content provided'}, status=status.HTTP_400_BAD_REQUEST)
+
+            # Failed logs, and text moved from Log.content into the file, are analyzed again in full.
+            if log.status == 'failed' or not had_file:
+                log.analysis_checkpoint = {}
+            log.status = 'pending'
+            log.error_message = ''
+            log.save()
+            transaction.on_commit(lambda: analyze_log_task.delay(str(log.id)))
+
+        return Response(LogSerializer(log).data)
 
     @action(detail=True, methods=['post'])
     def retry_analysis(self, request, pk=None):
@@ -58,7 +266,8 @@ class LogViewSet(viewsets.ModelViewSet):
         if log.status == 'failed':
             log.status = 'pending'
             log.error_message = ''
-            log.save(update_fields=['status', 'error_message'])
+            log.analysis_checkpoint = {}
+            log.save(update_fields=['status', 'error_message', 'analysis_checkpoint'])
             
             
             analyze_log_task.delay(str(log.id)) 
@@ -66,4 +275,167 @@ class LogViewSet(viewsets.ModelViewSet):
         return Response(
             {'error': 'Can only retry failed logs'},
             status=status.HTTP_400_BAD_REQUEST
-        ) 
\ No newline at end of file
+        )
+
+
+class LogUploadSessionViewSet(mixins.CreateModelMixin,
+                              mixins.RetrieveModelMixin,
+                              mixins.ListModelMixin,
+                              mixins.DestroyModelMixin,
+                              viewsets.GenericViewSet):
+    """ViewSet for resumable, chunked log uploads.
+
+    A client creates a session, PUTs byte ranges to `chunk` in order and
+    then calls `finalize`. An interrupted client can retrieve the session
+    to find `received_bytes` and resume from there.
+    """
+
+    serializer_class = LogUploadSessionSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        """Return upload sessions for the current user."""
+        return LogUploadSession.objects.filter(user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        """Abort the session and drop any staged bytes."""
+        if instance.status == 'finalizing':
+            raise ValidationError({'error': 'Upload session is being finalized'})
+        discard_upload(instance)
+        if instance.status == 'open':
+            instance.status = 'aborted'
+            instance.save(update_fields=['status', 'updated_at'])
+
+    @action(detail=True, methods=['put'])
+    def chunk(self, request, pk=None):
+        """Write the next byte range of the upload.
+
+        The range is taken from a `Content-Range` header, falling back to an
+        `offset` query parameter and the `Content-Length`; a chunk with
+        neither header is rejected with 411. A total size in the range must
+        match the one declared before and stay within LOG_UPLOAD_MAX_SIZE.
+        The body is streamed straight to disk.
+        """
+        content_range = parse_content_range(request.META.get('HTTP_CONTENT_RANGE'))
+        if content_range:
+            offset, end, total = content_range
+            length = end - offset + 1
+            if total is not None and total > settings.LOG_UPLOAD_MAX_SIZE:
+                return Response(
+                    {'error': f"Uploads are limited to {settings.LOG_UPLOAD_MAX_SIZE} bytes"},
+                    status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+                )
+        else:
+            try:
+                offset = int(request.query_params.get('offset', 0))
+            except ValueError:
+                return Response({'error': 'Invalid offset'}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                length = int(request.META['CONTENT_LENGTH'])
+            except (KeyError, ValueError):
+                return Response(
+                    {'error': 'A Content-Range or Content-Length header is required'},
+                    status=status.HTTP_411_LENGTH_REQUIRED
+                )
+            total = None
+
+        session = self.get_object()
+        with transaction.atomic():
+            session = LogUploadSession.objects.select_for_update().get(pk=session.pk)
+            if session.status != 'open':
+                return Response(
+                    {'error': 'Upload session is no longer open'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            if total is not None:
+                if session.total_size is not None and total != session.total_size:
+                    return Response(
+                        {'error': f"Upload size was declared as {session.total_size} bytes", 'total_size': session.total_size},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                session.total_size = total
+            limit = session.total_size or settings.LOG_UPLOAD_MAX_SIZE
+            if offset + length > limit:
+                return Response(
+                    {'error': 'Chunk exceeds the declared upload size'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            try:
+                written = write_chunk(session, request.stream, offset, length)
+            except UploadOffsetError as e:
+                return Response(
+                    {'error': str(e), 'received_bytes': e.expected},
+                    status=status.HTTP_409_CONFLICT
+                )
+
+            session.received_bytes = offset + written
+            session.save(update_fields=['total_size', 'received_bytes', 'updated_at'])
+
+        return Response(LogUploadSessionSerializer(session).data)
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        """Turn a fully uploaded session into a Log and start analysis.
+
+        The session is claimed as finalizing in a short transaction; the
+        upload is compressed, or extracted, outside of it, so no row lock
+        is held meanwhile.
+        """
+        session = self.get_object()
+        with transaction.atomic():
+            session = LogUploadSession.objects.select_for_update().get(pk=session.pk)
+            if session.status != 'open':
+                return Response(
+                    {'error': 'Upload session is no longer open'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if not session.received_bytes:
+                return Response({'error': 'Upload is empty'}, status=status.HTTP_400_BAD_REQUEST)
+            if session.total_size is not None and session.received_bytes != session.total_size:
+                return Response(
+                    {
+                        'error': 'Upload is incomplete',
+                        'received_bytes': session.received_bytes,
+                        'total_size': session.total_size
+                    },
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            session.status = 'finalizing'
+            session.save(update_fields=['status', 'updated_at'])
+
+        log = Log(
+            user=request.user,
+            repository=session.repository,
+            original_filename=session.original_filename,
+            status='pending'
+        )
+        try:
+            children = store_upload(session, log)
+        except Exception as e:
+            # The staged upload is gone; the session cannot be finalized again
+            session.status = 'aborted'
+            session.save(update_fields=['status', 'updated_at'])
+            if isinstance(e, ArchiveError):
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            raise
+
+        with transaction.atomic():
+            log.save()
+            Log.objects.bulk_create(children)
+
+            session.log = log
+            session.status = 'complete'
+            session.total_size = session.received_bytes
+            session.save(update_fields=['log', 'status', 'total_size', 'updated_at'])
+
+        if children:
+            analyze_log_batch_task.delay([str(child.id) for child in children])
+        else:
+            analyze_log_task.delay(str(log.id))
+
+        return Response(LogSerializer(log).data, status=status.HTTP_201_CREATED)
@@ -0,0 +1,294 @@
+"""Applying reviewed patches: one GitHub pull request with one commit.
+
+Patches applied together, e.g. the file patches of a change set, are
+written to their repository as a single commit on a new branch, and a
+pull request against the branch they were generated from is opened.
+Building the commit takes the same handful of GitHub requests however
+many files it changes, see github_integration.git_data.
+
+Applying takes several GitHub requests, so queue_apply claims the patches
+and queues a PatchApplyJob, which apply_patches_task runs.
+
+Before opening the pull request, check_patches makes sure the patches
+still apply: the branch may have moved on since they were generated. A
+file changed elsewhere is three-way merged, and the patch is rebased onto
+the new version or marked stale when the changes conflict. A rebased
+patch is reviewed again before it is applied.
+"""
+import uuid
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from github_integration.file_cache import COMMIT_SHA_RE, fetch_files
+from github_integration.git_data import get_branch_commit, open_pull_request
+from .diffs import unified_diff
+from .generation import file_ref
+from .merge import merge3
+from .models import Blob, ChangeSet, MergeResult, Patch, PatchApplyJob
+
+
+class StalePatchError(ValueError):
+    """Raised when patches conflict with the head of their branch."""
+
+    def __init__(self, patches):
+        paths = ', '.join(patch.original_file_path for patch in patches)
+        super().__init__(f'The branch has changed since these files were patched, and the changes conflict: {paths}')
+        self.patches = patches
+
+
+class ApplyConflictError(ValueError):
+    """Raised when patches are claimed for applying by another request."""
+
+
+class RebasedPatchError(ValueError):
+    """Raised when patches were rebased while being applied, and need reviewing again."""
+
+    def __init__(self, patches):
+        paths = ', '.join(patch.original_file_path for patch in patches)
+        super().__init__(f'The branch has changed since these files were reviewed; review the rebased patches again: {paths}')
+        self.patches = patches
+
+
+# Statuses of the patches a check may rebase; applied and rejected patches keep their code
+CHECKABLE_STATUSES = ('generated', 'reviewed')
+
+
+def base_branch(patch):
+    """Return the branch a pull request for `patch` targets.
+
+    That is the branch the patch was generated from, or the repository's
+    default branch when it was generated from a commit.
+    """
+    ref = file_ref(patch.bug)
+    if not ref or COMMIT_SHA_RE.match(ref):
+        return patch.bug.repository.default_branch
+    return ref
+
+
+def check_applicable(patches, status='reviewed'):
+    """Raise ValueError unless `patches`, all with `status`, can be applied together."""
+    if not patches:
+        raise ValueError('No patches to apply')
+    for patch in patches:
+        if patch.status != status:
+            raise ValueError('Only reviewed patches can be applied')
+        if not patch.diff:
+            raise ValueError('Patch has no diff content')
+    if len({patch.bug.repository_id for patch in patches}) > 1:
+        raise ValueError('Patches applied together must be in the same repository')
+    paths = [patch.original_file_path for patch in patches]
+    for path in set(paths):
+        if paths.count(path) > 1:
+            raise ValueError(f'Several patches change {path}; apply them one at a time')
+    if patches[0].bug.repository_id and len({base_branch(patch) for patch in patches}) > 1:
+        raise ValueError('Patches applied together must target the same branch')
+
+
+def apply_patches(patches, user, change_set=None):
+    """Open one pull request with all `patches` and mark them applied.
+
+    The patches are claimed for applying already (see queue_apply). Returns
+    the pull request URL, or None for patches without a repository, which
+    are only marked applied. Raises ValueError when the patches cannot be
+    applied together or the user has not connected GitHub, StalePatchError
+    when they conflict with the head of their branch, RebasedPatchError
+    when they were rebased onto it, and GitHubAPIError when GitHub refuses;
+    nothing is marked applied then.
+    """
+    check_applicable(patches, status='applying')
+    repository = patches[0].bug.repository
+
+    url = ''
+    if repository is not None:
+        head = check_patches(patches, user, statuses=('applying',))
+        stale = [patch for patch in patches if patch.applicability == 'stale']
+        if stale:
+            raise StalePatchError(stale)
+        rebased = [patch for patch in patches if patch.status == 'generated']
+        if rebased:
+            raise RebasedPatchError(rebased)
+        access_token = _access_token(user)
+        name = f'change-set-{change_set.id}' if change_set else f'patch-{patches[0].id}'
+        pull = open_pull_request(
+            repository, access_token,
+            base=base_branch(patches[0]),
+            branch=f'bugsquash/{name}-{uuid.uuid4().hex[:8]}',
+            files={patch.original_file_path: patch.patched_code for patch in patches},
+            title=_title(patches),
+            body=_body(patches),
+            base_commit=head
+        )
+        url = pull['html_url']
+
+    now = timezone.now()
+    with transaction.atomic():
+        Patch.objects.filter(id__in=[patch.id for patch in patches]).update(
+            status='applied', applied_at=now, pull_request_url=url, updated_at=now
+        )
+        if change_set is not None:
+            ChangeSet.objects.filter(id=change_set.id).update(
+                status='applied', applied_at=now, pull_request_url=url, updated_at=now
+            )
+    return url or None
+
+
+def queue_apply(patches, user, change_set=None):
+    """Claim reviewed `patches`, and their `change_set`, and queue a PatchApplyJob for them.
+
+    Raises ValueError when the patches cannot be applied together, the user
+    has not connected GitHub, and ApplyConflictError when a concurrent
+    request claimed them first.
+    """
+    check_applicable(patches)
+    if patches[0].bug.repository is not None:
+        _access_token(user)
+
+    now = timezone.now()
+    with transaction.atomic():
+        claimed = Patch.objects.filter(id__in=[patch.id for patch in patches], status='reviewed').update(
+            status='applying', updated_at=now
+        )
+        if change_set is not None:
+            claimed += ChangeSet.objects.filter(id=change_set.id, status='reviewed').update(
+                status='applying', updated_at=now
+            )
+        if claimed != len(patches) + (change_set is not None):
+            raise ApplyConflictError('These patches are being applied already')
+        job = PatchApplyJob.objects.create(user=user, change_set=change_set)
+        job.patches.set(patches)
+    for patch in patches:
+        patch.status = 'applying'
+    return job
+
+
+def release_patches(patches, change_set, status):
+    """Move claimed `patches`, and their `change_set`, from applying to `status`."""
+    now = timezone.now()
+    with transaction.atomic():
+        Patch.objects.filter(id__in=[patch.id for patch in patches], status='applying').update(
+            status=status, updated_at=now
+        )
+        if change_set is not None:
+            ChangeSet.objects.filter(id=change_set.id, status='applying').update(status=status, updated_at=now)
+
+
+def check_patches(patches, user, statuses=CHECKABLE_STATUSES):
+    """Check that `patches` still apply to the head of their branch; return its commit SHA.
+
+    Sets the `applicability` of each patch: current when its file has not
+    changed, rebased when it changed without conflicting (the patch's code
+    and diff are moved onto the new version), stale when the changes
+    conflict or the file is gone. Patches without a repository are current,
+    and None is returned for them.
+
+    Raises ValueError unless all patches have one of `statuses`. A rebased
+    patch that was reviewed, or is being applied, goes back to generated,
+    as does its change set, so the new code is reviewed before it is
+    applied.
+
+    Checking again costs one GitHub request for the head: patches checked
+    at that head are not checked again, files at a commit are served by
+    the file cache and merges by MergeResult.
+    """
+    for patch in patches:
+        if patch.status not in statuses:
+            raise ValueError(f'{patch.get_status_display()} patches cannot be checked')
+
+    now = timezone.now()
+    repository = patches[0].bug.repository
+    if repository is None:
+        for patch in patches:
+            _save_check(patch, 'current', '', now)
+        return None
+
+    access_token = _access_token(user)
+    head = get_branch_commit(repository, access_token, base_branch(patches[0]))
+    unchecked = [
+        patch for patch in patches
+        if patch.checked_commit != head or patch.applicability == 'unknown'
+    ]
+    if unchecked:
+        contents = fetch_files(repository, head, [patch.original_file_path for patch in unchecked], access_token)
+        for patch in unchecked:
+            _check(patch, contents.get(patch.original_file_path), head, now)
+    return head
+
+
+def _check(patch, head_code, head, now):
+    if head_code is None:
+        _save_check(patch, 'stale', head, now)
+    elif head_code == patch.original_code:
+        _save_check(patch, 'current', head, now)
+    else:
+        merged = _merge(patch, head_code)
+        if merged is None:
+            _save_check(patch, 'stale', head, now)
+            return
+        path = patch.original_file_path
+        patch.original_code = head_code
+        patch.patched_code = merged
+        patch.diff = unified_diff(head_code, merged, f'a/{path}', f'b/{path}')
+        fields = ['original_code', 'patched_code', 'diff']
+        if patch.status != 'generated':
+            patch.status = 'generated'
+            fields += ['status', 'updated_at']
+            if patch.change_set_id:
+                ChangeSet.objects.filter(id=patch.change_set_id).update(status='generated', updated_at=now)
+        _save_check(patch, 'rebased', head, now, fields)
+
+
+def _save_check(patch, applicability, head, now, fields=()):
+    patch.applicability = applicability
+    patch.checked_commit = head
+    patch.checked_at = now
+    patch.save(update_fields=['applicability', 'checked_commit', 'checked_at', *fields])
+
+
+def _merge(patch, head_code):
+    """Return the patch's change merged into `head_code`, None on conflicts; cached by blob."""
+    key = {
+        'base_blob_id': patch.original_blob_id,
+        'ours_blob_id': patch.patched_blob_id,
+        'theirs_blob_id': Blob.objects.store(head_code),
+    }
+    result = MergeResult.objects.filter(**key).select_related('merged_blob').first()
+    if result is not None:
+        return result.merged_blob.text() if result.merged_blob_id else None
+
+    merged, conflicts = merge3(patch.original_code, patch.patched_code, head_code)
+    try:
+        with transaction.atomic():
+            MergeResult.objects.create(
+                merged_blob_id=Blob.objects.store(merged) if merged is not None else None,
+                conflicts=conflicts,
+                **key
+            )
+    except IntegrityError:
+        # Cached by a concurrent check
+        pass
+    return merged
+
+
+def _access_token(user):
+    try:
+        return user.github_oauth.access_token
+    except ObjectDoesNotExist:
+        raise ValueError('Connect your GitHub account to apply patches')
+
+
+def _title(patches):
+    bugs = {bug.id: bug for patch in patches for bug in [patch.bug, *patch.bugs.all()]}
+    if len(bugs) == 1:
+        return f'Fix: {patches[0].bug.title}'
+    return f'Fix {len(bugs)} bugs in {len(patches)} files'
+
+
+def _body(patches):
+    lines = ['Patches generated by BugSquash:', '']
+    for patch in patches:
+        stats = patch.get_diff_stats()
+        titles = '; '.join(sorted({bug.title for bug in [patch.bug, *patch.bugs.all()]}))
+        lines.append(
+            f"- `{patch.original_file_path}` (+{stats['added_lines']} -{stats['removed_lines']}): {titles}"
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,58 @@
+"""Content-addressed storage for patch source code.
+
+A blob is text stored once under the SHA-256 of its UTF-8 bytes, so every
+patch against the same version of a file shares one copy of it. Blobs
+larger than BLOB_MIN_COMPRESS_SIZE are compressed with
+PATCH_BLOB_COMPRESSION when that makes them smaller.
+"""
+import gzip
+import hashlib
+from django.conf import settings
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional, gzip is always available
+    zstandard = None
+
+# Blobs smaller than this are stored as they are
+BLOB_MIN_COMPRESS_SIZE = 512
+
+
+def get_compression():
+    """Return the configured compression method, falling back to gzip."""
+    method = settings.PATCH_BLOB_COMPRESSION
+    if method == 'zstd' and zstandard is None:
+        return 'gzip'
+    return method
+
+
+def encode(text, method=None):
+    """Return (sha256, size, compression, data) for storing `text` as a blob."""
+    raw = text.encode('utf-8')
+    sha256 = hashlib.sha256(raw).hexdigest()
+    method = method or get_compression()
+    data = raw
+    if len(raw) >= BLOB_MIN_COMPRESS_SIZE and method != 'none':
+        if method == 'zstd':
+            compressed = zstandard.ZstdCompressor(level=3).compress(raw)
+        else:
+            compressed = gzip.compress(raw, compresslevel=6, mtime=0)
+        if len(compressed) < len(raw):
+            data = compressed
+        else:
+            method = 'none'
+    else:
+        method = 'none'
+    return sha256, len(raw), method, data
+
+
+def decode(compression, data):
+    """Return the text of a blob."""
+    data = bytes(data)
+    if compression == 'gzip':
+        data = gzip.decompress(data)
+    elif compression == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('zstandard is required to read zstd-compressed blobs')
+        data = zstandard.ZstdDecompressor().decompress(data)
+    return data.decode('utf-8')
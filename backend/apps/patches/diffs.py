@@ -0,0 +1,323 @@
+"""Unified diff helpers.
+
+Diffs are computed over interned lines: every distinct line is replaced by
+a small integer once, so the diff algorithms compare integers instead of
+strings. The engine is chosen with PATCH_DIFF_ENGINE:
+
+histogram   git's histogram diff: matches the rarest lines first, falling
+            back to Myers for regions where every line is common
+myers       Myers' O(ND) diff
+difflib     Python's difflib.SequenceMatcher, quadratic on some inputs
+
+A diff that runs longer than PATCH_DIFF_TIMEOUT seconds, or whose changed
+region spans more than PATCH_DIFF_MAX_LINES lines, becomes coarse: the
+parts not resolved in time are reported as replaced wholesale. A coarse
+diff is larger than necessary but still correct.
+"""
+import difflib
+import logging
+import time
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Lines occurring more often than this in a region are not used as
+# histogram anchors, as in git
+HISTOGRAM_MAX_CHAIN = 64
+
+
+class DiffTimeout(Exception):
+    """Raised by an engine that ran out of time."""
+
+
+def split_lines(text):
+    """Split `text` into lines that keep their '\\n', as git does.
+
+    Unlike str.splitlines, only '\\n' ends a line; a final line without one
+    is kept as it is.
+    """
+    lines = text.split('\n')
+    last = lines.pop()
+    lines = [line + '\n' for line in lines]
+    if last:
+        lines.append(last)
+    return lines
+
+
+def intern_lines(*sequences):
+    """Return the sequences of lines with each distinct line replaced by an integer."""
+    ids = {}
+    return [[ids.setdefault(line, len(ids)) for line in lines] for lines in sequences]
+
+
+def _check(deadline):
+    if time.monotonic() > deadline:
+        raise DiffTimeout
+
+
+def _myers(a, b, alo, ahi, blo, bhi, deadline):
+    """Matching blocks of a[alo:ahi] and b[blo:bhi] by Myers' greedy algorithm."""
+    n, m = ahi - alo, bhi - blo
+    offset = n + m + 1
+    v = [0] * (2 * offset + 1)
+    trace = []
+    for d in range(n + m + 1):
+        _check(deadline)
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                trace.append(v[offset - d:offset + d + 1])
+                return _myers_blocks(trace, n, m, alo, blo)
+        trace.append(v[offset - d:offset + d + 1])
+    return []
+
+
+def _myers_blocks(trace, x, y, alo, blo):
+    """Walk the Myers trace back from (x, y) and collect the diagonals."""
+    blocks = []
+    for d in range(len(trace) - 1, 0, -1):
+        previous = trace[d - 1]
+        k = x - y
+        if k == -d or (k != d and previous[k - 1 + d - 1] < previous[k + 1 + d - 1]):
+            prev_k = k + 1
+            prev_x = previous[prev_k + d - 1]
+            start_x = prev_x
+        else:
+            prev_k = k - 1
+            prev_x = previous[prev_k + d - 1]
+            start_x = prev_x + 1
+        length = x - start_x
+        if length:
+            blocks.append((alo + start_x, blo + start_x - k, length))
+        x, y = prev_x, prev_x - prev_k
+    if x:
+        blocks.append((alo, blo, x))
+    return blocks
+
+
+def _histogram_anchor(a, b, alo, ahi, blo, bhi):
+    """Return the (i, j, size) common run around the rarest shared line, or None."""
+    occurrences = {}
+    for i in range(alo, ahi):
+        occurrences.setdefault(a[i], []).append(i)
+
+    best = None
+    best_count = HISTOGRAM_MAX_CHAIN
+    j = blo
+    while j < bhi:
+        next_j = j + 1
+        positions = occurrences.get(b[j])
+        if positions and len(positions) <= best_count:
+            for i in positions:
+                start_i, start_j = i, j
+                while start_i > alo and start_j > blo and a[start_i - 1] == b[start_j - 1]:
+                    start_i -= 1
+                    start_j -= 1
+                end_i, end_j = i + 1, j + 1
+                while end_i < ahi and end_j < bhi and a[end_i] == b[end_j]:
+                    end_i += 1
+                    end_j += 1
+                size = end_i - start_i
+                if best is None or len(positions) < best_count or size > best[2]:
+                    best = start_i, start_j, size
+                    best_count = len(positions)
+                # The rest of this run is covered by the match just found
+                next_j = max(next_j, end_j)
+        j = next_j
+    return best
+
+
+def _histogram(a, b, alo, ahi, blo, bhi, deadline):
+    """Matching blocks of a[alo:ahi] and b[blo:bhi] by histogram diff."""
+    blocks = []
+    regions = [(alo, ahi, blo, bhi)]
+    while regions:
+        _check(deadline)
+        alo, ahi, blo, bhi = regions.pop()
+        anchor = _histogram_anchor(a, b, alo, ahi, blo, bhi)
+        if anchor is None:
+            blocks.extend(_myers(a, b, alo, ahi, blo, bhi, deadline))
+            continue
+        i, j, size = anchor
+        blocks.append(anchor)
+        if alo < i and blo < j:
+            regions.append((alo, i, blo, j))
+        if i + size < ahi and j + size < bhi:
+            regions.append((i + size, ahi, j + size, bhi))
+    return blocks
+
+
+def _difflib(a, b, alo, ahi, blo, bhi, deadline):
+    """Matching blocks of a[alo:ahi] and b[blo:bhi] by difflib's SequenceMatcher.
+
+    Regions are split around their longest match as in
+    SequenceMatcher.get_matching_blocks, checking the deadline before each.
+    """
+    matcher = difflib.SequenceMatcher(None, a[alo:ahi], b[blo:bhi])
+    blocks = []
+    regions = [(0, ahi - alo, 0, bhi - blo)]
+    while regions:
+        _check(deadline)
+        i_lo, i_hi, j_lo, j_hi = regions.pop()
+        i, j, size = matcher.find_longest_match(i_lo, i_hi, j_lo, j_hi)
+        if not size:
+            continue
+        blocks.append((alo + i, blo + j, size))
+        if i_lo < i and j_lo < j:
+            regions.append((i_lo, i, j_lo, j))
+        if i + size < i_hi and j + size < j_hi:
+            regions.append((i + size, i_hi, j + size, j_hi))
+    return blocks
+
+
+DIFF_ENGINES = {
+    'histogram': _histogram,
+    'myers': _myers,
+    'difflib': _difflib,
+}
+
+
+def matching_blocks(a, b, engine=None, timeout=None):
+    """Return the (i, j, size) runs of lines common to `a` and `b`, in order.
+
+    `a` and `b` are sequences of hashable lines, e.g. from intern_lines.
+    Falls back to a coarse diff when the engine runs out of time or the
+    changed region is too large.
+    """
+    engine = engine or settings.PATCH_DIFF_ENGINE
+    if timeout is None:
+        timeout = settings.PATCH_DIFF_TIMEOUT
+    diff = DIFF_ENGINES[engine]
+
+    # The common head and tail are matched without the engine
+    alo, ahi, blo, bhi = 0, len(a), 0, len(b)
+    while alo < ahi and blo < bhi and a[alo] == b[blo]:
+        alo += 1
+        blo += 1
+    while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+        ahi -= 1
+        bhi -= 1
+
+    blocks = [(0, 0, alo)] if alo else []
+    if alo < ahi and blo < bhi:
+        if (ahi - alo) + (bhi - blo) > settings.PATCH_DIFF_MAX_LINES:
+            logger.warning("Diff of %d lines is over PATCH_DIFF_MAX_LINES, using a coarse diff", (ahi - alo) + (bhi - blo))
+        else:
+            try:
+                blocks.extend(sorted(diff(a, b, alo, ahi, blo, bhi, time.monotonic() + timeout)))
+            except DiffTimeout:
+                logger.warning("%s diff took over %ss, using a coarse diff", engine, timeout)
+    if ahi < len(a):
+        blocks.append((ahi, bhi, len(a) - ahi))
+    return blocks
+
+
+def _opcodes(blocks, len_a, len_b):
+    """Turn matching blocks into difflib-style (tag, i1, i2, j1, j2) opcodes."""
+    opcodes = []
+    i = j = 0
+    for block_i, block_j, size in list(blocks) + [(len_a, len_b, 0)]:
+        if i < block_i and j < block_j:
+            opcodes.append(('replace', i, block_i, j, block_j))
+        elif i < block_i:
+            opcodes.append(('delete', i, block_i, j, block_j))
+        elif j < block_j:
+            opcodes.append(('insert', i, block_i, j, block_j))
+        if size:
+            opcodes.append(('equal', block_i, block_i + size, block_j, block_j + size))
+        i, j = block_i + size, block_j + size
+    return opcodes
+
+
+def _grouped_opcodes(opcodes, context):
+    """Split opcodes into hunks with up to `context` lines of context, as difflib does."""
+    if not opcodes:
+        return
+    opcodes = list(opcodes)
+    tag, i1, i2, j1, j2 = opcodes[0]
+    if tag == 'equal':
+        opcodes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    tag, i1, i2, j1, j2 = opcodes[-1]
+    if tag == 'equal':
+        opcodes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+
+    group = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal' and i2 - i1 > 2 * context:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        yield group
+
+
+def _format_range(start, stop):
+    length = stop - start
+    if length == 1:
+        return f'{start + 1}'
+    if not length:
+        start -= 1
+    return f'{start + 1},{length}'
+
+
+def _diff_line(prefix, line):
+    if line.endswith('\n'):
+        return prefix + line
+    return prefix + line + '\n\\ No newline at end of file\n'
+
+
+def unified_diff(original, patched, fromfile, tofile, context=3, engine=None, timeout=None):
+    """Return a unified diff of two texts, '' when they are equal."""
+    a, b = split_lines(original), split_lines(patched)
+    blocks = matching_blocks(*intern_lines(a, b), engine=engine, timeout=timeout)
+    out = []
+    for group in _grouped_opcodes(_opcodes(blocks, len(a), len(b)), context):
+        if not out:
+            out.append(f'--- {fromfile}\n+++ {tofile}\n')
+        out.append(
+            f'@@ -{_format_range(group[0][1], group[-1][2])} +{_format_range(group[0][3], group[-1][4])} @@\n'
+        )
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                out.extend(_diff_line(' ', line) for line in a[i1:i2])
+                continue
+            out.extend(_diff_line('-', line) for line in a[i1:i2])
+            out.extend(_diff_line('+', line) for line in b[j1:j2])
+    return ''.join(out)
+
+
+def diff_stats(diff):
+    """Count the added and removed lines, hunks and files of a unified diff.
+
+    One pass over the text; `+++`/`---` file headers are not counted as
+    changed lines.
+    """
+    added = removed = hunks = files = 0
+    for line in (diff or '').splitlines():
+        if line.startswith('+++'):
+            files += 1
+        elif line.startswith('---'):
+            continue
+        elif line.startswith('+'):
+            added += 1
+        elif line.startswith('-'):
+            removed += 1
+        elif line.startswith('@@'):
+            hunks += 1
+    return {
+        'added_lines': added,
+        'removed_lines': removed,
+        'changed_lines': added + removed,
+        'changed_hunks': hunks,
+        'changed_files': files,
+    }
@@ -0,0 +1,127 @@
+"""Compare the diff engines on real source files.
+
+    python manage.py benchmark_diff apps/ --engines histogram,difflib
+    python manage.py benchmark_diff . --rev HEAD~20
+
+Without --rev, every file is diffed against an edited copy of itself:
+lines changed, inserted, deleted and a block moved, chosen with a fixed
+seed so runs are comparable. With --rev, every file is diffed against its
+version at that git revision.
+"""
+import os
+import random
+import subprocess
+import time
+from django.core.management.base import BaseCommand, CommandError
+from apps.patches.diffs import DIFF_ENGINES, unified_diff
+
+SOURCE_SUFFIXES = ('.py', '.js', '.jsx', '.ts', '.tsx', '.java', '.go', '.rb', '.c', '.h', '.cpp', '.css', '.html')
+SKIP_DIRS = {'.git', 'node_modules', '__pycache__', 'migrations', 'dist', 'build'}
+
+
+def _source_files(paths):
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(name for name in dirs if name not in SKIP_DIRS)
+            for name in sorted(files):
+                if name.endswith(SOURCE_SUFFIXES):
+                    yield os.path.join(root, name)
+
+
+def _edit(text, rnd, edits):
+    """Return `text` with `edits` random line edits and one moved block."""
+    lines = text.splitlines(keepends=True)
+    for _ in range(edits):
+        if not lines:
+            break
+        i = rnd.randrange(len(lines))
+        op = rnd.random()
+        if op < 0.4:
+            lines[i] = lines[i].rstrip('\n') + '  # edited\n'
+        elif op < 0.7:
+            lines.insert(i, lines[rnd.randrange(len(lines))])
+        else:
+            del lines[i:i + rnd.randint(1, 3)]
+    if len(lines) > 20:
+        start = rnd.randrange(len(lines) - 10)
+        block = lines[start:start + 10]
+        del lines[start:start + 10]
+        target = rnd.randrange(len(lines))
+        lines[target:target] = block
+    return ''.join(lines)
+
+
+def _at_revision(path, rev):
+    result = subprocess.run(
+        ['git', 'show', f'{rev}:./{os.path.basename(path)}'],
+        cwd=os.path.dirname(os.path.abspath(path)), capture_output=True
+    )
+    if result.returncode != 0:
+        return None
+    return result.stdout.decode('utf-8', errors='replace')
+
+
+class Command(BaseCommand):
+    help = 'Time the patch diff engines on source files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Source files or directories')
+        parser.add_argument('--engines', default=','.join(DIFF_ENGINES), help='Comma-separated engines')
+        parser.add_argument('--rev', help='Diff against the files at this git revision instead of edited copies')
+        parser.add_argument('--edits', type=int, default=20, help='Random line edits per file')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per file; the fastest counts')
+        parser.add_argument('--timeout', type=float, help='Diff time budget in seconds (default PATCH_DIFF_TIMEOUT)')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        engines = [name.strip() for name in options['engines'].split(',') if name.strip()]
+        unknown = [name for name in engines if name not in DIFF_ENGINES]
+        if unknown:
+            raise CommandError(f"Unknown engines: {', '.join(unknown)}")
+
+        rnd = random.Random(options['seed'])
+        pairs = []
+        for path in _source_files(options['paths']):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    text = f.read()
+            except (OSError, UnicodeDecodeError):
+                continue
+            if options['rev']:
+                old = _at_revision(path, options['rev'])
+                if old is not None and old != text:
+                    pairs.append((path, old, text))
+            else:
+                pairs.append((path, text, _edit(text, rnd, options['edits'])))
+        if not pairs:
+            raise CommandError('No files to diff')
+
+        totals = {name: {'seconds': 0.0, 'slowest': (0.0, ''), 'changed': 0} for name in engines}
+        for path, old, new in pairs:
+            for name in engines:
+                best = None
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    diff = unified_diff(old, new, 'a', 'b', engine=name, timeout=options['timeout'])
+                    elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+                total = totals[name]
+                total['seconds'] += best
+                total['slowest'] = max(total['slowest'], (best, path))
+                total['changed'] += sum(
+                    1 for line in diff.splitlines()
+                    if line[:1] in '+-' and not line.startswith(('+++', '---'))
+                )
+
+        lines = sum(old.count('\n') + new.count('\n') for _, old, new in pairs)
+        self.stdout.write(f"{len(pairs)} file pairs, {lines} lines\n")
+        self.stdout.write(f"{'engine':<10} {'total ms':>10} {'slowest ms':>11} {'changed lines':>14}  slowest file")
+        for name in engines:
+            total = totals[name]
+            self.stdout.write(
+                f"{name:<10} {total['seconds'] * 1000:>10.1f} {total['slowest'][0] * 1000:>11.1f} "
+                f"{total['changed']:>14}  {total['slowest'][1]}"
+            )
@@ -0,0 +1,59 @@
+"""Three-way merge of texts, line by line (diff3).
+
+The base is diffed against both sides. Lines matched in all three stay
+as they are. Every region in between was changed on one side, on both
+sides identically, or on both sides differently; only the last one is a
+conflict.
+"""
+from .diffs import intern_lines, matching_blocks, split_lines
+
+
+def _sync_regions(a_blocks, b_blocks, len_base, len_a, len_b):
+    """Yield (base start, base end, a start, b start) of runs matched in all three texts."""
+    ia = ib = 0
+    while ia < len(a_blocks) and ib < len(b_blocks):
+        a_base, a_start, a_size = a_blocks[ia]
+        b_base, b_start, b_size = b_blocks[ib]
+        start, end = max(a_base, b_base), min(a_base + a_size, b_base + b_size)
+        if start < end:
+            yield start, end, a_start + start - a_base, b_start + start - b_base
+        if a_base + a_size < b_base + b_size:
+            ia += 1
+        else:
+            ib += 1
+    yield len_base, len_base, len_a, len_b
+
+
+def merge3(base, ours, theirs):
+    """Merge the changes from `base` to `ours` into `theirs`.
+
+    Returns (merged text, conflicts); the text is None when a region was
+    changed differently on both sides.
+    """
+    base_lines, our_lines, their_lines = split_lines(base), split_lines(ours), split_lines(theirs)
+    base_ids, our_ids, their_ids = intern_lines(base_lines, our_lines, their_lines)
+    regions = _sync_regions(
+        matching_blocks(base_ids, our_ids), matching_blocks(base_ids, their_ids),
+        len(base_ids), len(our_ids), len(their_ids)
+    )
+
+    merged = []
+    conflicts = 0
+    base_at = our_at = their_at = 0
+    for base_start, base_end, our_start, their_start in regions:
+        base_chunk = base_ids[base_at:base_start]
+        our_chunk = our_ids[our_at:our_start]
+        their_chunk = their_ids[their_at:their_start]
+        if our_chunk == base_chunk:
+            merged.extend(their_lines[their_at:their_start])
+        elif their_chunk == base_chunk or their_chunk == our_chunk:
+            merged.extend(our_lines[our_at:our_start])
+        else:
+            conflicts += 1
+        merged.extend(base_lines[base_start:base_end])
+        size = base_end - base_start
+        base_at, our_at, their_at = base_end, our_start + size, their_start + size
+
+    if conflicts:
+        return None, conflicts
+    return ''.join(merged), 0
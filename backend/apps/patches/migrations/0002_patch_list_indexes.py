@@ -0,0 +1,24 @@
+# Generated by Django 5.0.2 on 2026-10-18 13:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bugs', '0006_bug_list_index'),
+        ('patches', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='patch',
+            index=models.Index(fields=['created_at', 'id'], name='patches_pat_created_c95a1c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patch',
+            index=models.Index(fields=['bug', 'created_at', 'id'], name='patches_pat_bug_id_a5e41f_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.0.2 on 2026-10-18 14:10
+
+from django.conf import settings
+from django.db import migrations, models
+from apps.patches.diffs import diff_stats
+
+BATCH_SIZE = 500
+
+
+def compute_diff_stats(apps, schema_editor):
+    Patch = apps.get_model('patches', 'Patch')
+    patches = Patch.objects.only('id', 'diff').order_by('id')
+    batch = []
+    for patch in patches.iterator(chunk_size=BATCH_SIZE):
+        for field, value in diff_stats(patch.diff).items():
+            setattr(patch, field, value)
+        batch.append(patch)
+        if len(batch) == BATCH_SIZE:
+            Patch.objects.bulk_update(batch, list(diff_stats('')))
+            batch = []
+    if batch:
+        Patch.objects.bulk_update(batch, list(diff_stats('')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bugs', '0006_bug_list_index'),
+        ('patches', '0002_patch_list_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patch',
+            name='added_lines',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='patch',
+            name='changed_files',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='patch',
+            name='changed_hunks',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='patch',
+            name='changed_lines',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='patch',
+            name='removed_lines',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='patch',
+            index=models.Index(fields=['changed_lines'], name='patches_pat_changed_b04918_idx'),
+        ),
+        migrations.RunPython(compute_diff_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.0.2 on 2026-10-18 16:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+from apps.patches.blobs import encode
+
+BATCH_SIZE = 200
+
+
+def move_code_to_blobs(apps, schema_editor):
+    Blob = apps.get_model('patches', 'Blob')
+    Patch = apps.get_model('patches', 'Patch')
+    known = set()
+    batch = []
+
+    def flush():
+        Patch.objects.bulk_update(batch, ['original_blob', 'patched_blob'])
+        batch.clear()
+
+    patches = Patch.objects.only('id', 'original_code', 'patched_code').order_by('id')
+    for patch in patches.iterator(chunk_size=BATCH_SIZE):
+        for which in ('original', 'patched'):
+            sha256, size, compression, data = encode(getattr(patch, f'{which}_code'))
+            if sha256 not in known:
+                Blob.objects.get_or_create(
+                    sha256=sha256, defaults={'size': size, 'compression': compression, 'data': data}
+                )
+                known.add(sha256)
+            setattr(patch, f'{which}_blob_id', sha256)
+        batch.append(patch)
+        if len(batch) == BATCH_SIZE:
+            flush()
+    if batch:
+        flush()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patches', '0004_patch_generation_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('size', models.BigIntegerField(help_text='Size of the text in bytes, uncompressed')),
+                ('compression', models.CharField(choices=[('none', 'None'), ('gzip', 'gzip'), ('zstd', 'Zstandard')], default='none', max_length=10)),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='patch',
+            name='original_blob',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='patches.blob'),
+        ),
+        migrations.AddField(
+            model_name='patch',
+            name='patched_blob',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='patches.blob'),
+        ),
+        migrations.RunPython(move_code_to_blobs, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='patch',
+            name='original_code',
+        ),
+        migrations.RemoveField(
+            model_name='patch',
+            name='patched_code',
+        ),
+        migrations.AlterField(
+            model_name='patch',
+            name='original_blob',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='patches.blob'),
+        ),
+        migrations.AlterField(
+            model_name='patch',
+            name='patched_blob',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='patches.blob'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.2 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def fill_bugs(apps, schema_editor):
+    """Existing patches and jobs are for their `bug` alone."""
+    for model_name, column in (('Patch', 'patch_id'), ('PatchGenerationJob', 'patchgenerationjob_id')):
+        model = apps.get_model('patches', model_name)
+        through = model.bugs.through
+        rows = model.objects.values_list('id', 'bug_id').order_by('id')
+        batch = []
+        for row_id, bug_id in rows.iterator(chunk_size=BATCH_SIZE):
+            batch.append(through(**{column: row_id, 'bug_id': bug_id}))
+            if len(batch) == BATCH_SIZE:
+                through.objects.bulk_create(batch)
+                batch = []
+        through.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bugs', '0006_bug_list_index'),
+        ('patches', '0005_patch_code_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patch',
+            name='bugs',
+            field=models.ManyToManyField(blank=True, related_name='combined_patches', to='bugs.bug'),
+        ),
+        migrations.AddField(
+            model_name='patchgenerationjob',
+            name='bugs',
+            field=models.ManyToManyField(blank=True, related_name='+', to='bugs.bug'),
+        ),
+        migrations.RunPython(fill_bugs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.0.2 on 2026-10-18 18:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bugs', '0006_bug_list_index'),
+        ('github_integration', '0003_repository_file_cache'),
+        ('patches', '0006_combined_patches'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patchgenerationjob',
+            name='kind',
+            field=models.CharField(choices=[('patch', 'Patch'), ('change_set', 'Change set')], default='patch', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='ChangeSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ref', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('generated', 'Generated'), ('reviewed', 'Reviewed'), ('applied', 'Applied'), ('failed', 'Failed'), ('rejected', 'Rejected')], default='pending', max_length=20)),
+                ('confidence_score', models.FloatField(default=0.0)),
+                ('review_notes', models.TextField(blank=True)),
+                ('applied_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('bug', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='change_sets', to='bugs.bug')),
+                ('bugs', models.ManyToManyField(blank=True, related_name='+', to='bugs.bug')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='created_change_sets', to=settings.AUTH_USER_MODEL)),
+                ('repository', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='change_sets', to='github_integration.githubrepository')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='patch',
+            name='change_set',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='patches', to='patches.changeset'),
+        ),
+        migrations.AddField(
+            model_name='patchgenerationjob',
+            name='change_set',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='patches.changeset'),
+        ),
+        migrations.AddIndex(
+            model_name='changeset',
+            index=models.Index(fields=['created_at', 'id'], name='patches_cha_created_9e09e4_idx'),
+        ),
+    ]
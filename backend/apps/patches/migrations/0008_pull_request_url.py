@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-18 19:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patches', '0007_change_sets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='changeset',
+            name='pull_request_url',
+            field=models.URLField(blank=True, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='patch',
+            name='pull_request_url',
+            field=models.URLField(blank=True, max_length=500),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.0.2 on 2026-10-18 20:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patches', '0008_pull_request_url'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patch',
+            name='applicability',
+            field=models.CharField(choices=[('unknown', 'Not checked'), ('current', 'Applies as generated'), ('rebased', 'Rebased onto the branch head'), ('stale', 'Conflicts with the branch head')], default='unknown', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='patch',
+            name='checked_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='patch',
+            name='checked_commit',
+            field=models.CharField(blank=True, help_text='Branch head commit of the last check', max_length=40),
+        ),
+        migrations.CreateModel(
+            name='MergeResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('conflicts', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('base_blob', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='patches.blob')),
+                ('merged_blob', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='patches.blob')),
+                ('ours_blob', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='patches.blob')),
+                ('theirs_blob', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='patches.blob')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('base_blob', 'ours_blob', 'theirs_blob'), name='patches_merge_result_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.2 on 2026-10-18 20:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patches', '0009_patch_applicability'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='patchgenerationjob',
+            name='patches_job_one_unfinished',
+        ),
+        migrations.AddConstraint(
+            model_name='patchgenerationjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'running'])), fields=('bug', 'user', 'kind'), name='patches_job_one_unfinished'),
+        ),
+    ]
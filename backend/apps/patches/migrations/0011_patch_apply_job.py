@@ -0,0 +1,47 @@
+# Generated by Django 5.0.2 on 2026-10-18 21:15
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patches', '0010_patch_job_unfinished_per_kind'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='changeset',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('generated', 'Generated'), ('reviewed', 'Reviewed'), ('applying', 'Applying'), ('applied', 'Applied'), ('failed', 'Failed'), ('rejected', 'Rejected')], default='pending', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='patch',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('generated', 'Generated'), ('reviewed', 'Reviewed'), ('applying', 'Applying'), ('applied', 'Applied'), ('failed', 'Failed'), ('rejected', 'Rejected')], default='pending', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='PatchApplyJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('pull_request_url', models.URLField(blank=True, max_length=500)),
+                ('error', models.TextField(blank=True)),
+                ('stale', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('change_set', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='patches.changeset')),
+                ('patches', models.ManyToManyField(related_name='+', to='patches.patch')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='patch_apply_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['created_at', 'id'], name='patches_pat_created_19ae79_idx')],
+            },
+        ),
+    ]
@@ -1,34 +1,110 @@
-from django.db import models
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import Q
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from apps.bugs.models import Bug
 from apps.users.models import User
+from github_integration.models import GitHubRepository
+from .blobs import decode, encode
+from .diffs import diff_stats
+import uuid
+
+
+class BlobManager(models.Manager):
+    def store(self, text):
+        """Store `text` unless an identical blob exists; return its sha256."""
+        sha256, size, compression, data = encode(text)
+        if not self.filter(sha256=sha256).exists():
+            try:
+                with transaction.atomic():
+                    self.create(sha256=sha256, size=size, compression=compression, data=data)
+            except IntegrityError:
+                # Stored by a concurrent writer
+                pass
+        return sha256
+
+
+class Blob(models.Model):
+    """Text stored once under the SHA-256 of its content, see apps.patches.blobs."""
+
+    COMPRESSION_CHOICES = [
+        ('none', 'None'),
+        ('gzip', 'gzip'),
+        ('zstd', 'Zstandard'),
+    ]
+
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    size = models.BigIntegerField(help_text='Size of the text in bytes, uncompressed')
+    compression = models.CharField(max_length=10, choices=COMPRESSION_CHOICES, default='none')
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = BlobManager()
+
+    def __str__(self):
+        return self.sha256
+
+    def text(self):
+        return decode(self.compression, self.data)
+
 
 class Patch(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('generated', 'Generated'),
         ('reviewed', 'Reviewed'),
+        ('applying', 'Applying'),
         ('applied', 'Applied'),
         ('failed', 'Failed'),
         ('rejected', 'Rejected'),
     ]
 
     bug = models.ForeignKey(Bug, on_delete=models.CASCADE, related_name='patches')
+    # Every bug the patch fixes: `bug` alone, or all bugs of the file for a
+    # combined patch
+    bugs = models.ManyToManyField(Bug, related_name='combined_patches', blank=True)
+    # Set for the file patches of a multi-file change, reviewed and applied
+    # with the change set rather than one by one
+    change_set = models.ForeignKey(
+        'ChangeSet', on_delete=models.CASCADE, null=True, blank=True, related_name='patches'
+    )
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='created_patches')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     
-    # Original code
+    # Original and patched code, shared with other patches of the same code;
+    # read and written as `original_code` and `patched_code`
     original_file_path = models.CharField(max_length=255)
-    original_code = models.TextField()
-    
-    # Patched code
-    patched_code = models.TextField()
+    original_blob = models.ForeignKey(Blob, on_delete=models.PROTECT, related_name='+')
+    patched_blob = models.ForeignKey(Blob, on_delete=models.PROTECT, related_name='+')
     diff = models.TextField(help_text='Unified diff format of the changes')
+
+    # Diff statistics, computed from `diff` whenever it is saved
+    added_lines = models.PositiveIntegerField(default=0)
+    removed_lines = models.PositiveIntegerField(default=0)
+    changed_lines = models.PositiveIntegerField(default=0)
+    changed_hunks = models.PositiveIntegerField(default=0)
+    changed_files = models.PositiveIntegerField(default=0)
+    DIFF_STATS_FIELDS = ('added_lines', 'removed_lines', 'changed_lines', 'changed_hunks', 'changed_files')
     
     # Metadata
     confidence_score = models.FloatField(default=0.0)
     review_notes = models.TextField(blank=True)
     applied_at = models.DateTimeField(null=True, blank=True)
+    pull_request_url = models.URLField(max_length=500, blank=True)
+
+    # Whether the patch still applies to the head of its branch, see
+    # apps.patches.applying.check_patches
+    APPLICABILITY_CHOICES = [
+        ('unknown', 'Not checked'),
+        ('current', 'Applies as generated'),
+        ('rebased', 'Rebased onto the branch head'),
+        ('stale', 'Conflicts with the branch head'),
+    ]
+    applicability = models.CharField(max_length=20, choices=APPLICABILITY_CHOICES, default='unknown')
+    checked_commit = models.CharField(max_length=40, blank=True, help_text='Branch head commit of the last check')
+    checked_at = models.DateTimeField(null=True, blank=True)
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -38,16 +114,298 @@ class Patch(models.Model):
         verbose_name = _('Patch')
         verbose_name_plural = _('Patches')
         ordering = ['-created_at']
+        indexes = [
+            # Serve the cursor-paginated patch list, overall and per bug
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['bug', 'created_at', 'id']),
+            models.Index(fields=['changed_lines']),
+        ]
 
     def __str__(self):
         return f"Patch for {self.bug.title} ({self.status})"
 
+    @property
+    def original_code(self):
+        return self._get_code('original')
+
+    @original_code.setter
+    def original_code(self, text):
+        self._set_code('original', text)
+
+    @property
+    def patched_code(self):
+        return self._get_code('patched')
+
+    @patched_code.setter
+    def patched_code(self, text):
+        self._set_code('patched', text)
+
+    def _get_code(self, which):
+        text = self.__dict__.get(f'_{which}_code')
+        if text is None:
+            text = getattr(self, f'{which}_blob').text()
+            self.__dict__[f'_{which}_code'] = text
+        return text
+
+    def _set_code(self, which, text):
+        # Stored as a blob on save
+        self.__dict__[f'_{which}_code'] = text
+        self.__dict__.setdefault('_unsaved_code', set()).add(which)
+
+    def _store_code(self, update_fields):
+        """Store code set since the last save as blobs; return the adjusted update_fields."""
+        unsaved = self.__dict__.pop('_unsaved_code', set())
+        for which in unsaved:
+            setattr(self, f'{which}_blob_id', Blob.objects.store(self.__dict__[f'_{which}_code']))
+        if update_fields is None:
+            return None
+        update_fields = set(update_fields)
+        for which in ('original', 'patched'):
+            if f'{which}_code' in update_fields:
+                update_fields.discard(f'{which}_code')
+                update_fields.add(f'{which}_blob')
+        return update_fields
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The diff as loaded (None when deferred), to tell whether it was changed
+        instance._saved_diff = instance.__dict__.get('diff')
+        return instance
+
+    def save(self, *args, **kwargs):
+        update_fields = self._store_code(kwargs.get('update_fields'))
+        if update_fields is not None:
+            kwargs['update_fields'] = update_fields
+        if update_fields is None:
+            diff_changed = self._state.adding or (
+                'diff' in self.__dict__ and self.diff is not getattr(self, '_saved_diff', None)
+            )
+        else:
+            diff_changed = 'diff' in update_fields
+        if diff_changed:
+            self.update_diff_stats()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | set(self.DIFF_STATS_FIELDS)
+        super().save(*args, **kwargs)
+        self._saved_diff = self.__dict__.get('diff')
+
+    def update_diff_stats(self):
+        """Recompute the diff statistics columns from `diff`."""
+        for field, value in diff_stats(self.diff).items():
+            setattr(self, field, value)
+
     def get_diff_stats(self):
-        """Calculate statistics about the patch (lines added, removed, etc.)"""
-        added_lines = sum(1 for line in self.diff.split('\n') if line.startswith('+') and not line.startswith('+++'))
-        removed_lines = sum(1 for line in self.diff.split('\n') if line.startswith('-') and not line.startswith('---'))
+        """Statistics about the patch (lines added, removed, etc.)"""
         return {
-            'added_lines': added_lines,
-            'removed_lines': removed_lines,
-            'total_changes': added_lines + removed_lines
-        } 
\ No newline at end of file
+            'added_lines': self.added_lines,
+            'removed_lines': self.removed_lines,
+            'total_changes': self.changed_lines,
+            'changed_hunks': self.changed_hunks,
+            'changed_files': self.changed_files
+        }
+
+
+class MergeResult(models.Model):
+    """Cached three-way merge of a patch onto a newer version of its file.
+
+    Keyed by the blobs of the three texts, so a merge is computed once
+    however often it is checked.
+    """
+
+    base_blob = models.ForeignKey(Blob, on_delete=models.CASCADE, related_name='+')
+    ours_blob = models.ForeignKey(Blob, on_delete=models.CASCADE, related_name='+')
+    theirs_blob = models.ForeignKey(Blob, on_delete=models.CASCADE, related_name='+')
+    # Unset when the merge conflicts
+    merged_blob = models.ForeignKey(Blob, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    conflicts = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['base_blob', 'ours_blob', 'theirs_blob'], name='patches_merge_result_key'),
+        ]
+
+    def __str__(self):
+        return f"Merge of {self.ours_blob_id[:12]} onto {self.theirs_blob_id[:12]}"
+
+
+class ChangeSet(models.Model):
+    """A change spanning several files, one Patch per file.
+
+    All files are read at the same `ref` of `repository`, and the change
+    set is reviewed, rejected and applied as one unit.
+    """
+
+    STATUS_CHOICES = Patch.STATUS_CHOICES
+
+    bug = models.ForeignKey(Bug, on_delete=models.CASCADE, related_name='change_sets')
+    bugs = models.ManyToManyField(Bug, related_name='+', blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='created_change_sets')
+    repository = models.ForeignKey(
+        GitHubRepository, on_delete=models.SET_NULL, null=True, blank=True, related_name='change_sets'
+    )
+    ref = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    confidence_score = models.FloatField(default=0.0)
+    review_notes = models.TextField(blank=True)
+    applied_at = models.DateTimeField(null=True, blank=True)
+    pull_request_url = models.URLField(max_length=500, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+        ]
+
+    def __str__(self):
+        return f"Change set for {self.bug.title} ({self.status})"
+
+    @property
+    def diff(self):
+        """The diffs of all files, as one multi-file unified diff."""
+        return ''.join(patch.diff for patch in self.patches.all())
+
+    def get_diff_stats(self):
+        """Statistics of all file patches together."""
+        totals = dict.fromkeys(('added_lines', 'removed_lines', 'total_changes', 'changed_hunks', 'changed_files'), 0)
+        for patch in self.patches.all():
+            for field, value in patch.get_diff_stats().items():
+                totals[field] += value
+        return totals
+
+
+class PatchGenerationJobManager(models.Manager):
+    def fail_stale(self, **filters):
+        """Fail the unfinished jobs matching `filters` older than PATCH_JOB_TIMEOUT; return how many.
+
+        A job is stale when it is pending longer than that since it was
+        queued, or running longer since it was claimed: its task was lost or
+        its worker died, and it would block its bug for good.
+        """
+        now = timezone.now()
+        cutoff = now - timedelta(seconds=settings.PATCH_JOB_TIMEOUT)
+        return self.filter(
+            Q(status='pending', created_at__lt=cutoff) | Q(status='running', started_at__lt=cutoff), **filters
+        ).update(status='failed', error='Patch generation timed out', finished_at=now)
+
+
+class PatchGenerationJob(models.Model):
+    """A queued request to generate a patch for a bug.
+
+    Generation fetches the file from GitHub, so it runs in a Celery task;
+    clients poll the job until it has a patch or an error. A user has at
+    most one unfinished job of each kind per bug; jobs unfinished for longer
+    than PATCH_JOB_TIMEOUT are failed before new ones are queued.
+
+    A batch job generates one combined patch for several bugs in the same
+    file; `bug` is the first of its `bugs`. A change set job generates one
+    ChangeSet for bugs in several files.
+    """
+
+    KIND_CHOICES = [
+        ('patch', 'Patch'),
+        ('change_set', 'Change set'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    bug = models.ForeignKey(Bug, on_delete=models.CASCADE, related_name='patch_jobs')
+    bugs = models.ManyToManyField(Bug, related_name='+', blank=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='patch_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='patch')
+    patch = models.ForeignKey(Patch, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    change_set = models.ForeignKey(ChangeSet, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    objects = PatchGenerationJobManager()
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['bug', 'user', 'kind'],
+                condition=Q(status__in=['pending', 'running']),
+                name='patches_job_one_unfinished'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Patch job for {self.bug_id} ({self.status})"
+
+
+class PatchApplyJobManager(models.Manager):
+    def fail_stale(self, **filters):
+        """Fail the unfinished jobs matching `filters` older than PATCH_JOB_TIMEOUT; return how many.
+
+        Stale jobs are found as in PatchGenerationJobManager.fail_stale.
+        Their patches, and change set, go back to reviewed, so they can be
+        applied or rejected again.
+        """
+        from .applying import release_patches
+
+        now = timezone.now()
+        cutoff = now - timedelta(seconds=settings.PATCH_JOB_TIMEOUT)
+        stale = self.filter(
+            Q(status='pending', created_at__lt=cutoff) | Q(status='running', started_at__lt=cutoff), **filters
+        ).select_related('change_set')
+        failed = 0
+        for job in stale:
+            with transaction.atomic():
+                claimed = self.filter(id=job.id, status=job.status).update(
+                    status='failed', error='Applying the patches timed out', finished_at=now
+                )
+                if claimed:
+                    release_patches(list(job.patches.all()), job.change_set, 'reviewed')
+                    failed += 1
+        return failed
+
+
+class PatchApplyJob(models.Model):
+    """A queued request to apply reviewed patches with one pull request.
+
+    Applying takes several GitHub requests, so it runs in a Celery task;
+    clients poll the job until it has a pull request or an error. Queueing
+    the job moves its patches, and their change set, from reviewed to
+    applying, so they are applied once however often apply is requested.
+    Jobs unfinished for longer than PATCH_JOB_TIMEOUT are failed, and their
+    patches released, before the user applies or rejects patches.
+    """
+
+    STATUS_CHOICES = PatchGenerationJob.STATUS_CHOICES
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='patch_apply_jobs')
+    patches = models.ManyToManyField(Patch, related_name='+')
+    change_set = models.ForeignKey(ChangeSet, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    pull_request_url = models.URLField(max_length=500, blank=True)
+    error = models.TextField(blank=True)
+    # Patches conflicting with the head of their branch, when that failed the job
+    stale = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    objects = PatchApplyJobManager()
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+        ]
+
+    def __str__(self):
+        return f"Apply job {self.id} ({self.status})"
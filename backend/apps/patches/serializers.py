@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Patch
+from .models import ChangeSet, Patch, PatchApplyJob, PatchGenerationJob
 
 class PatchSerializer(serializers.ModelSerializer):
     diff_stats = serializers.SerializerMethodField()
@@ -10,19 +10,34 @@ class PatchSerializer(serializers.ModelSerializer):
         model = Patch
         fields = [
             'id', 'bug', 'bug_title', 'created_by', 'created_by_username',
-            'status', 'original_file_path', 'original_code', 'patched_code',
-            'diff', 'confidence_score', 'review_notes', 'applied_at',
-            'created_at', 'updated_at', 'diff_stats'
+            'bugs', 'change_set', 'status', 'original_file_path', 'original_code', 'patched_code',
+            'diff', 'confidence_score', 'review_notes', 'applied_at', 'pull_request_url',
+            'applicability', 'checked_at', 'created_at', 'updated_at', 'diff_stats'
         ]
         read_only_fields = [
-            'created_by', 'status', 'confidence_score', 'applied_at',
+            'bugs', 'change_set', 'created_by', 'status', 'confidence_score', 'applied_at', 'pull_request_url',
+            'applicability', 'checked_at',
             'created_at', 'updated_at'
         ]
 
     def get_diff_stats(self, obj):
         return obj.get_diff_stats()
 
+class PatchListSerializer(PatchSerializer):
+    """Compact patch representation for lists, without the code and the diff."""
+
+    class Meta(PatchSerializer.Meta):
+        fields = [
+            'id', 'bug', 'bug_title', 'created_by', 'created_by_username',
+            'status', 'original_file_path', 'confidence_score', 'review_notes',
+            'applied_at', 'pull_request_url', 'applicability', 'created_at', 'updated_at', 'diff_stats'
+        ]
+
 class PatchCreateSerializer(serializers.ModelSerializer):
+    # Stored as blobs, see Patch.original_code
+    original_code = serializers.CharField(trim_whitespace=False)
+    patched_code = serializers.CharField(trim_whitespace=False, allow_blank=True)
+
     class Meta:
         model = Patch
         fields = [
@@ -30,11 +45,19 @@ class PatchCreateSerializer(serializers.ModelSerializer):
             'patched_code', 'diff'
         ]
 
+    def validate_bug(self, value):
+        request = self.context.get('request')
+        if request and value.user_id != request.user.id:
+            raise serializers.ValidationError("Bug not found")
+        return value
+
     def create(self, validated_data):
         request = self.context.get('request')
         if request and hasattr(request, 'user'):
             validated_data['created_by'] = request.user
-        return super().create(validated_data)
+        patch = super().create(validated_data)
+        patch.bugs.add(patch.bug)
+        return patch
 
 class PatchUpdateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -45,4 +68,47 @@ class PatchUpdateSerializer(serializers.ModelSerializer):
         instance = self.instance
         if instance.status == 'applied' and value != 'applied':
             raise serializers.ValidationError("Cannot change status of an applied patch")
-        return value 
\ No newline at end of file
+        if instance.status == 'applying' or value == 'applying':
+            raise serializers.ValidationError("Patches are applied with the apply action")
+        return value
+
+class PatchGenerationJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PatchGenerationJob
+        fields = [
+            'id', 'bug', 'bugs', 'kind', 'status', 'patch', 'change_set', 'error',
+            'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+class PatchApplyJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PatchApplyJob
+        fields = [
+            'id', 'patches', 'change_set', 'status', 'pull_request_url', 'error', 'stale',
+            'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+class ChangeSetPatchSerializer(PatchSerializer):
+    """A file patch inside a change set: its diff, without the code."""
+
+    class Meta(PatchSerializer.Meta):
+        fields = [
+            'id', 'bugs', 'status', 'original_file_path', 'diff', 'confidence_score', 'applicability', 'diff_stats'
+        ]
+
+class ChangeSetSerializer(serializers.ModelSerializer):
+    patches = ChangeSetPatchSerializer(many=True, read_only=True)
+    diff_stats = serializers.SerializerMethodField()
+    repository_full_name = serializers.CharField(source='repository.full_name', read_only=True, default=None)
+
+    class Meta:
+        model = ChangeSet
+        fields = [
+            'id', 'bug', 'bugs', 'created_by', 'repository', 'repository_full_name', 'ref',
+            'status', 'confidence_score', 'review_notes', 'applied_at', 'pull_request_url',
+            'created_at', 'updated_at', 'diff_stats', 'patches'
+        ]
+        read_only_fields = fields
+
+    def get_diff_stats(self, obj):
+        return obj.get_diff_stats()
@@ -0,0 +1,75 @@
+from celery import shared_task
+from django.utils import timezone
+from .applying import StalePatchError, apply_patches, release_patches
+from .generation import generate_change_set, generate_file_patch
+from .models import PatchApplyJob, PatchGenerationJob
+
+
+@shared_task
+def generate_patch_task(job_id):
+    """Generates the patch of a PatchGenerationJob, combined for a batch job, or its change set."""
+    # Claim the job, so a task delivered twice does not generate twice
+    claimed = PatchGenerationJob.objects.filter(id=job_id, status='pending').update(
+        status='running', started_at=timezone.now()
+    )
+    if not claimed:
+        print(f"Patch job {job_id} not found or already started.")
+        return
+
+    job = PatchGenerationJob.objects.select_related('bug__repository', 'bug__user', 'user').get(id=job_id)
+    others = job.bugs.exclude(id=job.bug_id).select_related('repository', 'user').order_by('detected_at', 'id')
+    try:
+        if job.kind == 'change_set':
+            job.change_set = generate_change_set([job.bug, *others], job.user)
+        else:
+            job.patch = generate_file_patch([job.bug, *others], job.user)
+    except Exception as e:
+        job.status = 'failed'
+        job.error = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        print(f"Patch job {job_id} failed: {e}")
+        return
+
+    job.status = 'completed'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'patch', 'change_set', 'finished_at'])
+    result = f"change set {job.change_set_id}" if job.kind == 'change_set' else f"patch {job.patch_id}"
+    print(f"Patch job {job_id} completed: {result}.")
+
+
+@shared_task
+def apply_patches_task(job_id):
+    """Applies the patches of a PatchApplyJob with one pull request.
+
+    Patches that conflict with their branch, or cannot be applied, go back
+    to reviewed, and patches rebased onto it to generated; patches GitHub
+    refused are marked failed, as is their change set.
+    """
+    claimed = PatchApplyJob.objects.filter(id=job_id, status='pending').update(
+        status='running', started_at=timezone.now()
+    )
+    if not claimed:
+        print(f"Apply job {job_id} not found or already started.")
+        return
+
+    job = PatchApplyJob.objects.select_related('user', 'change_set').get(id=job_id)
+    patches = list(job.patches.select_related('bug__repository').prefetch_related('bugs').order_by('original_file_path'))
+    try:
+        job.pull_request_url = apply_patches(patches, job.user, change_set=job.change_set) or ''
+    except StalePatchError as e:
+        # Nothing failed; the patches need regenerating against the current code
+        release_patches(patches, job.change_set, 'reviewed')
+        job.stale = [patch.id for patch in e.patches]
+        job.error = str(e)
+    except ValueError as e:
+        release_patches(patches, job.change_set, 'reviewed')
+        job.error = str(e)
+    except Exception as e:
+        release_patches(patches, job.change_set, 'failed')
+        job.error = str(e)
+
+    job.status = 'failed' if job.error else 'completed'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'pull_request_url', 'stale', 'error', 'finished_at'])
+    print(f"Apply job {job_id} {job.status}: {job.error or job.pull_request_url or 'no repository'}.")
@@ -0,0 +1,344 @@
+from datetime import timedelta
+from django.test import SimpleTestCase
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from apps.bugs.models import Bug
+from apps.users.models import GitHubOAuth, User
+from github_integration.models import GitHubRepository
+from github_integration.testing import FakeGitHub
+from bugsquash.testing import QueryBudgetMixin
+from .applying import ApplyConflictError, queue_apply
+from .diffs import DIFF_ENGINES, matching_blocks, unified_diff
+from .models import ChangeSet, Patch, PatchApplyJob, PatchGenerationJob
+
+ORIGINAL = 'def total(items):\n    return sum(items)\n\n\ndef count(items):\n    return len(items)\n'
+PATCHED = 'def total(items):\n    return sum(items or [])\n\n\ndef count(items):\n    return len(items)\n'
+# ORIGINAL changed elsewhere on the branch, which PATCHED merges into
+MOVED = 'def total(items):\n    return sum(items)\n\n\ndef count(items):\n    return len(list(items))\n'
+
+
+class DiffTests(SimpleTestCase):
+    a = [f'line {i}\n' for i in range(40)]
+    b = a[:10] + ['new\n'] + a[12:30] + a[31:] + ['end\n']
+
+    def test_engines_agree(self):
+        for engine in DIFF_ENGINES:
+            with self.subTest(engine=engine):
+                blocks = matching_blocks(self.a, self.b, engine=engine)
+                self.assertEqual(blocks, [(0, 0, 10), (12, 11, 18), (31, 29, 9)])
+
+    def test_timeout_gives_coarse_diff(self):
+        for engine in DIFF_ENGINES:
+            with self.subTest(engine=engine), self.assertLogs('apps.patches.diffs', 'WARNING'):
+                self.assertEqual(matching_blocks(self.a, self.b, engine=engine, timeout=-1), [(0, 0, 10)])
+
+
+class PatchQueryTests(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='dev@example.com', username='dev', password='secret')
+        self.client.force_authenticate(self.user)
+
+    def add_patches(self, n, change_set=None):
+        for i in range(n):
+            bug = Bug.objects.create(
+                user=self.user, title=f'Bug {i}', description='d', severity='low',
+                file_path=f'src/m{i}.py', analysis_result={'bug_type': 'logic'}
+            )
+            path = bug.file_path
+            patch = Patch.objects.create(
+                bug=bug, created_by=self.user, status='generated', original_file_path=path,
+                original_code=ORIGINAL, patched_code=PATCHED,
+                diff=unified_diff(ORIGINAL, PATCHED, f'a/{path}', f'b/{path}'), change_set=change_set
+            )
+            patch.bugs.set([bug])
+
+    def add_change_sets(self, n):
+        for _ in range(n):
+            bug = Bug.objects.create(user=self.user, title='Bug', description='d', severity='low')
+            change_set = ChangeSet.objects.create(bug=bug, created_by=self.user, status='generated')
+            change_set.bugs.set([bug])
+            self.add_patches(2, change_set=change_set)
+
+    def add_jobs(self, n):
+        for i in range(n):
+            bug = Bug.objects.create(user=self.user, title=f'Bug {i}', description='d', severity='low')
+            job = PatchGenerationJob.objects.create(bug=bug, user=self.user, status='completed')
+            job.bugs.set([bug])
+
+    def test_list(self):
+        self.assertQueryBudget('/api/patches/patches/', self.add_patches, budget=1)
+
+    def test_list_with_code(self):
+        self.assertQueryBudget('/api/patches/patches/?fields=id,bugs,original_code,patched_code', self.add_patches, budget=2)
+
+    def test_detail(self):
+        self.add_patches(1)
+        patch = Patch.objects.get()
+
+        def add_bugs(n):
+            patch.bugs.add(*[
+                Bug.objects.create(user=self.user, title='Bug', description='d', severity='low') for _ in range(n)
+            ])
+        self.assertQueryBudget(f'/api/patches/patches/{patch.id}/', add_bugs, budget=2)
+
+    def test_change_sets(self):
+        self.assertQueryBudget('/api/patches/change-sets/', self.add_change_sets, budget=4)
+
+    def test_jobs(self):
+        self.assertQueryBudget('/api/patches/jobs/', self.add_jobs, budget=2)
+
+
+class GenerateTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='dev@example.com', username='dev', password='secret')
+        self.client.force_authenticate(self.user)
+        self.bug = Bug.objects.create(
+            user=self.user, title='Bug', description='d', severity='low',
+            file_path='src/app.py', analysis_result={'bug_type': 'logic'}
+        )
+
+    def _generate(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            response = self.client.post('/api/patches/patches/generate/', {'bug_id': str(self.bug.id)}, format='json')
+        self.assertEqual(response.status_code, 202)
+        return PatchGenerationJob.objects.get(id=response.data['job']['id'])
+
+    def test_unfinished_job_is_returned(self):
+        job = self._generate()
+        self.assertEqual(self._generate(), job)
+
+    def test_stale_job_is_failed(self):
+        job = self._generate()
+        started = timezone.now() - timedelta(hours=1)
+        PatchGenerationJob.objects.filter(id=job.id).update(status='running', started_at=started)
+
+        queued = self._generate()
+        self.assertNotEqual(queued, job)
+        self.assertEqual(queued.status, 'pending')
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+
+
+class PatchAccessTests(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(email='owner@example.com', username='owner', password='secret')
+        self.bug = Bug.objects.create(user=self.owner, title='Bug', description='d', severity='low', file_path='src/app.py')
+        self.patch = Patch.objects.create(
+            bug=self.bug, created_by=self.owner, status='reviewed', original_file_path='src/app.py',
+            original_code=ORIGINAL, patched_code=PATCHED, diff=unified_diff(ORIGINAL, PATCHED, 'a/src/app.py', 'b/src/app.py')
+        )
+        self.user = User.objects.create_user(email='dev@example.com', username='dev', password='secret')
+        self.client.force_authenticate(self.user)
+
+    def test_patches_of_other_users_are_hidden(self):
+        self.assertEqual(self.client.get('/api/patches/patches/').data['results'], [])
+        self.assertEqual(self.client.get(f'/api/patches/patches/{self.patch.id}/').status_code, 404)
+        self.assertEqual(self.client.post(f'/api/patches/patches/{self.patch.id}/apply/').status_code, 404)
+        response = self.client.post('/api/patches/patches/apply-batch/', {'patch_ids': [self.patch.id]}, format='json')
+        self.assertEqual(response.status_code, 404)
+        self.patch.refresh_from_db()
+        self.assertEqual(self.patch.status, 'reviewed')
+
+    def test_patch_for_other_users_bug_is_refused(self):
+        response = self.client.post('/api/patches/patches/', {
+            'bug': str(self.bug.id), 'original_file_path': 'src/app.py',
+            'original_code': ORIGINAL, 'patched_code': PATCHED, 'diff': ''
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Patch.objects.count(), 1)
+
+
+class GitHubTestCase(APITestCase):
+    """A user with GitHub connected and a repository `octo/app` served by FakeGitHub."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='dev@example.com', username='dev', password='secret')
+        GitHubOAuth.objects.create(user=self.user, github_id='1', access_token='token')
+        self.repository = GitHubRepository.objects.create(
+            user=self.user, github_id=1, name='app', full_name='octo/app',
+            html_url='https://github.com/octo/app', clone_url='https://github.com/octo/app.git',
+            ssh_url='git@github.com:octo/app.git'
+        )
+        self.github = FakeGitHub().__enter__()
+        self.addCleanup(self.github.__exit__, None, None, None)
+        settings = self.settings(GITHUB_API_URL=self.github.url)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.files = {f'src/m{i}.py': ORIGINAL for i in range(3)}
+        self.github.add_repository('octo/app', self.files)
+        self.client.force_authenticate(self.user)
+
+    def _patch(self, path, change_set=None):
+        bug = Bug.objects.create(
+            user=self.user, repository=self.repository, title=f'Bug in {path}', description='d',
+            severity='low', file_path=path, analysis_result={'bug_type': 'logic'}
+        )
+        patch = Patch.objects.create(
+            bug=bug, created_by=self.user, status='reviewed', original_file_path=path,
+            original_code=ORIGINAL, patched_code=PATCHED,
+            diff=unified_diff(ORIGINAL, PATCHED, f'a/{path}', f'b/{path}'), change_set=change_set
+        )
+        patch.bugs.set([bug])
+        return patch
+
+    def _post(self, url, data=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url, data, format='json')
+
+
+class RepositoryGenerateTests(GitHubTestCase):
+    def _bug(self, path):
+        return Bug.objects.create(
+            user=self.user, repository=self.repository, title=f'Bug in {path}', description='d',
+            severity='low', file_path=path, analysis_result={'bug_type': 'logic'}
+        )
+
+    def test_generate(self):
+        response = self._post('/api/patches/patches/generate/', {'bug_id': str(self._bug('src/m0.py').id)})
+
+        job = PatchGenerationJob.objects.get(id=response.data['job']['id'])
+        self.assertEqual(job.status, 'completed', job.error)
+        self.assertEqual(job.patch.original_code, ORIGINAL)
+
+    def test_generate_missing_file(self):
+        response = self._post('/api/patches/patches/generate/', {'bug_id': str(self._bug('src/gone.py').id)})
+
+        job = PatchGenerationJob.objects.get(id=response.data['job']['id'])
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('src/gone.py', job.error)
+        self.assertFalse(Patch.objects.exists())
+
+    def test_generate_change_set_missing_file(self):
+        bugs = [self._bug('src/m0.py'), self._bug('src/gone.py')]
+        response = self._post('/api/patches/change-sets/generate/', {'bug_ids': [str(bug.id) for bug in bugs]})
+
+        job = PatchGenerationJob.objects.get(id=response.data['jobs'][0]['id'])
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('src/gone.py', job.error)
+        self.assertFalse(ChangeSet.objects.exists())
+
+
+class ApplyTests(GitHubTestCase):
+    """Applying patches against FakeGitHub: one commit and one pull request per apply."""
+
+    def assertOnePullRequest(self, response, paths):
+        self.assertEqual(response.status_code, 202)
+        job = PatchApplyJob.objects.get(id=response.data['job']['id'])
+        self.assertEqual(job.status, 'completed', job.error)
+        self.assertEqual(len(self.github.pull_requests), 1)
+        pull = self.github.pull_requests[0]
+        self.assertEqual(job.pull_request_url, pull['html_url'])
+        self.assertEqual(pull['base']['ref'], 'main')
+        changed = self.github.files_at('octo/app', pull['head']['ref'])
+        self.assertEqual(changed, {**self.files, **dict.fromkeys(paths, PATCHED)})
+        self.assertEqual(self.github.files_at('octo/app', 'main'), self.files)
+        return job
+
+    def test_apply(self):
+        patch = self._patch('src/m0.py')
+        response = self._post(f'/api/patches/patches/{patch.id}/apply/')
+
+        job = self.assertOnePullRequest(response, ['src/m0.py'])
+        patch.refresh_from_db()
+        self.assertEqual(patch.status, 'applied')
+        self.assertEqual(patch.pull_request_url, job.pull_request_url)
+
+    def test_apply_batch_makes_one_commit(self):
+        patches = [self._patch(path) for path in self.files]
+        start = len(self.github.requests)
+        response = self._post('/api/patches/patches/apply-batch/', {'patch_ids': [patch.id for patch in patches]})
+
+        self.assertOnePullRequest(response, list(self.files))
+        # The head, the files at it, then the commit and pull request
+        methods = [method for method, path in self.github.requests[start:] if '/contents/' not in path]
+        self.assertEqual(methods, ['GET', 'GET', 'POST', 'POST', 'POST', 'POST'])
+        self.assertEqual(set(Patch.objects.values_list('status', flat=True)), {'applied'})
+
+    def test_apply_change_set(self):
+        change_set = ChangeSet.objects.create(
+            bug=Bug.objects.create(user=self.user, title='Bug', description='d', severity='low'),
+            created_by=self.user, repository=self.repository, ref='main', status='reviewed'
+        )
+        for path in ['src/m0.py', 'src/m1.py']:
+            self._patch(path, change_set=change_set)
+        response = self._post(f'/api/patches/change-sets/{change_set.id}/apply/')
+
+        job = self.assertOnePullRequest(response, ['src/m0.py', 'src/m1.py'])
+        change_set.refresh_from_db()
+        self.assertEqual(change_set.status, 'applied')
+        self.assertEqual(change_set.pull_request_url, job.pull_request_url)
+
+    def test_apply_claims_the_patches(self):
+        patch = self._patch('src/m0.py')
+        concurrent = Patch.objects.select_related('bug__repository').get(id=patch.id)
+        with self.captureOnCommitCallbacks(execute=False):
+            response = self.client.post(f'/api/patches/patches/{patch.id}/apply/')
+            again = self.client.post(f'/api/patches/patches/{patch.id}/apply/')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(again.status_code, 400)
+        # A request that read the patch before it was claimed
+        with self.assertRaises(ApplyConflictError):
+            queue_apply([concurrent], self.user)
+        patch.refresh_from_db()
+        self.assertEqual(patch.status, 'applying')
+        self.assertEqual(PatchApplyJob.objects.count(), 1)
+
+    def test_apply_stale_patch(self):
+        patch = self._patch('src/m0.py')
+        self.github.commit('octo/app', 'main', {'src/m0.py': 'def total(items):\n    return 0\n\n\ndef count(items):\n    return len(items)\n'})
+        response = self._post(f'/api/patches/patches/{patch.id}/apply/')
+
+        job = PatchApplyJob.objects.get(id=response.data['job']['id'])
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.stale, [patch.id])
+        self.assertEqual(self.github.pull_requests, [])
+        patch.refresh_from_db()
+        self.assertEqual((patch.status, patch.applicability), ('reviewed', 'stale'))
+
+    def test_stale_apply_job_releases_the_patches(self):
+        patch = self._patch('src/m0.py')
+        with self.captureOnCommitCallbacks(execute=False):
+            response = self.client.post(f'/api/patches/patches/{patch.id}/apply/')
+        lost = PatchApplyJob.objects.get(id=response.data['job']['id'])
+        PatchApplyJob.objects.filter(id=lost.id).update(created_at=timezone.now() - timedelta(hours=1))
+
+        response = self._post(f'/api/patches/patches/{patch.id}/apply/')
+
+        self.assertOnePullRequest(response, ['src/m0.py'])
+        lost.refresh_from_db()
+        self.assertEqual(lost.status, 'failed')
+
+    def test_apply_rebased_patch(self):
+        patch = self._patch('src/m0.py')
+        self.github.commit('octo/app', 'main', {'src/m0.py': MOVED})
+        response = self._post(f'/api/patches/patches/{patch.id}/apply/')
+
+        job = PatchApplyJob.objects.get(id=response.data['job']['id'])
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(self.github.pull_requests, [])
+        patch = Patch.objects.get(id=patch.id)
+        self.assertEqual((patch.status, patch.applicability, patch.original_code), ('generated', 'rebased', MOVED))
+
+
+class CheckTests(GitHubTestCase):
+    def test_check_rebases_a_reviewed_patch_for_review(self):
+        patch = self._patch('src/m0.py')
+        self.github.commit('octo/app', 'main', {'src/m0.py': MOVED})
+        response = self._post(f'/api/patches/patches/{patch.id}/check/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['patches'][0]['applicability'], 'rebased')
+        patch = Patch.objects.get(id=patch.id)
+        self.assertEqual(patch.status, 'generated')
+        self.assertEqual(patch.patched_code, MOVED.replace('sum(items)', 'sum(items or [])'))
+
+    def test_applied_patch_is_not_checked(self):
+        patch = self._patch('src/m0.py')
+        Patch.objects.filter(id=patch.id).update(status='applied')
+        self.github.commit('octo/app', 'main', {'src/m0.py': MOVED})
+        response = self._post(f'/api/patches/patches/{patch.id}/check/')
+
+        self.assertEqual(response.status_code, 400)
+        patch = Patch.objects.get(id=patch.id)
+        self.assertEqual((patch.applicability, patch.original_code), ('unknown', ORIGINAL))
@@ -1,9 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PatchViewSet
+from .views import ChangeSetViewSet, PatchApplyJobViewSet, PatchGenerationJobViewSet, PatchViewSet
 
 router = DefaultRouter()
 router.register(r'patches', PatchViewSet)
+router.register(r'jobs', PatchGenerationJobViewSet, basename='patch-job')
+router.register(r'apply-jobs', PatchApplyJobViewSet, basename='patch-apply-job')
+router.register(r'change-sets', ChangeSetViewSet, basename='change-set')
 
 urlpatterns = [
     path('', include(router.urls)),
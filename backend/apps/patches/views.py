@@ -1,20 +1,161 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.filters import OrderingFilter
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
 from django.utils import timezone
-import requests
-import base64
-from .models import Patch
+from bugsquash.fieldsets import SparseFieldsetMixin
+from bugsquash.pagination import TimestampCursorPagination
+from apps.bugs.models import Bug
+from .applying import ApplyConflictError, check_patches, queue_apply
+from .generation import file_ref, group_by_file, patch_source
+from .models import ChangeSet, Patch, PatchApplyJob, PatchGenerationJob
+from .tasks import apply_patches_task, generate_patch_task
 from .serializers import (
+    ChangeSetSerializer,
+    PatchApplyJobSerializer,
     PatchSerializer,
     PatchCreateSerializer,
+    PatchGenerationJobSerializer,
+    PatchListSerializer,
     PatchUpdateSerializer
 )
 
-class PatchViewSet(viewsets.ModelViewSet):
+# Bugs accepted by one batch generate request
+GENERATE_BATCH_MAX_BUGS = 200
+
+def _batch_bugs(request):
+    """Return (bugs, errors, error response) for the `bug_ids` of a batch generate request.
+
+    `bugs` are the user's bugs a patch can be generated from, in request
+    order; `errors` maps the other IDs to the reason. The error response is
+    set when there is nothing to generate.
+    """
+    bug_ids = request.data.get('bug_ids')
+    if not isinstance(bug_ids, list) or not bug_ids:
+        return [], {}, Response({'error': 'bug_ids must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(bug_ids) > GENERATE_BATCH_MAX_BUGS:
+        return [], {}, Response({
+            'error': f'At most {GENERATE_BATCH_MAX_BUGS} bugs can be generated at once'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    errors = {}
+    ids = []
+    for bug_id in bug_ids:
+        try:
+            ids.append(Bug._meta.pk.to_python(bug_id))
+        except DjangoValidationError:
+            errors[str(bug_id)] = 'Bug not found'
+    found = Bug.objects.filter(id__in=ids, user=request.user).select_related('repository').in_bulk()
+
+    bugs = []
+    for bug_id in dict.fromkeys(ids):
+        bug = found.get(bug_id)
+        if bug is None:
+            errors[str(bug_id)] = 'Bug not found'
+            continue
+        try:
+            patch_source(bug)
+        except ValueError as e:
+            errors[str(bug_id)] = str(e)
+            continue
+        bugs.append(bug)
+    if not bugs:
+        return [], errors, Response({
+            'error': 'No patch can be generated for these bugs',
+            'errors': errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+    return bugs, errors, None
+
+
+def _queue_jobs(bugs, user, kind='patch'):
+    """Return jobs of `kind` generating for all of `bugs`, queueing one if needed.
+
+    Those are the user's unfinished jobs including any of `bugs`, and a new
+    job for the bugs none of them includes. Stale jobs are failed first.
+    """
+    PatchGenerationJob.objects.fail_stale(user=user, kind=kind, bugs__in=bugs)
+    while True:
+        unfinished = list(PatchGenerationJob.objects.filter(
+            user=user, kind=kind, status__in=['pending', 'running'], bugs__in=bugs
+        ).distinct().prefetch_related('bugs'))
+        covered = {bug.id for job in unfinished for bug in job.bugs.all()}
+        uncovered = [bug for bug in bugs if bug.id not in covered]
+        if not uncovered:
+            return unfinished
+        try:
+            with transaction.atomic():
+                job = PatchGenerationJob.objects.create(bug=uncovered[0], user=user, kind=kind)
+                job.bugs.set(uncovered)
+            transaction.on_commit(lambda: generate_patch_task.delay(str(job.id)))
+            return [*unfinished, job]
+        except IntegrityError:
+            # A concurrent request queued one first; look again
+            continue
+
+
+def _apply(patches, user, payload, change_set=None):
+    """Queue applying `patches` with one pull request; respond with the job and `payload()`."""
+    try:
+        job = queue_apply(patches, user, change_set=change_set)
+    except ApplyConflictError as e:
+        return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    transaction.on_commit(lambda: apply_patches_task.delay(str(job.id)))
+
+    return Response({
+        'message': 'Patch application queued',
+        'job': PatchApplyJobSerializer(job).data,
+        **payload()
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+def _check(patches, user):
+    """Check `patches` against the head of their branch; respond with the result of each."""
+    try:
+        head = check_patches(patches, user)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    return Response({
+        'checked_commit': head,
+        'patches': [
+            {'id': patch.id, 'original_file_path': patch.original_file_path, 'applicability': patch.applicability}
+            for patch in patches
+        ]
+    })
+
+
+def _in_change_set(patch):
+    """Error response for a patch that is reviewed and applied with its change set, else None."""
+    if patch.change_set_id:
+        return Response({
+            'error': 'This patch is part of a change set; review and apply the change set instead',
+            'change_set': patch.change_set_id
+        }, status=status.HTTP_400_BAD_REQUEST)
+    return None
+
+
+class PatchViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
-    queryset = Patch.objects.all()
+    pagination_class = TimestampCursorPagination
+    list_serializer_class = PatchListSerializer
+    sparse_sources = {
+        'diff_stats': Patch.DIFF_STATS_FIELDS,
+        'original_code': ['original_blob__compression', 'original_blob__data'],
+        'patched_code': ['patched_blob__compression', 'patched_blob__data'],
+    }
+    queryset = Patch.objects.select_related('bug', 'created_by')
+    filter_backends = [OrderingFilter]
+    # e.g. ?ordering=-changed_lines for the largest patches first
+    ordering_fields = ['created_at', 'changed_lines', 'added_lines', 'removed_lines', 'changed_files']
+    ordering = ('-created_at', '-id')
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -24,54 +165,74 @@ class PatchViewSet(viewsets.ModelViewSet):
         return PatchSerializer
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().filter(bug__user=self.request.user)
         bug_id = self.request.query_params.get('bug_id')
         if bug_id:
             queryset = queryset.filter(bug_id=bug_id)
+        for param, lookup in (('min_changes', 'changed_lines__gte'), ('max_changes', 'changed_lines__lte')):
+            value = self.request.query_params.get(param)
+            if value is not None:
+                try:
+                    queryset = queryset.filter(**{lookup: int(value)})
+                except ValueError:
+                    raise ValidationError({param: 'Must be an integer.'})
         return queryset
 
     @action(detail=True, methods=['post'])
     def apply(self, request, pk=None):
-        patch = self.get_object()
-        
-        if patch.status != 'reviewed':
-            return Response({
-                'error': 'Only reviewed patches can be applied'
-            }, status=status.HTTP_400_BAD_REQUEST)
+        """Apply a reviewed patch by opening a pull request with it.
 
+        Returns 202 with a PatchApplyJob; poll it at apply-jobs until it
+        has the pull request URL or an error.
+        """
+        PatchApplyJob.objects.fail_stale(user=request.user)
+        patch = self.get_object()
+        error = _in_change_set(patch)
+        if error is not None:
+            return error
+        return _apply([patch], request.user, lambda: {'patch': PatchSerializer(self.get_object()).data})
+
+    @action(detail=True, methods=['post'], url_path='check')
+    def check_applicability(self, request, pk=None):
+        """Check whether the patch still applies to the head of its branch.
+
+        A patch whose file changed on the branch is rebased when the changes
+        merge cleanly, and marked stale when they conflict.
+        """
+        return _check([self.get_object()], request.user)
+
+    @action(detail=False, methods=['post'], url_path='apply-batch')
+    def apply_batch(self, request):
+        """Apply reviewed patches of one repository together, as one commit in one pull request; see apply."""
+        patch_ids = request.data.get('patch_ids')
+        if not isinstance(patch_ids, list) or not patch_ids:
+            return Response({'error': 'patch_ids must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        PatchApplyJob.objects.fail_stale(user=request.user)
         try:
-            # 1. Validating the patch can be applied
-            if not patch.diff:
-                return Response({'error': 'Patch has no diff content'}, status=status.HTTP_400_BAD_REQUEST)
-
-            # 2. Simulate PR creation on GitHub
-            # In a real app, we would:
-            # - Create a new branch (e.g. bug-fix-bug-id)
-            # - Commit the patched_code
-            # - Create a Pull Request
-            
-            repo = patch.bug.repository
-            if repo:
-                print(f"Simulating PR creation for {repo.full_name}...")
-                # We'll simulate this by adding a "pr_url" to metadata or similar
-            
-            patch.status = 'applied'
-            patch.applied_at = timezone.now()
-            patch.save()
-
-            return Response({
-                'message': 'Patch applied successfully & PR created (simulated)',
-                'patch': PatchSerializer(patch).data,
-                'pr_url': f"https://github.com/{repo.full_name}/pull/simulation" if repo else None
-            })
-        except Exception as e:
-            patch.status = 'failed'
-            patch.save()
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            patches = list(
+                self.get_queryset().filter(id__in=patch_ids).select_related('bug__repository').prefetch_related('bugs')
+            )
+        except (ValueError, DjangoValidationError):
+            return Response({'error': 'patch_ids must be patch IDs'}, status=status.HTTP_400_BAD_REQUEST)
+        missing = set(map(str, patch_ids)) - {str(patch.id) for patch in patches}
+        if missing:
+            return Response({'error': f"Patches not found: {', '.join(sorted(missing))}"}, status=status.HTTP_404_NOT_FOUND)
+        for patch in patches:
+            error = _in_change_set(patch)
+            if error is not None:
+                return error
+
+        ids = [patch.id for patch in patches]
+        return _apply(patches, request.user, lambda: {
+            'patches': PatchSerializer(self.get_queryset().filter(id__in=ids), many=True).data
+        })
 
     @action(detail=True, methods=['post'])
     def review(self, request, pk=None):
         patch = self.get_object()
+        error = _in_change_set(patch)
+        if error is not None:
+            return error
         if patch.status not in ['generated', 'failed']:
             return Response({
                 'error': 'Only generated or failed patches can be reviewed'
@@ -88,9 +249,13 @@ class PatchViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post'])
     def reject(self, request, pk=None):
+        PatchApplyJob.objects.fail_stale(user=request.user)
         patch = self.get_object()
+        error = _in_change_set(patch)
+        if error is not None:
+            return error
         
-        if patch.status == 'applied':
+        if patch.status in ['applying', 'applied']:
             return Response({
                 'error': 'Cannot reject an applied patch'
             }, status=status.HTTP_400_BAD_REQUEST)
@@ -106,203 +271,167 @@ class PatchViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'])
     def generate(self, request):
-        """Generate a code patch for a specific bug using AI analysis."""
+        """Queue generation of a code patch for a bug, or for many bugs.
+
+        Returns 202 with the generation job; poll /api/patches/jobs/<id>/
+        until it is completed and names the patch. While a job for the bug
+        is unfinished, further requests return that job.
+
+        With `bug_ids` instead of `bug_id`, the bugs are grouped by the file
+        they are in and one job per file generates one combined patch.
+        Returns the jobs, and the bugs no patch can be generated for with
+        the reason.
+        """
+        if 'bug_ids' in request.data:
+            return self._generate_batch(request)
+
         bug_id = request.data.get('bug_id')
         if not bug_id:
             return Response({'error': 'Bug ID is required'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            # Import the Bug model
-            from apps.bugs.models import Bug
-            bug = Bug.objects.get(id=bug_id)
-
-            # Get bug analysis data
-            bug_analysis = bug.analysis_result or {}
-            if not bug_analysis and not bug.description:
-                return Response({
-                    'error': 'Bug analysis not found. Please analyze the bug first.'
-                }, status=status.HTTP_400_BAD_REQUEST)
-
-            # Extract file path and bug location from analysis or bug model
-            file_path = bug.file_path or bug_analysis.get('file_path', '')
-            if not file_path:
-                return Response({
-                    'error': 'File path not found in bug details'
-                }, status=status.HTTP_400_BAD_REQUEST)
-
-            # Get the original file content (this would typically come from the repository)
-            # For now, we'll simulate getting the file content
-            original_code = self._get_file_content(file_path, bug)
-            if not original_code:
-                return Response({
-                    'error': f'Could not retrieve content for file: {file_path}'
-                }, status=status.HTTP_400_BAD_REQUEST)
-
-            # Generate the patched code based on bug type and analysis
-            patched_code = self._generate_patched_code(original_code, bug, bug_analysis)
-
-            # Create the diff
-            diff = self._create_diff(original_code, patched_code, file_path)
-
-            # Calculate confidence score
-            confidence_score = bug.confidence_score or self._calculate_confidence_score(bug, bug_analysis)
-
-            # Create the patch
-            patch = Patch.objects.create(
-                bug=bug,
-                created_by=request.user,
-                status='generated',
-                original_file_path=file_path,
-                original_code=original_code,
-                patched_code=patched_code,
-                diff=diff,
-                confidence_score=confidence_score
-            )
+            bug = Bug.objects.get(id=bug_id, user=request.user)
+        except (Bug.DoesNotExist, DjangoValidationError):
+            return Response({'error': 'Bug not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            patch_source(bug)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        job, = _queue_jobs([bug], request.user)
+        return Response({
+            'message': 'Patch generation queued',
+            'job': PatchGenerationJobSerializer(job).data
+        }, status=status.HTTP_202_ACCEPTED)
+
+    def _generate_batch(self, request):
+        bugs, errors, error_response = _batch_bugs(request)
+        if error_response is not None:
+            return error_response
+
+        groups = group_by_file(bugs)
+        jobs = {job.id: job for group in groups for job in _queue_jobs(group, request.user)}
+        return Response({
+            'message': f'Patch generation queued for {len(groups)} files',
+            'jobs': PatchGenerationJobSerializer(jobs.values(), many=True).data,
+            'errors': errors
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class PatchGenerationJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Status of the current user's patch generation jobs."""
+
+    permission_classes = [IsAuthenticated]
+    serializer_class = PatchGenerationJobSerializer
+    pagination_class = TimestampCursorPagination
+
+    def get_queryset(self):
+        return PatchGenerationJob.objects.filter(user=self.request.user).prefetch_related('bugs')
+
+class PatchApplyJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Status of the current user's patch apply jobs."""
 
+    permission_classes = [IsAuthenticated]
+    serializer_class = PatchApplyJobSerializer
+    pagination_class = TimestampCursorPagination
+
+    def get_queryset(self):
+        return PatchApplyJob.objects.filter(user=self.request.user).prefetch_related('patches')
+
+class ChangeSetViewSet(viewsets.ReadOnlyModelViewSet):
+    """Multi-file changes of the current user's bugs, reviewed and applied as a unit."""
+
+    permission_classes = [IsAuthenticated]
+    serializer_class = ChangeSetSerializer
+    pagination_class = TimestampCursorPagination
+
+    def get_queryset(self):
+        patches = Patch.objects.order_by('original_file_path').prefetch_related('bugs')
+        return ChangeSet.objects.filter(bug__user=self.request.user).select_related(
+            'repository'
+        ).prefetch_related('bugs', Prefetch('patches', queryset=patches))
+
+    @action(detail=False, methods=['post'])
+    def generate(self, request):
+        """Queue generation of change sets for `bug_ids`.
+
+        The bugs are grouped by repository and branch, and one job per
+        group generates one change set with a combined patch per file.
+        Returns 202 with the jobs, and the bugs no patch can be generated
+        for with the reason; poll the jobs like patch generation jobs.
+        """
+        bugs, errors, error_response = _batch_bugs(request)
+        if error_response is not None:
+            return error_response
+
+        groups = {}
+        for bug in bugs:
+            groups.setdefault((bug.repository_id, file_ref(bug)), []).append(bug)
+        jobs = {
+            job.id: job for group in groups.values() for job in _queue_jobs(group, request.user, kind='change_set')
+        }
+        return Response({
+            'message': f'Change set generation queued for {len(groups)} repositories',
+            'jobs': PatchGenerationJobSerializer(jobs.values(), many=True).data,
+            'errors': errors
+        }, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['post'])
+    def review(self, request, pk=None):
+        change_set = self.get_object()
+        if change_set.status not in ['generated', 'failed']:
             return Response({
-                'message': 'Patch generated successfully',
-                'patch': PatchSerializer(patch).data
-            }, status=status.HTTP_201_CREATED)
+                'error': 'Only generated or failed change sets can be reviewed'
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-        except Bug.DoesNotExist:
-            return Response({'error': 'Bug not found'}, status=status.HTTP_404_NOT_FOUND)
-        except Exception as e:
+        with transaction.atomic():
+            change_set.status = 'reviewed'
+            change_set.review_notes = request.data.get('review_notes', change_set.review_notes)
+            change_set.save(update_fields=['status', 'review_notes', 'updated_at'])
+            change_set.patches.update(status='reviewed', updated_at=timezone.now())
+        return Response({
+            'message': 'Change set reviewed successfully',
+            'change_set': ChangeSetSerializer(self.get_object()).data
+        })
+
+    @action(detail=True, methods=['post'])
+    def reject(self, request, pk=None):
+        PatchApplyJob.objects.fail_stale(user=request.user)
+        change_set = self.get_object()
+        if change_set.status in ['applying', 'applied']:
             return Response({
-                'error': f'Failed to generate patch: {str(e)}'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                'error': 'Cannot reject an applied change set'
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-    def _get_file_content(self, file_path, bug):
-        """Get the original file content from GitHub repository."""
-        repository = bug.repository
-        if not repository:
-            return self._get_sample_general_code()
+        with transaction.atomic():
+            change_set.status = 'rejected'
+            change_set.review_notes = request.data.get('review_notes', '')
+            change_set.save(update_fields=['status', 'review_notes', 'updated_at'])
+            change_set.patches.update(status='rejected', updated_at=timezone.now())
+        return Response({
+            'message': 'Change set rejected',
+            'change_set': ChangeSetSerializer(self.get_object()).data
+        })
 
-        try:
-            # Get user's GitHub OAuth token
-            oauth = bug.user.github_oauth
-            headers = {
-                'Authorization': f'token {oauth.access_token}',
-                'Accept': 'application/vnd.github.v3.raw'
-            }
-            
-            # Fetch content from GitHub
-            url = f"https://api.github.com/repos/{repository.full_name}/contents/{file_path}"
-            params = {'ref': bug.analysis_result.get('branch', repository.default_branch)}
-            
-            response = requests.get(url, headers=headers, params=params)
-            
-            # If successful (direct raw content), return it
-            if response.status_code == 200:
-                # GitHub might return JSON with base64 content if raw isn't requested properly,
-                # but with vnd.github.v3.raw it should be plain text.
-                return response.text
-                
-            # Fallback to simulated code if file not found or repo is inaccessible
-            print(f"GitHub API returned {response.status_code} for {file_path}. Using simulation.")
-            return self._get_sample_code_by_path(file_path)
-            
-        except Exception as e:
-            print(f"Error fetching file content from GitHub: {e}")
-            return self._get_sample_code_by_path(file_path)
-
-    def _get_sample_code_by_path(self, file_path):
-        if 'auth' in file_path.lower() or 'login' in file_path.lower():
-            return self._get_sample_auth_code()
-        elif 'validation' in file_path.lower():
-            return self._get_sample_validation_code()
-        else:
-            return self._get_sample_general_code()
-
-    def _generate_patched_code(self, original_code, bug, analysis):
-        """Generate patched code based on bug analysis."""
-        bug_type = analysis.get('bug_type', 'unknown')
-        description = analysis.get('description', '')
-
-        if bug_type == 'authentication':
-            return self._fix_authentication_bug(original_code, description)
-        elif bug_type == 'validation':
-            return self._fix_validation_bug(original_code, description)
-        elif bug_type == 'logic':
-            return self._fix_logic_bug(original_code, description)
-        else:
-            return self._fix_general_bug(original_code, description)
-
-    def _create_diff(self, original_code, patched_code, file_path):
-        """Create a unified diff between original and patched code."""
-        import difflib
-
-        original_lines = original_code.splitlines(keepends=True)
-        patched_lines = patched_code.splitlines(keepends=True)
-
-        diff = list(difflib.unified_diff(
-            original_lines,
-            patched_lines,
-            fromfile=f'a/{file_path}',
-            tofile=f'b/{file_path}',
-            lineterm=''
-        ))
-
-        return '\n'.join(diff)
-
-    def _calculate_confidence_score(self, bug, analysis):
-        """Calculate confidence score based on bug analysis quality."""
-        base_score = 0.5
-
-        # Adjust based on bug severity
-        if bug.severity == 'critical':
-            base_score += 0.2
-        elif bug.severity == 'high':
-            base_score += 0.1
-
-        # Adjust based on analysis confidence
-        analysis_confidence = analysis.get('confidence', 0.5)
-        base_score = (base_score + analysis_confidence) / 2
-
-        return min(base_score, 1.0)
-
-    def _get_sample_auth_code(self):
-        return '''def authenticate_user(username, password):
-    # TODO: Implement proper authentication
-    if username == "admin" and password == "password":
-        return True
-    return False'''
-
-    def _get_sample_validation_code(self):
-        return '''def validate_email(email):
-    # TODO: Add proper email validation
-    return "@" in email'''
-
-    def _get_sample_general_code(self):
-        return '''def process_data(data):
-    # TODO: Add proper error handling
-    result = data * 2
-    return result'''
-
-    def _fix_authentication_bug(self, code, description):
-        """Fix authentication-related bugs."""
-        if 'password' in description.lower() or 'auth' in description.lower():
-            return code.replace(
-                'if username == "admin" and password == "password":',
-                'if username and password and len(password) >= 8:'
-            )
-        return code
-
-    def _fix_validation_bug(self, code, description):
-        """Fix validation-related bugs."""
-        if 'email' in description.lower():
-            return code.replace(
-                'return "@" in email',
-                'import re\n    return re.match(r"[^@]+@[^@]+\\.[^@]+", email) is not None'
-            )
-        return code
+    @action(detail=True, methods=['post'], url_path='check')
+    def check_applicability(self, request, pk=None):
+        """Check whether the file patches still apply to the head of the branch, see PatchViewSet."""
+        change_set = self.get_object()
+        return _check(list(change_set.patches.select_related('bug__repository')), request.user)
 
-    def _fix_logic_bug(self, code, description):
-        """Fix logic-related bugs."""
-        return code.replace(
-            'result = data * 2',
-            'try:\n        result = data * 2\n    except TypeError:\n        return None'
-        )
+    @action(detail=True, methods=['post'])
+    def apply(self, request, pk=None):
+        """Apply all file patches of the change set together, as one commit in one pull request; see PatchViewSet.apply."""
+        PatchApplyJob.objects.fail_stale(user=request.user)
+        change_set = self.get_object()
+        if change_set.status != 'reviewed':
+            return Response({
+                'error': 'Only reviewed change sets can be applied'
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-    def _fix_general_bug(self, code, description):
-        """Apply general bug fixes."""
-        return code
\ No newline at end of file
+        patches = list(change_set.patches.select_related('bug__repository').prefetch_related('bugs'))
+        return _apply(
+            patches, request.user, lambda: {'change_set': ChangeSetSerializer(self.get_object()).data},
+            change_set=change_set
+        )
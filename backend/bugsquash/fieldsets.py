@@ -0,0 +1,141 @@
+"""Sparse fieldsets for read endpoints.
+
+`?fields=id,title` returns only the named fields and `?omit=stack_trace`
+drops fields from the default representation. The columns behind the
+returned fields are all the database reads: the queryset is narrowed with
+`.only()` or `.defer()`, so large text columns that are not returned are
+never loaded either. Many-to-many fields are prefetched when returned.
+
+List endpoints default to a compact serializer without the heavy columns;
+`fields=` can still ask for any field of the full serializer.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ValidationError
+
+
+def _split(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+class SparseFieldsetMixin:
+    """ViewSet mixin adding `fields` and `omit` query parameters to list and retrieve.
+
+    list_serializer_class   compact serializer for lists requested without
+                            `fields=`; defaults to the regular serializer
+    sparse_sources          model fields needed by serializer fields that
+                            have no column of their own, e.g. method fields,
+                            as {'diff_stats': ['diff']}
+    """
+
+    list_serializer_class = None
+    sparse_sources = {}
+    sparse_actions = ('list', 'retrieve')
+
+    def _sparse_fieldset(self):
+        """Return (serializer class, {name: field}) for this request, computed once."""
+        if getattr(self, '_sparse', None) is None:
+            params = self.request.query_params
+            serializer_class = self.get_serializer_class()
+            available = serializer_class().fields
+            if self.action == 'list' and 'fields' not in params and self.list_serializer_class:
+                serializer_class = self.list_serializer_class
+            fields = serializer_class().fields
+
+            names = list(fields)
+            for param in ('fields', 'omit'):
+                if param not in params:
+                    continue
+                requested = _split(params[param])
+                unknown = [name for name in requested if name not in available]
+                if unknown:
+                    raise ValidationError({param: f"Unknown fields: {', '.join(unknown)}"})
+                if param == 'fields':
+                    names = [name for name in names if name in requested]
+                else:
+                    names = [name for name in names if name not in requested]
+            self._sparse = serializer_class, {name: fields[name] for name in names}
+        return self._sparse
+
+    def _columns(self, queryset, fields):
+        """Model fields to load for the serializer `fields`."""
+        model = queryset.model
+        columns = {model._meta.pk.name}
+        # Cursor pagination reads the ordering fields of the page's rows
+        paginator = self.paginator
+        if hasattr(paginator, 'get_ordering'):
+            for name in paginator.get_ordering(self.request, queryset, self):
+                columns.add(name.lstrip('-'))
+        for name, field in fields.items():
+            if name in self.sparse_sources:
+                columns.update(self.sparse_sources[name])
+                continue
+            attrs = field.source.split('.')
+            try:
+                model_field = model._meta.get_field(attrs[0])
+            except FieldDoesNotExist:
+                continue
+            if model_field.many_to_many:
+                # No column; see _prefetches
+                continue
+            columns.add(attrs[0])
+            # `bug.title` reads one column of a related row, joined by select_related
+            if len(attrs) > 1 and model_field.is_relation and not model_field.many_to_many:
+                try:
+                    model_field.related_model._meta.get_field(attrs[1])
+                except FieldDoesNotExist:
+                    continue
+                columns.add(f"{attrs[0]}__{attrs[1]}")
+        return columns
+
+    def _prefetches(self, queryset, fields):
+        """Many-to-many model fields read by the serializer `fields`."""
+        prefetches = []
+        for field in fields.values():
+            try:
+                model_field = queryset.model._meta.get_field(field.source.split('.')[0])
+            except FieldDoesNotExist:
+                continue
+            if model_field.many_to_many:
+                prefetches.append(model_field.name)
+        return prefetches
+
+    def _narrow(self, queryset, columns):
+        """Limit select_related to the relations whose columns are read.
+
+        A deferred foreign key cannot be followed by select_related, and a
+        followed one would otherwise load every column of the related row.
+        """
+        if not queryset.query.select_related:
+            return queryset
+        relations = sorted({column.split('__')[0] for column in columns if '__' in column})
+        queryset = queryset.select_related(None)
+        # select_related() without arguments would follow every foreign key
+        return queryset.select_related(*relations) if relations else queryset
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action not in self.sparse_actions:
+            return queryset
+        serializer_class, fields = self._sparse_fieldset()
+        columns = self._columns(queryset, fields)
+        queryset = self._narrow(queryset, columns)
+        prefetches = self._prefetches(queryset, fields)
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        if 'fields' in self.request.query_params or serializer_class is self.list_serializer_class:
+            return queryset.only(*columns)
+        # Only `omit=` given: defer what was left out, unless a returned field needs it
+        omitted = {column for column in self._columns(queryset, serializer_class().fields) - columns if '__' not in column}
+        return queryset.defer(*omitted) if omitted else queryset
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action not in self.sparse_actions:
+            return super().get_serializer(*args, **kwargs)
+        serializer_class, fields = self._sparse_fieldset()
+        kwargs.setdefault('context', self.get_serializer_context())
+        serializer = serializer_class(*args, **kwargs)
+        target = getattr(serializer, 'child', serializer)
+        for name in list(target.fields):
+            if name not in fields:
+                target.fields.pop(name)
+        return serializer
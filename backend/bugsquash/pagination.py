@@ -0,0 +1,21 @@
+"""Cursor pagination for list endpoints.
+
+A cursor encodes the position of the last row of a page, so the next page
+is fetched with an index range scan (`WHERE detected_at < ...`) instead of
+an OFFSET that walks every earlier row: page 10,000 costs what page 1 does.
+The id breaks ties between rows with the same timestamp.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class TimestampCursorPagination(CursorPagination):
+    """Newest first, `page_size` rows per page (at most `max_page_size`)."""
+
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = ('-created_at', '-id')
+
+
+class DetectedAtCursorPagination(TimestampCursorPagination):
+    ordering = ('-detected_at', '-id')
@@ -220,6 +220,54 @@ SIMPLE_JWT = {
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Chunked log uploads are staged on local disk until they are finalized
+LOG_UPLOAD_STAGING_DIR = os.getenv('LOG_UPLOAD_STAGING_DIR', os.path.join(BASE_DIR, 'tmp', 'log_uploads'))
+LOG_UPLOAD_MAX_SIZE = int(os.getenv('LOG_UPLOAD_MAX_SIZE', 10 * 1024 ** 3))
+
+# Compression used for stored log text: 'zstd' (needs the zstandard package), 'gzip' or 'none'
+LOG_COMPRESSION = os.getenv('LOG_COMPRESSION', 'gzip')
+
+# Uncompressed local copies of logs and their line indexes, memory-mapped to serve content pages
+LOG_CACHE_DIR = os.getenv('LOG_CACHE_DIR', os.path.join(BASE_DIR, 'tmp', 'log_cache'))
+# Bytes of local copies kept in LOG_CACHE_DIR; the least recently used are removed beyond it
+LOG_CACHE_MAX_SIZE = int(os.getenv('LOG_CACHE_MAX_SIZE', 10 * 1024 ** 3))
+LOG_CONTENT_PAGE_SIZE = 1000
+LOG_CONTENT_MAX_PAGE_SIZE = 10000
+LOG_CONTENT_MAX_BYTES = 1024 * 1024
+
+# Maximum number of error events kept per analyzed log (the rest are counted)
+LOG_ANALYSIS_MAX_EVENTS = int(os.getenv('LOG_ANALYSIS_MAX_EVENTS', 1000))
+
+# Maximum number of message templates mined per log (further unmatched lines are counted together)
+LOG_TEMPLATE_MAX_CLUSTERS = int(os.getenv('LOG_TEMPLATE_MAX_CLUSTERS', 5000))
+
+# Maximum number of logs accepted by one batch upload
+LOG_BATCH_MAX_ITEMS = int(os.getenv('LOG_BATCH_MAX_ITEMS', 500))
+
+# Logs larger than this are analyzed as parallel shards of about this size
+LOG_SHARD_SIZE = int(os.getenv('LOG_SHARD_SIZE', 64 * 1024 * 1024))
+
+# Compression of the source code stored with patches: 'zstd' (needs the zstandard package), 'gzip' or 'none'
+PATCH_BLOB_COMPRESSION = os.getenv('PATCH_BLOB_COMPRESSION', 'gzip')
+
+# Patch diffs: engine ('histogram', 'myers' or 'difflib'), and the seconds and
+# changed lines after which a coarse diff is produced instead
+PATCH_DIFF_ENGINE = os.getenv('PATCH_DIFF_ENGINE', 'histogram')
+PATCH_DIFF_TIMEOUT = float(os.getenv('PATCH_DIFF_TIMEOUT', 2.0))
+PATCH_DIFF_MAX_LINES = int(os.getenv('PATCH_DIFF_MAX_LINES', 200000))
+
+# Seconds after which a patch generation job still pending or running is
+# failed, e.g. because its worker died, so the bug can be queued again
+PATCH_JOB_TIMEOUT = int(os.getenv('PATCH_JOB_TIMEOUT', 600))
+
+# Re-running bug detection over stored logs: logs per batch, logs per second
+# at most, and seconds a task works before re-queueing itself
+BUG_BACKFILL_BATCH_SIZE = int(os.getenv('BUG_BACKFILL_BATCH_SIZE', 100))
+BUG_BACKFILL_RATE_LIMIT = float(os.getenv('BUG_BACKFILL_RATE_LIMIT', 50))
+BUG_BACKFILL_SLICE_SECONDS = int(os.getenv('BUG_BACKFILL_SLICE_SECONDS', 60))
+# Seconds a backfill task may take over one batch before another task may take the backfill over
+BUG_BACKFILL_LEASE_SECONDS = int(os.getenv('BUG_BACKFILL_LEASE_SECONDS', 300))
+
 # Celery Configuration
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
@@ -229,6 +277,11 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_ALWAYS_EAGER = True # Set to True for synchronous testing
+# Backfills run on their own queue so they never hold up live analysis;
+# serve it with a separate low-concurrency worker (celery worker -Q backfill -c 1)
+CELERY_TASK_ROUTES = {
+    'apps.bugs.tasks.backfill_detection_task': {'queue': 'backfill'},
+}
 
 # Email settings for password reset
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
@@ -255,3 +308,19 @@ GITHUB_CLIENT_ID = os.getenv('GITHUB_CLIENT_ID', '')
 GITHUB_CLIENT_SECRET = os.getenv('GITHUB_CLIENT_SECRET', '')
 GITHUB_REDIRECT_URI = os.getenv('GITHUB_REDIRECT_URI', 'http://localhost:8080/connect-github')
 
+# GitHub REST API; point it at a fake server (github_integration.testing) in tests
+GITHUB_API_URL = os.getenv('GITHUB_API_URL', 'https://api.github.com').rstrip('/')
+
+# Cache of repository files fetched from GitHub: seconds a branch entry is
+# served before it is revalidated, and total size kept before LRU eviction
+GITHUB_FILE_CACHE_TTL = int(os.getenv('GITHUB_FILE_CACHE_TTL', 300))
+GITHUB_FILE_CACHE_MAX_BYTES = int(os.getenv('GITHUB_FILE_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+# Bytes a worker adds to the cache before it checks the total size; the
+# cache can exceed its budget by about this much per worker
+GITHUB_FILE_CACHE_EVICT_BYTES = int(os.getenv('GITHUB_FILE_CACHE_EVICT_BYTES', 16 * 1024 * 1024))
+# Files requested from GitHub at once when fetching several
+GITHUB_FETCH_CONCURRENCY = int(os.getenv('GITHUB_FETCH_CONCURRENCY', 8))
+# Source files scanned per repository analysis, and the largest file scanned
+GITHUB_SCAN_MAX_FILES = int(os.getenv('GITHUB_SCAN_MAX_FILES', 1000))
+GITHUB_SCAN_MAX_FILE_BYTES = int(os.getenv('GITHUB_SCAN_MAX_FILE_BYTES', 512 * 1024))
+
@@ -0,0 +1,52 @@
+"""Test helpers.
+
+QueryBudgetMixin catches N+1 regressions: it requests an endpoint with
+few and with many rows and fails when the number of queries differs, or
+exceeds a fixed budget, e.g.
+
+    class PatchQueryTests(QueryBudgetMixin, APITestCase):
+        def test_list(self):
+            self.client.force_authenticate(self.user)
+            self.assertQueryBudget(
+                '/api/patches/patches/',
+                lambda n: [make_patch(self.bug) for _ in range(n)],
+                budget=3
+            )
+"""
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """TestCase mixin asserting that an endpoint's query count does not depend on its rows."""
+
+    # Rows added before each request; the endpoint is requested once per step
+    query_budget_steps = (1, 10)
+
+    def assertQueryBudget(self, url, add_rows, budget=None, client=None, status_code=200):
+        """Request `url` after each call of `add_rows(n)` and compare the query counts.
+
+        `add_rows(n)` must add `n` more rows the endpoint returns. Fails when
+        the counts differ between steps, or when `budget` is given and a
+        request needs more queries than that. Returns the query count.
+        """
+        client = client or self.client
+        counts = []
+        for step in self.query_budget_steps:
+            add_rows(step)
+            with CaptureQueriesContext(connection) as context:
+                response = client.get(url)
+            self.assertEqual(response.status_code, status_code, f"GET {url} returned {response.status_code}")
+            counts.append((step, len(context), [query['sql'] for query in context.captured_queries]))
+
+        sizes = {step: count for step, count, _ in counts}
+        if len(set(sizes.values())) > 1:
+            _, _, queries = counts[-1]
+            self.fail(
+                f"GET {url} runs a different number of queries as rows are added "
+                f"(rows added: queries) {sizes}:\n" + '\n'.join(queries)
+            )
+        count = counts[0][1]
+        if budget is not None and count > budget:
+            self.fail(f"GET {url} runs {count} queries, over its budget of {budget}:\n" + '\n'.join(counts[0][2]))
+        return count
@@ -0,0 +1,183 @@
+"""Cache of repository file contents fetched from the GitHub contents API.
+
+Entries are keyed by (repository, ref, path) and shared by all workers
+through the database:
+
+- A ref that is a full commit SHA names content that never changes, so
+  its entries are served without asking GitHub again.
+- Branch entries are served as they are for GITHUB_FILE_CACHE_TTL seconds,
+  then revalidated with If-None-Match; a 304 answer keeps the entry (and
+  does not count against the GitHub rate limit).
+- When the cached content exceeds GITHUB_FILE_CACHE_MAX_BYTES, the least
+  recently used entries are evicted. Summing the cache is a full scan, so
+  each worker only does it after adding GITHUB_FILE_CACHE_EVICT_BYTES.
+
+fetch_files reads many files of a ref in one round: one cache query, then
+the missing files are requested concurrently.
+"""
+import hashlib
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import requests
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Sum
+from django.utils import timezone
+from .models import RepositoryFile
+
+CONTENTS_URL = '{api}/repos/{full_name}/contents/{path}'
+
+# Seconds to wait for GitHub
+GITHUB_TIMEOUT = 30
+
+COMMIT_SHA_RE = re.compile(r'^[0-9a-f]{40}$')
+
+# Bytes this process added to the cache since it last checked the cache's size
+_added_bytes = 0
+_added_bytes_lock = threading.Lock()
+
+
+def cache_key(repository, ref, path):
+    return hashlib.sha256(f"{repository.id}\0{ref}\0{path}".encode('utf-8')).hexdigest()
+
+
+def fetch_file_content(repository, ref, path, access_token):
+    """Return the text of `path` at `ref`, from the cache when possible.
+
+    Returns None when GitHub does not return the file; failed fetches are
+    not cached.
+    """
+    return fetch_files(repository, ref, [path], access_token)[path]
+
+
+def fetch_files(repository, ref, paths, access_token):
+    """Return {path: text or None} for several files at `ref`.
+
+    The cache is read with one query, and the files it cannot serve are
+    requested from GitHub concurrently, GITHUB_FETCH_CONCURRENCY at a time.
+    """
+    paths = list(dict.fromkeys(paths))
+    keys = {cache_key(repository, ref, path): path for path in paths}
+    now = timezone.now()
+    entries = {entry.key: entry for entry in RepositoryFile.objects.filter(key__in=keys)}
+
+    contents = {}
+    fresh = []
+    stale = []
+    for key, path in keys.items():
+        entry = entries.get(key)
+        if entry is not None and (
+            entry.immutable or now - entry.validated_at < timedelta(seconds=settings.GITHUB_FILE_CACHE_TTL)
+        ):
+            contents[path] = entry.content
+            fresh.append(entry.id)
+        else:
+            stale.append((path, entry))
+    if fresh:
+        RepositoryFile.objects.filter(id__in=fresh).update(last_used_at=now)
+    if not stale:
+        return contents
+
+    # Only the requests run in threads; the database is used from this one
+    if len(stale) == 1:
+        responses = [_request(repository, ref, *stale[0], access_token)]
+    else:
+        with ThreadPoolExecutor(max_workers=min(settings.GITHUB_FETCH_CONCURRENCY, len(stale))) as executor:
+            responses = list(executor.map(lambda item: _request(repository, ref, *item, access_token), stale))
+
+    for (path, entry), response in zip(stale, responses):
+        contents[path] = _store(repository, ref, path, entry, response, now)
+    if _eviction_due():
+        evict(settings.GITHUB_FILE_CACHE_MAX_BYTES)
+    return contents
+
+
+def _request(repository, ref, path, entry, access_token):
+    """Request a file from GitHub, conditionally when it is cached; None on network errors."""
+    headers = {
+        'Authorization': f'token {access_token}',
+        'Accept': 'application/vnd.github.v3.raw'
+    }
+    if entry is not None and entry.etag:
+        headers['If-None-Match'] = entry.etag
+    try:
+        return requests.get(
+            CONTENTS_URL.format(api=settings.GITHUB_API_URL, full_name=repository.full_name, path=path),
+            headers=headers,
+            params={'ref': ref},
+            timeout=GITHUB_TIMEOUT
+        )
+    except requests.RequestException as e:
+        print(f"Could not fetch {repository.full_name}/{path}@{ref}: {e}")
+        return None
+
+
+def _store(repository, ref, path, entry, response, now):
+    """Cache a GitHub response for `path`; return the file's text or None."""
+    if response is None:
+        return None
+    if response.status_code == 304 and entry is not None:
+        RepositoryFile.objects.filter(id=entry.id).update(validated_at=now, last_used_at=now)
+        return entry.content
+    if response.status_code != 200:
+        print(f"GitHub API returned {response.status_code} for {repository.full_name}/{path}@{ref}.")
+        return None
+
+    content = response.text
+    fields = {
+        'etag': response.headers.get('ETag', '')[:255],
+        'content': content,
+        'size': len(content.encode('utf-8')),
+        'fetched_at': now,
+        'validated_at': now,
+        'last_used_at': now,
+    }
+    _count_added(fields['size'] - (entry.size if entry is not None else 0))
+    if entry is not None:
+        RepositoryFile.objects.filter(id=entry.id).update(**fields)
+    else:
+        try:
+            with transaction.atomic():
+                RepositoryFile.objects.create(
+                    repository=repository, ref=ref[:255], path=path[:1024], key=cache_key(repository, ref, path),
+                    immutable=bool(COMMIT_SHA_RE.match(ref)), **fields
+                )
+        except IntegrityError:
+            # Another worker cached it meanwhile; its copy is as good as ours
+            pass
+    return content
+
+
+def _count_added(size):
+    global _added_bytes
+    with _added_bytes_lock:
+        _added_bytes += size
+
+
+def _eviction_due():
+    """Return True, once, after GITHUB_FILE_CACHE_EVICT_BYTES were added since the last check."""
+    global _added_bytes
+    with _added_bytes_lock:
+        if _added_bytes < settings.GITHUB_FILE_CACHE_EVICT_BYTES:
+            return False
+        _added_bytes = 0
+        return True
+
+
+def evict(max_bytes):
+    """Delete least recently used entries until the cache holds at most `max_bytes`."""
+    total = RepositoryFile.objects.aggregate(total=Sum('size'))['total'] or 0
+    if total <= max_bytes:
+        return 0
+
+    doomed = []
+    entries = RepositoryFile.objects.order_by('last_used_at').values_list('id', 'size')
+    for entry_id, size in entries.iterator():
+        doomed.append(entry_id)
+        total -= size
+        if total <= max_bytes:
+            break
+    RepositoryFile.objects.filter(id__in=doomed).delete()
+    return len(doomed)
@@ -0,0 +1,128 @@
+"""Opening pull requests through the GitHub Git Data API.
+
+All files of a pull request land in a single commit, built without a
+working copy:
+
+1. read the base branch's commit and its tree
+2. create one tree on top of it, with the new file contents inline (GitHub
+   stores them as blobs)
+3. create one commit with that tree, a branch pointing at it, and the pull
+   request
+
+That is six requests however many files change. list_files lists the
+files of a branch in three, for repository scans. Requests go to
+GITHUB_API_URL, so a local fake server (see github_integration.testing)
+can stand in for GitHub.
+"""
+import requests
+from django.conf import settings
+
+# Seconds to wait for GitHub
+GITHUB_TIMEOUT = 30
+
+# Mode of the files written; the Git Data API needs one for every tree entry
+FILE_MODE = '100644'
+
+
+class GitHubAPIError(Exception):
+    """Raised when GitHub rejects a request; `status_code` is its HTTP status."""
+
+    def __init__(self, status_code, message):
+        super().__init__(f"GitHub API returned {status_code}: {message}")
+        self.status_code = status_code
+
+
+class GitDataClient:
+    """Git Data API calls for one repository, sharing a connection."""
+
+    def __init__(self, repository, access_token):
+        self.url = f"{settings.GITHUB_API_URL}/repos/{repository.full_name}"
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authorization': f'token {access_token}',
+            'Accept': 'application/vnd.github+json'
+        })
+
+    def _call(self, method, path, payload=None):
+        response = self.session.request(method, f"{self.url}/{path}", json=payload, timeout=GITHUB_TIMEOUT)
+        if response.status_code >= 400:
+            try:
+                message = response.json().get('message', response.text)
+            except ValueError:
+                message = response.text
+            raise GitHubAPIError(response.status_code, message)
+        return response.json()
+
+    def get_branch_commit(self, branch):
+        """Return the SHA of the commit `branch` points at."""
+        return self._call('GET', f'git/ref/heads/{branch}')['object']['sha']
+
+    def get_commit_tree(self, commit_sha):
+        return self._call('GET', f'git/commits/{commit_sha}')['tree']['sha']
+
+    def get_tree_files(self, tree_sha):
+        """Return the files of a tree and its subtrees as [(path, size)]."""
+        tree = self._call('GET', f'git/trees/{tree_sha}?recursive=1')
+        if tree.get('truncated'):
+            print(f"Tree {tree_sha} of {self.url} is too large; GitHub listed part of it.")
+        return [(entry['path'], entry.get('size', 0)) for entry in tree['tree'] if entry['type'] == 'blob']
+
+    def create_tree(self, base_tree, files):
+        """Create a tree changing `files` ({path: text}) in `base_tree`; return its SHA."""
+        tree = [
+            {'path': path, 'mode': FILE_MODE, 'type': 'blob', 'content': content}
+            for path, content in files.items()
+        ]
+        return self._call('POST', 'git/trees', {'base_tree': base_tree, 'tree': tree})['sha']
+
+    def create_commit(self, message, tree_sha, parent_sha):
+        return self._call('POST', 'git/commits', {'message': message, 'tree': tree_sha, 'parents': [parent_sha]})['sha']
+
+    def create_branch(self, branch, commit_sha):
+        self._call('POST', 'git/refs', {'ref': f'refs/heads/{branch}', 'sha': commit_sha})
+
+    def create_pull_request(self, title, head, base, body=''):
+        return self._call('POST', 'pulls', {'title': title, 'head': head, 'base': base, 'body': body})
+
+    def close(self):
+        self.session.close()
+
+
+def get_branch_commit(repository, access_token, branch):
+    """Return the SHA of the commit `branch` of `repository` points at."""
+    client = GitDataClient(repository, access_token)
+    try:
+        return client.get_branch_commit(branch)
+    finally:
+        client.close()
+
+
+def list_files(repository, access_token, branch):
+    """Return the head commit SHA of `branch` and its files as [(path, size)]."""
+    client = GitDataClient(repository, access_token)
+    try:
+        commit = client.get_branch_commit(branch)
+        return commit, client.get_tree_files(client.get_commit_tree(commit))
+    finally:
+        client.close()
+
+
+def open_pull_request(repository, access_token, base, branch, files, title, body='', message=None, base_commit=None):
+    """Commit `files` ({path: text}) on a new `branch` off `base` and open a pull request.
+
+    The commit's parent is `base_commit` when given, e.g. the head the
+    files were checked against, and the current head of `base` otherwise.
+    Returns the pull request as GitHub describes it (`html_url`, `number`,
+    ...). Raises GitHubAPIError when a request fails, e.g. with 422 when
+    `branch` exists already; nothing is left behind unless the branch was
+    created.
+    """
+    client = GitDataClient(repository, access_token)
+    try:
+        base_commit = base_commit or client.get_branch_commit(base)
+        tree = client.create_tree(client.get_commit_tree(base_commit), files)
+        commit = client.create_commit(message or title, tree, base_commit)
+        client.create_branch(branch, commit)
+        return client.create_pull_request(title, branch, base, body)
+    finally:
+        client.close()
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.2 on 2026-10-18 15:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('github_integration', '0002_alter_githubrepository_github_app'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RepositoryFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ref', models.CharField(max_length=255)),
+                ('path', models.CharField(max_length=1024)),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('immutable', models.BooleanField(default=False)),
+                ('etag', models.CharField(blank=True, max_length=255)),
+                ('content', models.TextField()),
+                ('size', models.BigIntegerField()),
+                ('fetched_at', models.DateTimeField()),
+                ('validated_at', models.DateTimeField()),
+                ('last_used_at', models.DateTimeField(db_index=True)),
+                ('repository', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cached_files', to='github_integration.githubrepository')),
+            ],
+        ),
+    ]
@@ -142,3 +142,29 @@ class GitHubWebhook(models.Model):
 
     def __str__(self):
         return f"{self.name} ({self.repository.full_name})"
+
+
+class RepositoryFile(models.Model):
+    """Cached content of a repository file at a ref, fetched from GitHub.
+
+    Entries for a commit SHA never change. Entries for a branch are served
+    as they are for a short while and then revalidated with their ETag.
+    The least recently used entries are evicted to keep the cache within
+    its size budget; see github_integration.file_cache.
+    """
+
+    repository = models.ForeignKey(GitHubRepository, on_delete=models.CASCADE, related_name='cached_files')
+    ref = models.CharField(max_length=255)
+    path = models.CharField(max_length=1024)
+    # sha256 of (repository, ref, path), the lookup key
+    key = models.CharField(max_length=64, unique=True)
+    immutable = models.BooleanField(default=False)
+    etag = models.CharField(max_length=255, blank=True)
+    content = models.TextField()
+    size = models.BigIntegerField()
+    fetched_at = models.DateTimeField()
+    validated_at = models.DateTimeField()
+    last_used_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.repository_id}:{self.ref}:{self.path}"
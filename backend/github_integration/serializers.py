@@ -13,7 +13,9 @@ class GitHubAppSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'installation_id', 'app_id', 'target_id', 'target_type', 'created_at']
 
     def get_repositories_count(self, obj):
-        return obj.repositories.count()
+        # Annotated by GitHubAppViewSet; counted only for apps loaded elsewhere
+        total = getattr(obj, 'repositories_total', None)
+        return obj.repositories.count() if total is None else total
 
 
 class GitHubRepositorySerializer(serializers.ModelSerializer):
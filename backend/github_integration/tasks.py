@@ -1,74 +1,64 @@
+import os
 from celery import shared_task
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
 from django.utils import timezone
+from .file_cache import fetch_files
+from .git_data import list_files
 from .models import GitHubRepository
 from apps.bugs.models import Bug
-import random
-import requests
+from apps.bugs.fingerprint import compute_fingerprint
+from apps.bugs.rules import get_engine
+
+# Files scanned for bugs, by extension
+SOURCE_EXTENSIONS = {
+    '.py', '.js', '.jsx', '.ts', '.tsx', '.java', '.kt', '.go', '.rb', '.php', '.cs', '.sql',
+}
+
+# Files fetched from GitHub, and held in memory, at once
+SCAN_BATCH_SIZE = 100
 
 @shared_task
 def analyze_repository_task(repository_id, branch=None):
-    """Asynchronously analyze a GitHub repository for bugs."""
+    """Scans the source files of a repository branch with the active repository rules.
+
+    Every line is matched against the rules of get_engine('repository');
+    the lines of a file matched by one rule are recorded as occurrences of
+    one bug, located at the first of them. Files are read at the branch's
+    head commit through the file cache, so rescanning a commit fetches no
+    file from GitHub again. At most GITHUB_SCAN_MAX_FILES source files of up to
+    GITHUB_SCAN_MAX_FILE_BYTES are scanned.
+    """
     try:
-        repository = GitHubRepository.objects.get(id=repository_id)
+        repository = GitHubRepository.objects.select_related('user').get(id=repository_id)
         repository.status = 'syncing' # Re-using syncing status for analysis
         repository.save(update_fields=['status'])
 
-        # Simulate analysis time
-        import time
-        time.sleep(3)
+        try:
+            access_token = repository.user.github_oauth.access_token
+        except ObjectDoesNotExist:
+            raise ValueError('GitHub account not connected')
+        branch = branch or repository.default_branch
+        commit, files = list_files(repository, access_token, branch)
+        paths = [
+            path for path, size in files
+            if os.path.splitext(path)[1].lower() in SOURCE_EXTENSIONS and size <= settings.GITHUB_SCAN_MAX_FILE_BYTES
+        ][:settings.GITHUB_SCAN_MAX_FILES]
 
-        # In a real scenario, we would use repository.github_oauth.access_token 
-        # to fetch code and send it to an AI model.
-        
-        # Simulate AI detecting bugs
-        if random.random() < 0.8:
-            bugs_to_create = random.randint(1, 3)
-            for i in range(bugs_to_create):
-                title_options = [
-                    "Security Vulnerability: SQL Injection",
-                    "Hardcoded Credentials Found",
-                    "Infinite Loop in Logic",
-                    "Unoptimized Database Query",
-                    "Race Condition in Async Task",
-                    "Missing Error Handling in API",
-                ]
-                severity_options = {
-                    "Security Vulnerability: SQL Injection": "critical",
-                    "Hardcoded Credentials Found": "critical",
-                    "Infinite Loop in Logic": "high",
-                    "Unoptimized Database Query": "medium",
-                    "Race Condition in Async Task": "high",
-                    "Missing Error Handling in API": "low",
-                }
-                
-                title = random.choice(title_options)
-                bug_type = title.split(':')[-1].strip().lower().replace(' ', '_')
-                
-                Bug.objects.create(
-                    user=repository.user,
-                    repository=repository,
-                    title=title,
-                    description=f"AI detected a {title} while analyzing branch {branch or repository.default_branch}.",
-                    error_message=f"Static analysis of {repository.full_name} indicates a potential {title}.",
-                    stack_trace="Analysis context: ...",
-                    file_path=f"src/{random.choice(['utils', 'api', 'models', 'views'])}.py",
-                    line_number=random.randint(1, 1000),
-                    status='detected',
-                    severity=severity_options.get(title, "medium"),
-                    confidence_score=round(random.uniform(0.7, 0.95), 2),
-                    analysis_result={
-                        'type': 'repository_analysis',
-                        'bug_type': bug_type,
-                        'branch': branch or repository.default_branch,
-                        'file_tree_hash': 'mock-hash',
-                        'detail': f"The pattern matching detected {title} in the specified file path."
-                    }
-                )
+        engine = get_engine('repository')
+        detected = 0
+        for batch_start in range(0, len(paths), SCAN_BATCH_SIZE):
+            batch = paths[batch_start:batch_start + SCAN_BATCH_SIZE]
+            contents = fetch_files(repository, commit, batch, access_token)
+            for path in batch:
+                if contents[path] is not None:
+                    detected += scan_file(repository, branch, commit, path, contents[path], engine)
 
         repository.status = 'active'
+        repository.sync_error = ''
         repository.last_synced_at = timezone.now()
-        repository.save(update_fields=['status', 'last_synced_at'])
-        print(f"Repository {repository_id} analyzed successfully.")
+        repository.save(update_fields=['status', 'sync_error', 'last_synced_at'])
+        print(f"Repository {repository_id} analyzed successfully: {len(paths)} files, {detected} bugs.")
 
     except GitHubRepository.DoesNotExist:
         print(f"Repository {repository_id} not found.")
@@ -78,3 +68,41 @@ def analyze_repository_task(repository_id, branch=None):
             repository.status = 'error'
             repository.sync_error = str(e)
             repository.save(update_fields=['status', 'sync_error'])
+
+def scan_file(repository, branch, commit, path, content, engine):
+    """Match the lines of one file against `engine` and record bugs; return the number of bugs."""
+    matches = {}
+    for line_number, line in enumerate(content.splitlines(), start=1):
+        rule = engine.match(line)
+        if rule is None:
+            continue
+        if rule.name in matches:
+            matches[rule.name][3] += 1
+        else:
+            matches[rule.name] = [rule, line_number, line.strip(), 1]
+
+    for rule, line_number, line, count in matches.values():
+        fingerprint = compute_fingerprint(rule.title, [path], rule.bug_type, scope=repository.id)
+        Bug.objects.record_occurrence(repository.user, fingerprint, count=count, defaults={
+            'repository': repository,
+            'title': rule.title,
+            'description': f"{rule.title} at line {line_number} of {path} on branch {branch}.",
+            'error_message': line,
+            'stack_trace': f"{path}:{line_number}\n    {line}",
+            'file_path': path[:255],
+            'line_number': line_number,
+            'status': 'detected',
+            'severity': rule.severity,
+            'confidence_score': rule.confidence,
+            'analysis_result': {
+                'type': 'repository_analysis',
+                'bug_type': rule.bug_type,
+                'rule': rule.name,
+                'rule_set_version': engine.version,
+                'branch': branch,
+                'commit': commit,
+                'matched_lines': count,
+                'detail': f"Rule {rule.name} matched {count} line(s) of {path}."
+            }
+        })
+    return len(matches)
@@ -0,0 +1,250 @@
+"""Test helpers.
+
+FakeGitHub serves the parts of the GitHub REST API BugSquash calls from
+memory, on a local port: file contents, the Git Data API and pull
+requests. Point GITHUB_API_URL at it, e.g.
+
+    class ApplyTests(APITestCase):
+        def test_apply(self):
+            with FakeGitHub() as github, self.settings(GITHUB_API_URL=github.url):
+                github.add_repository('octo/app', {'app.py': 'x = 1\\n'})
+                ...
+                self.assertEqual(github.files_at('octo/app', 'bugsquash/fix-1'), {'app.py': 'x = 2\\n'})
+                self.assertEqual(len(github.requests), 6)
+"""
+import hashlib
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+def _sha(kind, value):
+    return hashlib.sha1(f"{kind}\0{json.dumps(value, sort_keys=True)}".encode('utf-8')).hexdigest()
+
+
+class FakeRepository:
+    """Objects and refs of one fake repository; trees are flat {path: text}."""
+
+    def __init__(self, full_name):
+        self.full_name = full_name
+        self.trees = {}
+        self.commits = {}
+        self.refs = {}
+
+    def add_tree(self, files):
+        sha = _sha('tree', files)
+        self.trees[sha] = dict(files)
+        return sha
+
+    def add_commit(self, message, tree, parents):
+        commit = {'message': message, 'tree': tree, 'parents': list(parents)}
+        sha = _sha('commit', commit)
+        self.commits[sha] = commit
+        return sha
+
+    def resolve(self, ref):
+        """Return the commit SHA of a branch name or commit SHA, or None."""
+        if ref in self.commits:
+            return ref
+        return self.refs.get(f'heads/{ref}')
+
+
+class FakeGitHub:
+    """In-memory GitHub API server for tests; a context manager.
+
+    requests        (method, path) of every request served, in order
+    pull_requests   the pull requests opened, as GitHub returns them
+    """
+
+    def __init__(self):
+        self.repositories = {}
+        self.requests = []
+        self.pull_requests = []
+        self.lock = threading.Lock()
+        self.server = None
+        self.url = None
+
+    def __enter__(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _handler(self))
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def add_repository(self, full_name, files, branch='main'):
+        """Create a repository whose `branch` has one commit with `files`."""
+        repository = FakeRepository(full_name)
+        self.repositories[full_name] = repository
+        self.commit(full_name, branch, files, 'Initial commit')
+        return repository
+
+    def commit(self, full_name, branch, files, message='Update'):
+        """Commit changes to `files` ({path: text, or None to delete}) on `branch`; return the SHA."""
+        repository = self.repositories[full_name]
+        parent = repository.refs.get(f'heads/{branch}')
+        tree = dict(repository.trees[repository.commits[parent]['tree']]) if parent else {}
+        for path, content in files.items():
+            if content is None:
+                tree.pop(path, None)
+            else:
+                tree[path] = content
+        sha = repository.add_commit(message, repository.add_tree(tree), [parent] if parent else [])
+        repository.refs[f'heads/{branch}'] = sha
+        return sha
+
+    def files_at(self, full_name, ref):
+        """Return {path: text} of a branch or commit."""
+        repository = self.repositories[full_name]
+        return dict(repository.trees[repository.commits[repository.resolve(ref)]['tree']])
+
+
+def _handler(github):
+    routes = []
+
+    def route(method, pattern):
+        def register(view):
+            routes.append((method, re.compile(f'^/repos/(?P<repo>[^/]+/[^/]+)/{pattern}$'), view))
+            return view
+        return register
+
+    @route('GET', r'contents/(?P<path>.+)')
+    def contents(repository, request, path):
+        commit = repository.resolve(request.query.get('ref', 'main'))
+        files = repository.trees[repository.commits[commit]['tree']] if commit else {}
+        if path not in files:
+            return 404, {'message': 'Not Found'}
+        etag = f'"{hashlib.sha1(files[path].encode("utf-8")).hexdigest()}"'
+        if request.headers.get('If-None-Match') == etag:
+            return 304, None
+        return 200, files[path], {'ETag': etag}
+
+    @route('GET', r'git/ref/heads/(?P<branch>.+)')
+    def get_ref(repository, request, branch):
+        sha = repository.refs.get(f'heads/{branch}')
+        if sha is None:
+            return 404, {'message': 'Not Found'}
+        return 200, {'ref': f'refs/heads/{branch}', 'object': {'type': 'commit', 'sha': sha}}
+
+    @route('GET', r'git/commits/(?P<sha>[0-9a-f]+)')
+    def get_commit(repository, request, sha):
+        commit = repository.commits.get(sha)
+        if commit is None:
+            return 404, {'message': 'Not Found'}
+        return 200, {
+            'sha': sha, 'message': commit['message'], 'tree': {'sha': commit['tree']},
+            'parents': [{'sha': parent} for parent in commit['parents']]
+        }
+
+    @route('GET', r'git/trees/(?P<sha>[0-9a-f]+)')
+    def get_tree(repository, request, sha):
+        files = repository.trees.get(sha)
+        if files is None:
+            return 404, {'message': 'Not Found'}
+        directories = {
+            '/'.join(parts[:depth]) for parts in (path.split('/') for path in files) for depth in range(1, len(parts))
+        }
+        entries = [{'path': path, 'mode': '040000', 'type': 'tree'} for path in sorted(directories)]
+        entries += [
+            {'path': path, 'mode': '100644', 'type': 'blob', 'size': len(content.encode('utf-8'))}
+            for path, content in sorted(files.items())
+        ]
+        return 200, {'sha': sha, 'tree': entries, 'truncated': False}
+
+    @route('POST', r'git/trees')
+    def create_tree(repository, request):
+        base = request.json.get('base_tree')
+        if base is not None and base not in repository.trees:
+            return 422, {'message': 'Invalid base_tree'}
+        files = dict(repository.trees[base]) if base else {}
+        for entry in request.json['tree']:
+            if entry.get('sha', '') is None:
+                files.pop(entry['path'], None)
+            else:
+                files[entry['path']] = entry['content']
+        return 201, {'sha': repository.add_tree(files)}
+
+    @route('POST', r'git/commits')
+    def create_commit(repository, request):
+        data = request.json
+        if data['tree'] not in repository.trees or any(parent not in repository.commits for parent in data['parents']):
+            return 422, {'message': 'Invalid tree or parent'}
+        return 201, {'sha': repository.add_commit(data['message'], data['tree'], data['parents'])}
+
+    @route('POST', r'git/refs')
+    def create_ref(repository, request):
+        name = request.json['ref'].removeprefix('refs/')
+        if name in repository.refs:
+            return 422, {'message': 'Reference already exists'}
+        if request.json['sha'] not in repository.commits:
+            return 422, {'message': 'Object does not exist'}
+        repository.refs[name] = request.json['sha']
+        return 201, {'ref': f'refs/{name}', 'object': {'type': 'commit', 'sha': request.json['sha']}}
+
+    @route('POST', r'pulls')
+    def create_pull(repository, request):
+        data = request.json
+        for branch in (data['head'], data['base']):
+            if f'heads/{branch}' not in repository.refs:
+                return 422, {'message': f'Unknown branch {branch}'}
+        number = len(github.pull_requests) + 1
+        pull = {
+            'number': number,
+            'html_url': f'https://github.com/{repository.full_name}/pull/{number}',
+            'title': data['title'],
+            'body': data.get('body', ''),
+            'head': {'ref': data['head'], 'sha': repository.refs[f"heads/{data['head']}"]},
+            'base': {'ref': data['base']},
+        }
+        github.pull_requests.append(pull)
+        return 201, pull
+
+    class Handler(BaseHTTPRequestHandler):
+        def _serve(self, method):
+            url = urlsplit(self.path)
+            self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            length = int(self.headers.get('Content-Length') or 0)
+            self.json = json.loads(self.rfile.read(length)) if length else {}
+            with github.lock:
+                github.requests.append((method, url.path))
+                result = self._dispatch(method, url.path)
+            status, body, headers = (result + ({},))[:3]
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            if body is None:
+                self.end_headers()
+                return
+            data = body.encode('utf-8') if isinstance(body, str) else json.dumps(body).encode('utf-8')
+            self.send_header('Content-Type', 'text/plain' if isinstance(body, str) else 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _dispatch(self, method, path):
+            if not self.headers.get('Authorization'):
+                return 401, {'message': 'Requires authentication'}
+            for route_method, pattern, view in routes:
+                match = pattern.match(path)
+                if route_method == method and match:
+                    kwargs = match.groupdict()
+                    repository = github.repositories.get(kwargs.pop('repo'))
+                    if repository is None:
+                        return 404, {'message': 'Not Found'}
+                    return view(repository, self, **kwargs)
+            return 404, {'message': 'Not Found'}
+
+        def do_GET(self):
+            self._serve('GET')
+
+        def do_POST(self):
+            self._serve('POST')
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
@@ -1,3 +1,147 @@
-from django.test import TestCase
+from itertools import count
+from unittest import mock
+from django.test import override_settings
+from rest_framework.test import APITestCase
+from apps.bugs.models import Bug
+from apps.users.models import GitHubOAuth, User
+from bugsquash.testing import QueryBudgetMixin
+from . import file_cache
+from .models import GitHubApp, GitHubRepository, RepositoryFile
+from .tasks import analyze_repository_task
+from .testing import FakeGitHub
 
-# Create your tests here.
+_ids = count(1)
+
+
+class RepositoryQueryTests(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='dev@example.com', username='dev', password='secret')
+        self.client.force_authenticate(self.user)
+
+    def add_repositories(self, n):
+        for _ in range(n):
+            number = next(_ids)
+            app = GitHubApp.objects.create(
+                name=f'app-{number}', installation_id=number, user=self.user,
+                app_id=1, target_id=1, target_type='User'
+            )
+            GitHubRepository.objects.create(
+                user=self.user, github_app=app, github_id=number, name=f'repo-{number}',
+                full_name=f'octo/repo-{number}', html_url=f'https://github.com/octo/repo-{number}',
+                clone_url=f'https://github.com/octo/repo-{number}.git', ssh_url=f'git@github.com:octo/repo-{number}.git'
+            )
+
+    def test_list(self):
+        self.assertQueryBudget('/api/github/repositories/', self.add_repositories, budget=1)
+
+
+APP_SOURCE = '''import os
+
+DB_PASSWORD = "correct-horse"
+
+
+def load(path):
+    try:
+        return open(path).read()
+    except: pass
+
+
+def save(path, text):
+    try:
+        open(path, 'w').write(text)
+    except: pass
+'''
+
+
+class GitHubTestCase(APITestCase):
+    """A user with GitHub connected and a repository `octo/app` served by FakeGitHub."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='dev@example.com', username='dev', password='secret')
+        GitHubOAuth.objects.create(user=self.user, github_id='1', access_token='token')
+        self.repository = GitHubRepository.objects.create(
+            user=self.user, github_id=1, name='app', full_name='octo/app',
+            html_url='https://github.com/octo/app', clone_url='https://github.com/octo/app.git',
+            ssh_url='git@github.com:octo/app.git'
+        )
+        self.github = FakeGitHub().__enter__()
+        self.addCleanup(self.github.__exit__, None, None, None)
+        overrides = self.settings(GITHUB_API_URL=self.github.url)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+
+class RepositoryAnalysisTests(GitHubTestCase):
+    def setUp(self):
+        super().setUp()
+        self.github.add_repository('octo/app', {
+            'src/app/store.py': APP_SOURCE,
+            'src/app/clean.py': 'def clean(text):\n    return text.strip()\n',
+            'README.md': 'Set password = "correct-horse" in the settings.\n',
+        })
+
+    def bugs(self):
+        return [
+            (bug.analysis_result['rule'], bug.file_path, bug.line_number, bug.occurrence_count)
+            for bug in Bug.objects.order_by('line_number')
+        ]
+
+    def test_rules_are_matched_against_the_source(self):
+        analyze_repository_task(str(self.repository.id))
+
+        self.assertEqual(self.bugs(), [
+            ('hardcoded_credentials', 'src/app/store.py', 3, 1),
+            ('missing_error_handling', 'src/app/store.py', 9, 2),
+        ])
+        bug = Bug.objects.get(line_number=9)
+        self.assertEqual(bug.error_message, 'except: pass')
+        self.assertEqual(bug.analysis_result['commit'], self.github.repositories['octo/app'].refs['heads/main'])
+        self.repository.refresh_from_db()
+        self.assertEqual(self.repository.status, 'active')
+
+    def fetched(self):
+        return sorted(path for method, path in self.github.requests if '/contents/' in path)
+
+    def test_files_of_a_commit_are_fetched_once(self):
+        analyze_repository_task(str(self.repository.id))
+        self.assertEqual(self.fetched(), [
+            '/repos/octo/app/contents/src/app/clean.py', '/repos/octo/app/contents/src/app/store.py'
+        ])
+
+        self.github.requests.clear()
+        analyze_repository_task(str(self.repository.id))
+        self.assertEqual(self.fetched(), [])
+        self.assertEqual(Bug.objects.get(line_number=9).occurrence_count, 4)
+
+        self.github.commit('octo/app', 'main', {'src/app/clean.py': 'def clean(text):\n    return text\n'})
+        analyze_repository_task(str(self.repository.id))
+        self.assertEqual(len(self.fetched()), 2)
+
+    def test_missing_github_account_fails_the_analysis(self):
+        GitHubOAuth.objects.filter(user=self.user).delete()
+        analyze_repository_task(str(self.repository.id))
+
+        self.repository.refresh_from_db()
+        self.assertEqual((self.repository.status, self.repository.sync_error), ('error', 'GitHub account not connected'))
+        self.assertFalse(Bug.objects.exists())
+
+
+@override_settings(GITHUB_FILE_CACHE_MAX_BYTES=250, GITHUB_FILE_CACHE_EVICT_BYTES=200)
+class FileCacheTests(GitHubTestCase):
+    def setUp(self):
+        super().setUp()
+        self.github.add_repository('octo/app', {f'f{i}.py': 'x' * 99 + '\n' for i in range(4)})
+        file_cache._added_bytes = 0
+        self.addCleanup(setattr, file_cache, '_added_bytes', 0)
+
+    def test_size_is_checked_after_enough_bytes_were_added(self):
+        with mock.patch.object(file_cache, 'evict', wraps=file_cache.evict) as evict:
+            for i in range(4):
+                file_cache.fetch_file_content(self.repository, 'main', f'f{i}.py', 'token')
+                # Served from the cache, adding nothing
+                file_cache.fetch_file_content(self.repository, 'main', f'f{i}.py', 'token')
+
+        self.assertEqual(evict.call_count, 2)
+        self.assertEqual(
+            sorted(RepositoryFile.objects.values_list('path', flat=True)), ['f2.py', 'f3.py']
+        )
@@ -1,5 +1,6 @@
 import requests
 from django.conf import settings
+from django.db.models import Count
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -23,7 +24,9 @@ class GitHubAppViewSet(viewsets.ModelViewSet):
     queryset = models.GitHubApp.objects.all()
 
     def get_queryset(self):
-        return models.GitHubApp.objects.filter(user=self.request.user)
+        return models.GitHubApp.objects.filter(user=self.request.user).annotate(
+            repositories_total=Count('repositories')
+        )
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -35,7 +38,7 @@ class GitHubRepositoryViewSet(viewsets.ModelViewSet):
     queryset = models.GitHubRepository.objects.all()
 
     def get_queryset(self):
-        return models.GitHubRepository.objects.filter(user=self.request.user)
+        return models.GitHubRepository.objects.filter(user=self.request.user).select_related('github_app')
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -142,7 +145,7 @@ class GitHubWebhookViewSet(viewsets.ModelViewSet):
     queryset = models.GitHubWebhook.objects.all()
 
     def get_queryset(self):
-        return models.GitHubWebhook.objects.filter(user=self.request.user)
+        return models.GitHubWebhook.objects.filter(user=self.request.user).select_related('repository')
 
 
 class GitHubStatusView(APIView):
@@ -3,7 +3,9 @@ import { BugReport } from '@/types/bugs';
 
 export const fetchBugReports = async (): Promise<BugReport[]> => {
   try {
-    const response = await api.get('/bugs/');
+    const response = await api.get('/bugs/', {
+      params: { fields: 'id,title,file_path,analysis_result,confidence_score,severity' }
+    });
     const data = response.data.results || response.data || [];
     
     return data.map((bug: any) => ({
@@ -3,8 +3,9 @@ import api from "@/lib/api";
 export interface Patch {
   id: string;
   bug: string;
+  bugs: string[];
   bug_title: string;
-  status: 'pending' | 'generated' | 'reviewed' | 'applied' | 'failed' | 'rejected';
+  status: 'pending' | 'generated' | 'reviewed' | 'applying' | 'applied' | 'failed' | 'rejected';
   original_file_path: string;
   original_code: string;
   patched_code: string;
@@ -12,17 +13,98 @@ export interface Patch {
   confidence_score: number;
   review_notes: string;
   applied_at: string | null;
+  pull_request_url: string;
+  applicability: 'unknown' | 'current' | 'rebased' | 'stale';
   created_at: string;
 }
 
+export interface PatchGenerationJob {
+  id: string;
+  bug: string;
+  bugs: string[];
+  status: 'pending' | 'running' | 'completed' | 'failed';
+  patch: string | null;
+  error: string;
+}
+
+export interface PatchApplyJob {
+  id: string;
+  patches: string[];
+  change_set: string | null;
+  status: 'pending' | 'running' | 'completed' | 'failed';
+  pull_request_url: string;
+  error: string;
+  stale: string[];
+}
+
+// How often and how long to poll a queued patch generation or application
+const JOB_POLL_INTERVAL_MS = 1000;
+const JOB_POLL_TIMEOUT_MS = 120000;
+
 export const PatchService = {
   async generatePatch(bugId: string): Promise<Patch> {
+    // Generation runs in the background; poll the job until it has a patch
     const response = await api.post('/patches/generate/', { bug_id: bugId });
-    return response.data.patch;
+    return PatchService.waitForGenerationJob(response.data.job);
+  },
+
+  async generatePatches(bugIds: string[]): Promise<{ patches: Patch[]; errors: Record<string, string> }> {
+    // One combined patch per file; bugs that cannot be patched come back in `errors`
+    const response = await api.post('/patches/generate/', { bug_ids: bugIds });
+    const jobs: PatchGenerationJob[] = response.data.jobs;
+    const patches = await Promise.all(jobs.map(job => PatchService.waitForGenerationJob(job)));
+    return { patches, errors: response.data.errors || {} };
+  },
+
+  async waitForGenerationJob(job: PatchGenerationJob): Promise<Patch> {
+    const deadline = Date.now() + JOB_POLL_TIMEOUT_MS;
+    while (job.status === 'pending' || job.status === 'running') {
+      if (Date.now() > deadline) {
+        throw new Error('Patch generation is taking too long, please check back later');
+      }
+      await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+      job = await PatchService.getGenerationJob(job.id);
+    }
+    if (job.status === 'failed' || !job.patch) {
+      throw new Error(job.error || 'Patch generation failed');
+    }
+    return PatchService.getPatch(job.patch);
+  },
+
+  async getGenerationJob(jobId: string): Promise<PatchGenerationJob> {
+    const response = await api.get(`/patches/jobs/${jobId}/`);
+    return response.data;
+  },
+
+  async waitForApplyJob(job: PatchApplyJob): Promise<PatchApplyJob> {
+    const deadline = Date.now() + JOB_POLL_TIMEOUT_MS;
+    while (job.status === 'pending' || job.status === 'running') {
+      if (Date.now() > deadline) {
+        throw new Error('Applying the patches is taking too long, please check back later');
+      }
+      await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+      job = await PatchService.getApplyJob(job.id);
+    }
+    if (job.status === 'failed') {
+      throw new Error(job.error || 'Applying the patches failed');
+    }
+    return job;
+  },
+
+  async getApplyJob(jobId: string): Promise<PatchApplyJob> {
+    const response = await api.get(`/patches/apply-jobs/${jobId}/`);
+    return response.data;
   },
 
   async getPatches(bugId?: string): Promise<Patch[]> {
-    const response = await api.get('/patches/', { params: { bug_id: bugId } });
+    // Lists are compact by default; the preview needs the code of each patch
+    const response = await api.get('/patches/', {
+      params: {
+        bug_id: bugId,
+        fields: 'id,bug,bug_title,status,original_file_path,original_code,patched_code,diff,'
+          + 'confidence_score,review_notes,applied_at,created_at'
+      }
+    });
     return response.data.results || response.data || [];
   },
 
@@ -32,8 +114,24 @@ export const PatchService = {
   },
 
   async applyPatch(patchId: string): Promise<Patch> {
+    // The pull request is opened in the background; poll the job until it is
     const response = await api.post(`/patches/${patchId}/apply/`);
-    return response.data.patch;
+    await PatchService.waitForApplyJob(response.data.job);
+    return PatchService.getPatch(patchId);
+  },
+
+  async checkPatch(patchId: string): Promise<Patch['applicability']> {
+    // Rebases the patch onto the branch head when it merges cleanly
+    const response = await api.post(`/patches/${patchId}/check/`);
+    return response.data.patches[0].applicability;
+  },
+
+  async applyPatches(patchIds: string[]): Promise<{ patches: Patch[]; prUrl: string | null }> {
+    // All patches land in one commit of one pull request
+    const response = await api.post('/patches/apply-batch/', { patch_ids: patchIds });
+    const job = await PatchService.waitForApplyJob(response.data.job);
+    const patches = await Promise.all(patchIds.map(id => PatchService.getPatch(id)));
+    return { patches, prUrl: job.pull_request_url || null };
   },
 
   async reviewPatch(patchId: string, reviewNotes: string): Promise<Patch> {